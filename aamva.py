@@ -0,0 +1,91 @@
+import io
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+from PIL import Image, ImageOps
+from metrics import metrics, timer
+
+try:
+    import zxingcpp # optional: pip install zxing-cpp; without it every file goes to the model
+except ImportError:
+    zxingcpp = None
+
+# --- Constants ---
+BARCODE_FAST_PATH = os.environ.get("BARCODE_FAST_PATH", "1") != "0"
+BARCODE_MAX_SIDE = 3000 # larger photos are downscaled before decoding; PDF417 modules stay readable well below this
+REQUIRED_FIELDS = ("license_number", "first_name", "last_name", "address", "city", "state", "zip_code")
+ELEMENT = re.compile(r"^D[A-Z]{2}")
+SUBFILE_START = re.compile(r"(?:DL|ID)D[A-Z]{2}")
+
+_stats_lock = threading.Lock()
+_stats = {"attempts": 0, "hit": 0, "partial": 0, "no_barcode": 0}
+
+def parse_aamva(text: str) -> Dict[str, str]:
+    """AAMVA data elements ({"DAQ": "123456789", ...}) plus "IIN" (issuer) from the header when present."""
+    fields = {}
+    header = re.search(r"ANSI ?(\d{6})", text)
+    if header: fields["IIN"] = header.group(1)
+    for line in re.split(r"[\r\n\x1e]+", text):
+        line = line.strip()
+        # The first element of each subfile follows its type, e.g. "DLDAQ123456789", often on the header line
+        subfile = None if ELEMENT.match(line) else SUBFILE_START.search(line)
+        if subfile: line = line[subfile.start() + 2:]
+        if ELEMENT.match(line) and len(line) > 3: fields.setdefault(line[:3], line[3:].strip())
+    return fields
+
+def _name_parts(fields: Dict[str, str]) -> Dict[str, str]:
+    if fields.get("DCS") or fields.get("DAB"):
+        first = fields.get("DAC") or fields.get("DCT", "")
+        middle = fields.get("DAD", "")
+        if not fields.get("DAC") and "," in first: first, middle = [p.strip() for p in first.split(",", 1)] # version 2-3 "FIRST,MIDDLE"
+        return {"last_name": fields.get("DCS") or fields["DAB"], "first_name": first, "middle_name": middle}
+    if fields.get("DAA"): # version 1: "LAST,FIRST,MIDDLE"
+        parts = [p.strip() for p in fields["DAA"].split(",")] + ["", ""]
+        return {"last_name": parts[0], "first_name": parts[1], "middle_name": parts[2]}
+    return {}
+
+def to_document_data(fields: Dict[str, str]) -> Dict[str, str]:
+    """Maps AAMVA elements onto `DocumentData` fields; empty values are left out."""
+    names = {k: v for k, v in _name_parts(fields).items() if v and v.upper() not in ("NONE", "UNAVL")}
+    street = ", ".join(part for part in (fields.get("DAG"), fields.get("DAH")) if part)
+    zip_code = re.sub(r"\D", "", fields.get("DAK", ""))[:5]
+    data = dict(names, license_number=fields.get("DAQ", ""), address=street, city=fields.get("DAI", ""), state=fields.get("DAJ", ""), zip_code=zip_code)
+    return {k: v for k, v in data.items() if v}
+
+def decode_pdf417(data: bytes) -> Optional[str]:
+    """Text of the first PDF417 barcode in an image, or None (also when zxing-cpp is not installed)."""
+    if zxingcpp is None: return None
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("L")
+    except Exception: return None # not an image the barcode reader can use; the model still sees it
+    img.thumbnail((BARCODE_MAX_SIDE, BARCODE_MAX_SIDE))
+    results = zxingcpp.read_barcodes(img, formats=zxingcpp.BarcodeFormat.PDF417)
+    # Raw bytes: `.text` may render the AAMVA separators as escapes depending on the zxing-cpp version
+    return bytes(results[0].bytes).decode("latin-1") if results else None
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        _stats["attempts"] += 1
+        _stats[outcome] += 1
+    metrics.inc("intake_barcode_total", outcome=outcome)
+
+def license_from_barcode(filename: str, data: bytes, document_type: str) -> Optional[Dict[str, Any]]:
+    """A validated-shape license document ({"type", "filename", "data"}) when the barcode has every required field.
+
+    `document_type` comes from the upload context: the issuing state says nothing about whose license it is.
+    """
+    if not BARCODE_FAST_PATH or zxingcpp is None: return None
+    with timer("barcode_decode"): text = decode_pdf417(data)
+    if not text: _count("no_barcode"); return None
+    fields = parse_aamva(text)
+    doc_data = to_document_data(fields)
+    if any(not doc_data.get(f) for f in REQUIRED_FIELDS): _count("partial"); return None
+    _count("hit")
+    return {"type": document_type, "filename": filename, "data": doc_data}
+
+def fast_path_stats() -> Dict[str, Any]:
+    """Barcode fast-path attempts and outcomes since the process started."""
+    with _stats_lock: stats = dict(_stats)
+    return dict(stats, available=zxingcpp is not None, enabled=BARCODE_FAST_PATH,
+                hit_rate=round(stats["hit"] / stats["attempts"], 4) if stats["attempts"] else 0.0)
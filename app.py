@@ -1,26 +1,33 @@
 # app.py
 import os
+import asyncio
 import json
 import base64
+import time
 from typing import Dict, List, Optional, Any
 import chainlit as cl
 from chainlit.types import AskFileResponse
 from chainlit.element import Element
 import openai
-from openai import OpenAI
-import httpx
 from pydantic import BaseModel, Field
 import pandas as pd
+from http_pool import get_async_openai_client, warm_up_async
+from aamva import license_from_barcode
+from image_utils import preprocess_image
+from metrics import metrics, observe_stage, record_usage, start_metrics_server, timer
+from pdf_utils import is_pdf, relevant_pages, truncated_pages
+from session_store import get_session_store, new_application_id
+from vin_decode import fill_vehicle_fields
 
-# Initialize OpenAI client with explicit HTTP settings to avoid proxy issues
-client = OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-    http_client=httpx.Client(
-        base_url="https://api.openai.com/v1",
-        follow_redirects=True,
-        # No proxies configuration
-    )
-)
+# --- Constants ---
+EXTRACTION_CONCURRENCY = int(os.environ.get("EXTRACTION_CONCURRENCY", 64)) # extractions in flight across all chat sessions
+UPLOAD_ORDER = ("nys_license", "tlc_license", "vehicle_title") # upload steps every application walks through, in order
+
+# Async OpenAI client on the shared keep-alive pool: extractions wait on the event loop, not on worker threads
+client = get_async_openai_client(os.environ.get("OPENAI_API_KEY"))
+extraction_slots = asyncio.Semaphore(EXTRACTION_CONCURRENCY)
+_warm_up_task: Optional[asyncio.Task] = None
+start_metrics_server() # no-op unless METRICS_PORT is set
 
 # RioContent class for multilingual message management
 class RioContent:
@@ -39,6 +46,7 @@ class RioContent:
                 "vehicle_title_intro": "You're doing great! Now, please upload a clear image of your Vehicle Certificate of Title.",
                 "vehicle_title_review": "Awesome! Let's review the extracted information and make any necessary edits.",
                 "vehicle_title_confirm": "Thank you for confirming your Vehicle Title information.",
+                "upload_ahead_hint": "Tip: you can attach your next documents too, in order (TLC Hack License, then Vehicle Title). I'll read them while you review this one.",
                 
                 # Contact information
                 "contact_info_intro": "Almost done! I just need your contact information to complete your application.",
@@ -68,6 +76,7 @@ If you have any questions in the meantime, just ask—I'm always happy to help!
                 
                 # Errors and processing
                 "processing_document": "Processing your document... Please wait. This usually takes about 10-15 seconds. ⏳",
+                "pdf_pages_truncated": "⚠️ Only the first {limit} pages of your PDF were read; pages {first}–{last} were not. Please upload them separately.",
                 "document_success": "✅ Document processed successfully!",
                 "document_error": "❌ There was an issue processing your document. Would you like to try again or enter the information manually?",
                 "confirmation_number": "Your confirmation number: APP-",
@@ -82,6 +91,13 @@ If you have any questions in the meantime, just ask—I'm always happy to help!
                 "btn_english": "English",
                 "btn_spanish": "Español",
                 "btn_chinese": "中文",
+                "upload_mode": "Would you like to upload all your documents at once, or one at a time?",
+                "btn_upload_all": "📎 All at once",
+                "btn_upload_one": "📄 One at a time",
+                "bulk_upload_intro": "Please upload your NYS Driver License, TLC Hack License, Vehicle Title and, if you have one, your Radio Base Certification Letter. I'll sort them out.",
+                "bulk_summary": "Here's what I read from your documents. You can change anything at the review step.",
+                "bulk_unrecognized": "I couldn't tell what this document is, so I skipped it:",
+                "bulk_duplicate": "I already have this kind of document, so I skipped this one:",
                 
                 # Additional questions
                 "owned_by_self": "Is this vehicle owned and operated only by yourself or spouse?",
@@ -109,6 +125,7 @@ If you have any questions in the meantime, just ask—I'm always happy to help!
                 "vehicle_title_intro": "¡Lo estás haciendo muy bien! Ahora, por favor sube una imagen clara del certificado de título de tu vehículo.",
                 "vehicle_title_review": "¡Genial! Revisemos la información extraída y hagamos las correcciones necesarias.",
                 "vehicle_title_confirm": "Gracias por confirmar la información del título de tu vehículo.",
+                "upload_ahead_hint": "Consejo: también puedes adjuntar tus siguientes documentos, en orden (licencia TLC y luego título del vehículo). Los leeré mientras revisas este.",
                 
                 # Contact information
                 "contact_info_intro": "¡Ya casi terminamos! Solo necesito tu información de contacto para completar tu solicitud.",
@@ -138,6 +155,7 @@ Si tienes alguna pregunta mientras tanto, no dudes en consultarme, ¡siempre est
                 
                 # Errors and processing
                 "processing_document": "Procesando tu documento... Por favor espera. Esto normalmente toma entre 10-15 segundos. ⏳",
+                "pdf_pages_truncated": "⚠️ Solo se leyeron las primeras {limit} páginas de tu PDF; las páginas {first}–{last} no. Por favor súbelas por separado.",
                 "document_success": "✅ ¡Documento procesado con éxito!",
                 "document_error": "❌ Hubo un problema al procesar tu documento. ¿Te gustaría intentarlo de nuevo o ingresar la información manualmente?",
                 "confirmation_number": "Tu número de confirmación: APP-",
@@ -152,6 +170,13 @@ Si tienes alguna pregunta mientras tanto, no dudes en consultarme, ¡siempre est
                 "btn_english": "English",
                 "btn_spanish": "Español",
                 "btn_chinese": "中文",
+                "upload_mode": "¿Quieres subir todos tus documentos a la vez o uno por uno?",
+                "btn_upload_all": "📎 Todos a la vez",
+                "btn_upload_one": "📄 Uno por uno",
+                "bulk_upload_intro": "Por favor sube tu licencia de conducir de NY, tu licencia TLC, el título del vehículo y, si la tienes, tu carta de certificación de la base de radio. Yo los ordenaré.",
+                "bulk_summary": "Esto es lo que leí de tus documentos. Puedes cambiar cualquier dato en el paso de revisión.",
+                "bulk_unrecognized": "No pude identificar este documento, así que lo omití:",
+                "bulk_duplicate": "Ya tengo un documento de este tipo, así que omití este:",
                 
                 # Additional questions
                 "owned_by_self": "¿Este vehículo es propiedad y está operado únicamente por ti o tu cónyuge?",
@@ -179,6 +204,7 @@ Si tienes alguna pregunta mientras tanto, no dudes en consultarme, ¡siempre est
                 "vehicle_title_intro": "您做得很好！现在，请上传您的车辆所有权证明的清晰图像。",
                 "vehicle_title_review": "太好了！让我们检查提取的信息并进行必要的编辑。",
                 "vehicle_title_confirm": "感谢您确认您的车辆所有权信息。",
+                "upload_ahead_hint": "提示：您也可以按顺序附上接下来的文件（TLC执照，然后是车辆所有权证明）。在您检查这份文件时，我会先读取它们。",
                 
                 # Contact information
                 "contact_info_intro": "几乎完成了！我只需要您的联系信息来完成您的申请。",
@@ -208,6 +234,7 @@ Si tienes alguna pregunta mientras tanto, no dudes en consultarme, ¡siempre est
                 
                 # Errors and processing
                 "processing_document": "正在处理您的文档...请稍候。这通常需要约10-15秒。⏳",
+                "pdf_pages_truncated": "⚠️ 仅读取了您PDF的前{limit}页；第{first}–{last}页未读取。请单独上传这些页面。",
                 "document_success": "✅ 文档处理成功！",
                 "document_error": "❌ 处理您的文档时出现问题。您想重试还是手动输入信息？",
                 "confirmation_number": "您的确认号码：APP-",
@@ -222,6 +249,13 @@ Si tienes alguna pregunta mientras tanto, no dudes en consultarme, ¡siempre est
                 "btn_english": "English",
                 "btn_spanish": "Español",
                 "btn_chinese": "中文",
+                "upload_mode": "您想一次上传所有文件，还是逐个上传？",
+                "btn_upload_all": "📎 一次全部上传",
+                "btn_upload_one": "📄 逐个上传",
+                "bulk_upload_intro": "请上传您的纽约州驾驶执照、TLC执照、车辆所有权证明，以及（如有）无线电基地认证信。我会自动分类。",
+                "bulk_summary": "以下是我从您的文件中读取的信息。您可以在审核步骤中修改任何内容。",
+                "bulk_unrecognized": "我无法识别此文件，已跳过：",
+                "bulk_duplicate": "我已经有这类文件，已跳过此文件：",
                 
                 # Additional questions
                 "owned_by_self": "这辆车是仅由您自己或配偶拥有和操作的吗？",
@@ -257,6 +291,16 @@ DOCUMENT_TYPES = {
     "radio_base_cert": "Radio Base Certification Letter"
 }
 
+EXTRACTION_PROMPTS = {
+    "nys_license": "Extract the following information from this New York State Driver License: license number, first name, middle name (if present), last name, address, city, state, ZIP code. Return the data in JSON format with these field names: nys_license_number, first_name, middle_name, last_name, address, city, state, zip.",
+    "tlc_license": "Extract the following information from this TLC Hack License: license number, first name, last name. Return the data in JSON format with these field names: tlc_hack_license_number, first_name, last_name.",
+    "vehicle_title": "Extract the following information from this Vehicle Certificate of Title: VIN number (all 17 characters exactly as printed), vehicle make, vehicle model, vehicle year, owner name. Return the data in JSON format with these field names: vehicle_vin_number, vehicle_make, vehicle_model, vehicle_model_year, owner_name.",
+    "radio_base_cert": "Extract the following information from this Radio Base Certification Letter: radio base name. Return the data in JSON format with field name: affiliated_radio_base.",
+}
+# Bulk uploads classify and extract in the same call, so each file is one round trip
+BULK_PROMPT = "This image is one of the documents below. Return JSON with document_type set to the matching key (or \"unknown\" if it is none of them) and the fields listed for that document.\n" + \
+    "\n".join(f"- {key} ({DOCUMENT_TYPES[key]}): {prompt}" for key, prompt in EXTRACTION_PROMPTS.items())
+
 # Define data models
 class PersonalInfo(BaseModel):
     first_name: Optional[str] = None
@@ -294,7 +338,7 @@ class ApplicationFormData(BaseModel):
     additional_info: AdditionalInfo = Field(default_factory=AdditionalInfo)
     language: str = "en"
     documents: Dict[str, str] = Field(default_factory=dict)
-    application_id: str = Field(default_factory=lambda: f"{100000 + hash(str(id(object()))) % 900000}")
+    application_id: str = Field(default_factory=new_application_id)
     
     def to_dict(self):
         return json.loads(self.json())
@@ -303,28 +347,43 @@ class ApplicationFormData(BaseModel):
     def from_dict(cls, data):
         return cls(**data)
 
-# Track application state
-@cl.cache
+# Track application state per Chainlit conversation. The live objects sit in the user session; the session store
+# (see session_store.py) holds a copy so another worker, or this one after a reconnect, can pick the session up.
+def _session_key() -> str:
+    session = cl.context.session
+    return getattr(session, "thread_id", None) or session.id # the thread id survives reconnects; the socket's id does not
+
+def _session_state() -> Dict[str, Any]:
+    state = cl.user_session.get("intake_state")
+    if state is None:
+        saved = get_session_store().get(_session_key())
+        state = {"data": ApplicationFormData.from_dict(saved["data"]), "step": saved["step"], "bulk_filled": saved.get("bulk_filled", [])} if saved \
+            else {"data": ApplicationFormData(), "step": "welcome", "bulk_filled": []}
+        cl.user_session.set("intake_state", state)
+    return state
+
+def save_session():
+    """Writes the session's application data, step and bulk-filled documents through to the session store."""
+    state = _session_state()
+    get_session_store().put(_session_key(), {"data": state["data"].to_dict(), "step": state["step"], "bulk_filled": state["bulk_filled"]})
+
 def get_application_data():
-    if not hasattr(get_application_data, "data"):
-        get_application_data.data = ApplicationFormData()
-    return get_application_data.data
+    return _session_state()["data"]
 
 # Reset application data
 def reset_application_data():
-    get_application_data.data = ApplicationFormData()
-    return get_application_data.data
+    state = _session_state()
+    state["data"], state["bulk_filled"] = ApplicationFormData(), []
+    save_session()
+    return state["data"]
 
-@cl.cache
 def get_current_step():
-    if not hasattr(get_current_step, "step"):
-        get_current_step.step = "welcome"
-    return get_current_step.step
+    return _session_state()["step"]
 
-@cl.cache
 def set_current_step(step):
-    get_current_step.step = step
-    return get_current_step.step
+    _session_state()["step"] = step
+    save_session() # step changes are the checkpoints; answers given since the last one are saved with it
+    return step
 
 # Updated function to get content safely from AskUserMessage response
 def get_response_content(response):
@@ -343,39 +402,90 @@ def get_response_content(response):
 # Document processing with GPT-4o
 async def process_document_with_gpt4o(file_data: bytes, document_type: str) -> Dict[str, Any]:
     try:
-        # Prepare base64 encoded image
-        base64_image = base64.b64encode(file_data).decode('utf-8')
+        results = await extract_pages(file_data, document_type)
+        if not results:
+            return {"error": "Failed to process document: no readable pages found"}
+        return merge_pages(results)
         
-        # Create appropriate prompt based on document type
-        if document_type == "nys_license":
-            prompt = "Extract the following information from this New York State Driver License: license number, first name, middle name (if present), last name, address, city, state, ZIP code. Return the data in JSON format with these field names: nys_license_number, first_name, middle_name, last_name, address, city, state, zip."
-        elif document_type == "tlc_license":
-            prompt = "Extract the following information from this TLC Hack License: license number, first name, last name. Return the data in JSON format with these field names: tlc_hack_license_number, first_name, last_name."
-        elif document_type == "vehicle_title":
-            prompt = "Extract the following information from this Vehicle Certificate of Title: VIN number, vehicle make, vehicle model, vehicle year, owner name. Return the data in JSON format with these field names: vehicle_vin_number, vehicle_make, vehicle_model, vehicle_model_year, owner_name."
-        else:
-            prompt = "Extract the following information from this Radio Base Certification Letter: radio base name. Return the data in JSON format with field name: affiliated_radio_base."
+    except Exception as e:
+        cl.logger.error(f"Error processing document: {str(e)}")
+        return {"error": f"Failed to process document: {str(e)}"}
+
+async def classify_document_pages(file_data: bytes) -> List[Dict[str, Any]]:
+    """Bulk uploads: one merged result per document type found in the file, in page order.
+
+    A PDF can hold several documents, so pages are merged only with pages classified as the same type.
+    """
+    try:
+        results = await extract_pages(file_data, "bulk")
+        if not results:
+            return [{"error": "Failed to process document: no readable pages found"}]
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for result in results: by_type.setdefault(result.pop("document_type", None) or "unknown", []).append(result)
+        return [dict(merge_pages(pages), document_type=document_type) for document_type, pages in by_type.items()]
         
-        # Call OpenAI API
-        response = await cl.make_async(client.chat.completions.create)(
+    except Exception as e:
+        cl.logger.error(f"Error processing document: {str(e)}")
+        return [{"error": f"Failed to process document: {str(e)}"}]
+
+async def extract_pages(file_data: bytes, document_type: str) -> List[Dict[str, Any]]:
+    # Rasterize PDFs locally and send each relevant (non-blank, non-duplicate) page as its own request
+    pages = [png for _, png in await cl.make_async(relevant_pages)(file_data)] if is_pdf(file_data) else [file_data]
+    skipped = await cl.make_async(truncated_pages)(file_data) if is_pdf(file_data) else []
+    if skipped:
+        notice = rio.get("pdf_pages_truncated", get_application_data().language)
+        await cl.Message(content=notice.format(limit=skipped[0] - 1, first=skipped[0], last=skipped[-1])).send()
+    return list(await asyncio.gather(*(extract_image_with_gpt4o(page, document_type) for page in pages)))
+
+def merge_pages(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merges page results, keeping the first non-empty value for each field."""
+    extracted_data = {}
+    for result in results:
+        for key, value in result.items():
+            if value and not extracted_data.get(key):
+                extracted_data[key] = value
+    return extracted_data
+
+def encode_image(image_data: bytes, document_type: str):
+    prepared = preprocess_image(document_type, "image/jpeg", image_data)
+    with timer("base64_encode", doc_type=document_type): return prepared, base64.b64encode(prepared.data).decode('utf-8')
+
+async def extract_image_with_gpt4o(image_data: bytes, document_type: str) -> Dict[str, Any]:
+    # On the license step a complete AAMVA barcode (back of the license) makes the vision call unnecessary;
+    # bulk uploads leave the document type to the model's classification
+    if document_type == "nys_license":
+        doc = await cl.make_async(license_from_barcode)(document_type, image_data, "NYS Driver License")
+        if doc:
+            data = dict(doc["data"])
+            data["nys_license_number"], data["zip"] = data.pop("license_number"), data.pop("zip_code")
+            return data
+    # EXIF-orient, downsample, re-encode and base64-encode; CPU-bound, so it runs off the event loop
+    prepared, base64_image = await cl.make_async(encode_image)(image_data, document_type)
+    cl.logger.info(f"Preprocessed {document_type}: saved {prepared.bytes_saved} bytes and ~{prepared.tokens_saved} image tokens")
+    
+    # Create appropriate prompt based on document type
+    prompt = BULK_PROMPT if document_type == "bulk" else EXTRACTION_PROMPTS.get(document_type, EXTRACTION_PROMPTS["radio_base_cert"])
+    
+    # Call OpenAI API
+    started = time.perf_counter()
+    async with extraction_slots:
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a document processing assistant. Extract information from the provided image and return it in clean JSON format with no additional text."},
                 {"role": "user", "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}", "detail": "high"}}
+                    {"type": "image_url", "image_url": {"url": f"data:{prepared.type};base64,{base64_image}", "detail": "high"}}
                 ]}
             ],
             response_format={"type": "json_object"}
         )
-        
-        # Parse the JSON response
-        extracted_data = json.loads(response.choices[0].message.content)
-        return extracted_data
-        
-    except Exception as e:
-        cl.logger.error(f"Error processing document: {str(e)}")
-        return {"error": f"Failed to process document: {str(e)}"}
+    
+    observe_stage("model_round_trip", time.perf_counter() - started, doc_type=document_type)
+    record_usage(response.usage, response.model, document_type)
+
+    # Parse the JSON response
+    with timer("json_parse", doc_type=document_type): return json.loads(response.choices[0].message.content)
 
 # Update application data with extracted information
 def update_application_with_extracted_data(data, document_type):
@@ -395,6 +505,8 @@ def update_application_with_extracted_data(data, document_type):
         app_data.license_info.tlc_hack_license_number = data.get("tlc_hack_license_number", app_data.license_info.tlc_hack_license_number)
     
     elif document_type == "vehicle_title":
+        # The model's make and year stand when the VIN does not decode locally; a decoded VIN fills or corrects them
+        data = fill_vehicle_fields(data, vin_key="vehicle_vin_number", year_key="vehicle_model_year")
         app_data.license_info.vehicle_vin_number = data.get("vehicle_vin_number", app_data.license_info.vehicle_vin_number)
         app_data.vehicle_info.vehicle_make = data.get("vehicle_make", app_data.vehicle_info.vehicle_make)
         app_data.vehicle_info.vehicle_model = data.get("vehicle_model", app_data.vehicle_info.vehicle_model)
@@ -410,19 +522,47 @@ def update_application_with_extracted_data(data, document_type):
         app_data.additional_info.obtains_fares_via_radio_base = True
         app_data.additional_info.affiliated_radio_base = data.get("affiliated_radio_base", app_data.additional_info.affiliated_radio_base)
     
+    save_session()
     return app_data
 
 # Chainlit setup
 @cl.on_chat_start
 async def start():
-    # Initialize application data
-    app_data = get_application_data()
-    
-    # Welcome message
-    await cl.Message(content=rio.get("welcome", "en")).send()
+    # Open the async pool's connection on the serving loop once, without delaying the welcome message
+    global _warm_up_task
+    if _warm_up_task is None: _warm_up_task = asyncio.create_task(warm_up_async("openai"))
+
+    # Welcome message, unless this conversation is picking up a saved step
+    if get_current_step() == "welcome":
+        await cl.Message(content=rio.get("welcome", "en")).send()
     
-    # Start the application process
-    await start_application()
+    # Run the application flow from the current step
+    await run_flow()
+
+@cl.on_chat_resume
+async def resume(thread):
+    await run_flow()
+
+@cl.on_chat_end
+async def end():
+    for _, extraction in extractions_ahead().values(): extraction.cancel()
+
+async def run_flow(step: Optional[str] = None):
+    """Drives the chat one step at a time: each step handler returns the next step, or None to wait for the user.
+
+    The current step is saved before its handler runs, so a reconnect resumes there, and the call stack stays one
+    step deep however many times the user edits or re-uploads.
+    """
+    if cl.user_session.get("flow_running"): return # a step is already waiting on this user
+    cl.user_session.set("flow_running", True)
+    try:
+        step = step or get_current_step()
+        while step in STEPS:
+            set_current_step(step)
+            step = await STEPS[step]()
+        if step: set_current_step(step) # terminal steps such as "done"
+    finally:
+        cl.user_session.set("flow_running", False)
 
 # Helper function to start the application process
 async def start_application():
@@ -446,64 +586,145 @@ async def start_application():
         # Update language preference
         app_data.language = language_code
         
-        # Start with NYS license request
-        await request_nys_license()
+        # Choose between one upload for everything and the document-by-document flow
+        return "upload_mode"
 
-# Request NYS Driver License
-async def request_nys_license():
-    set_current_step("nys_license_upload")
+# Offer to upload every document at once
+async def choose_upload_mode():
     app_data = get_application_data()
     
-    # Remove duplicate message - only keep the prompt in AskFileMessage
-    files = await cl.AskFileMessage(
-        content=rio.get("nys_license_intro", app_data.language),
-        accept=["image/jpeg", "image/png", "application/pdf"],
-        max_size_mb=5,
-        timeout=20000
+    res = await cl.AskActionMessage(
+        content=rio.get("upload_mode", app_data.language),
+        actions=[
+            cl.Action(name="upload_all", label=rio.get("btn_upload_all", app_data.language), payload={"step": "bulk_upload"}),
+            cl.Action(name="upload_one", label=rio.get("btn_upload_one", app_data.language), payload={"step": "nys_license_upload"})
+        ]
     ).send()
     
-    if files:
-        file = files[0]
-        await process_uploaded_file(file, "nys_license")
+    if res:
+        return res.get("payload").get("step")
 
-# Request TLC Hack License
-async def request_tlc_license():
-    set_current_step("tlc_license_upload")
+# Upload every document at once: classify and extract them concurrently, then fill the application by type
+async def request_all_documents():
     app_data = get_application_data()
     
-    # Remove duplicate message - only keep the prompt in AskFileMessage
     files = await cl.AskFileMessage(
-        content=rio.get("tlc_license_intro", app_data.language),
+        content=rio.get("bulk_upload_intro", app_data.language),
         accept=["image/jpeg", "image/png", "application/pdf"],
         max_size_mb=5,
+        max_files=len(DOCUMENT_TYPES),
         timeout=20000
     ).send()
+    if not files: return None
     
-    if files:
-        file = files[0]
-        await process_uploaded_file(file, "tlc_license")
+    processing_msg = await cl.Message(content=rio.get("processing_document", app_data.language)).send()
+    results = await asyncio.gather(*(classify_file(file) for file in files))
+    
+    # Apply in DOCUMENT_TYPES order: the title's owner check compares against the name from the license
+    by_type, skipped = {}, []
+    for file, documents in zip(files, results):
+        for data in documents:
+            document_type = data.pop("document_type", None)
+            if document_type not in DOCUMENT_TYPES or "error" in data: skipped.append(("bulk_unrecognized", file.name))
+            elif document_type in by_type: skipped.append(("bulk_duplicate", file.name))
+            else: by_type[document_type] = (file, data)
+    rows = []
+    for document_type in DOCUMENT_TYPES:
+        if document_type not in by_type: continue
+        file, data = by_type[document_type]
+        app_data.documents[document_type] = file.name
+        update_application_with_extracted_data(data, document_type)
+        rows += [{"Document": DOCUMENT_TYPES[document_type], "Field": key.replace("_", " ").title(), "Extracted Value": value}
+                 for key, value in data.items() if value]
+    
+    processing_msg.content = rio.get("document_success", app_data.language)
+    await processing_msg.update()
+    for key, name in skipped:
+        await cl.Message(content=f"{rio.get(key, app_data.language)} {name}").send()
+    if rows:
+        await cl.Message(content=rio.get("bulk_summary", app_data.language), elements=[cl.Dataframe(data=pd.DataFrame(rows), name="extracted_data")]).send()
+    
+    # Anything not recognized is asked for the usual way
+    missing = [document_type for document_type in UPLOAD_ORDER if document_type not in by_type]
+    _session_state()["bulk_filled"] = [document_type for document_type in UPLOAD_ORDER if document_type in by_type] # saved with the next step
+    return f"{missing[0]}_upload" if missing else "contact_info"
+
+# Request NYS Driver License
+async def request_nys_license():
+    return await request_document("nys_license", "nys_license_intro")
+
+# Request TLC Hack License
+async def request_tlc_license():
+    return await request_document("tlc_license", "tlc_license_intro")
 
 # Request Vehicle Title
 async def request_vehicle_title():
-    set_current_step("vehicle_title_upload")
+    return await request_document("vehicle_title", "vehicle_title_intro")
+
+# Request Radio Base Certification Letter
+async def request_radio_base_cert():
+    return await request_document("radio_base_cert", "radio_base_intro")
+
+# Ask for one document, unless the user already attached it to an earlier upload
+async def request_document(document_type: str, intro_key: str):
     app_data = get_application_data()
     
-    # Remove duplicate message - only keep the prompt in AskFileMessage
+    # Documents filled in by a bulk upload are not asked for again on the way to contact info, which clears the list
+    bulk_filled = _session_state()["bulk_filled"]
+    if document_type in bulk_filled and document_type in UPLOAD_ORDER:
+        bulk_filled.remove(document_type)
+        i = UPLOAD_ORDER.index(document_type)
+        return f"{UPLOAD_ORDER[i + 1]}_upload" if i + 1 < len(UPLOAD_ORDER) else "contact_info"
+    
+    ahead = extractions_ahead().pop(document_type, None)
+    if ahead:
+        metrics.inc("intake_prefetch_total", outcome="used")
+        file, extraction = ahead
+        return await process_uploaded_file(file, document_type, extraction)
+    
+    # Later upload steps can be answered now; their files are read while the user reviews this one
+    later = UPLOAD_ORDER[UPLOAD_ORDER.index(document_type) + 1:] if document_type in UPLOAD_ORDER else ()
+    intro = rio.get(intro_key, app_data.language)
     files = await cl.AskFileMessage(
-        content=rio.get("vehicle_title_intro", app_data.language),
+        content=f"{intro}\n\n{rio.get('upload_ahead_hint', app_data.language)}" if later else intro,
         accept=["image/jpeg", "image/png", "application/pdf"],
         max_size_mb=5,
+        max_files=1 + len(later),
         timeout=20000
     ).send()
     
     if files:
-        file = files[0]
-        await process_uploaded_file(file, "vehicle_title")
+        for file, later_type in zip(files[1:], later): extract_ahead(file, later_type)
+        return await process_uploaded_file(files[0], document_type)
+
+def extractions_ahead() -> Dict[str, Any]:
+    """{document type: (file, extraction task)} started before the flow reached that document's step."""
+    pending = cl.user_session.get("extractions_ahead")
+    if pending is None:
+        pending = {}
+        cl.user_session.set("extractions_ahead", pending)
+    return pending
+
+def extract_ahead(file: cl.File, document_type: str):
+    pending = extractions_ahead()
+    if document_type in pending: pending.pop(document_type)[1].cancel() # a newer upload replaces it
+    pending[document_type] = (file, asyncio.create_task(extract_file(file, document_type)))
+    metrics.inc("intake_prefetch_total", outcome="started")
+
+async def extract_file(file: cl.File, document_type: str) -> Dict[str, Any]:
+    with open(file.path, "rb") as f:
+        file_data = f.read()
+    return await process_document_with_gpt4o(file_data, document_type)
+
+async def classify_file(file: cl.File) -> List[Dict[str, Any]]:
+    with open(file.path, "rb") as f:
+        file_data = f.read()
+    return await classify_document_pages(file_data)
 
 # Request contact information
 async def request_contact_info():
-    set_current_step("contact_info")
     app_data = get_application_data()
+    _session_state()["bulk_filled"] = [] # the upload steps are behind us; documents edited from review are asked for again
     
     await cl.Message(
         content=rio.get("contact_info_intro", app_data.language)
@@ -518,11 +739,10 @@ async def request_contact_info():
     app_data.personal_info.email = get_response_content(email_msg)
     
     # Move to additional questions
-    await ask_additional_questions()
+    return "additional_questions"
 
 # Ask additional questions
 async def ask_additional_questions():
-    set_current_step("additional_questions")
     app_data = get_application_data()
     
     # Skip ownership question if we already determined it from documents
@@ -601,24 +821,13 @@ async def ask_additional_questions():
                 
                 # Request Radio Base cert if not already uploaded
                 if "radio_base_cert" not in app_data.documents:
-                    set_current_step("radio_base_cert_upload")
-                    
-                    files = await cl.AskFileMessage(
-                        content=rio.get("radio_base_intro", app_data.language),
-                        accept=["image/jpeg", "image/png", "application/pdf"],
-                        max_size_mb=5,
-                        timeout=20000
-                    ).send()
-                    
-                    if files:
-                        file = files[0]
-                        await process_uploaded_file(file, "radio_base_cert")
+                    return "radio_base_cert_upload"
     
     # Move to review
-    await show_review_form()
+    return "review"
 
 # Process uploaded file
-async def process_uploaded_file(file: cl.File, document_type: str):
+async def process_uploaded_file(file: cl.File, document_type: str, extraction: Optional[asyncio.Task] = None):
     app_data = get_application_data()
     
     # Show processing message
@@ -628,12 +837,8 @@ async def process_uploaded_file(file: cl.File, document_type: str):
     app_data.documents[document_type] = file.name
     
     try:
-        # Read file content
-        with open(file.path, "rb") as f:
-            file_data = f.read()
-        
-        # Process with GPT-4o
-        extracted_data = await process_document_with_gpt4o(file_data, document_type)
+        # Process with GPT-4o, or pick up the extraction started when the file was attached ahead of its step
+        extracted_data = await (extraction or extract_file(file, document_type))
         
         # Update application data
         update_application_with_extracted_data(extracted_data, document_type)
@@ -673,16 +878,16 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                 # Handle confirmation
                 if document_type == "nys_license":
                     await cl.Message(content=rio.get("nys_license_confirm", app_data.language)).send()
-                    await request_tlc_license()
+                    return "tlc_license_upload"
                 elif document_type == "tlc_license":
                     await cl.Message(content=rio.get("tlc_license_confirm", app_data.language)).send()
-                    await request_vehicle_title()
+                    return "vehicle_title_upload"
                 elif document_type == "vehicle_title":
                     await cl.Message(content=rio.get("vehicle_title_confirm", app_data.language)).send()
-                    await request_contact_info()
+                    return "contact_info"
                 elif document_type == "radio_base_cert":
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await show_review_form()
+                    return "review"
             
             elif action_name == "edit_data":
                 # Handle edit
@@ -714,7 +919,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await request_tlc_license()
+                    return "tlc_license_upload"
                 
                 elif document_type == "tlc_license":
                     # Handle TLC License manual entry
@@ -727,7 +932,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await request_vehicle_title()
+                    return "vehicle_title_upload"
                 
                 elif document_type == "vehicle_title":
                     # Handle Vehicle Title manual entry
@@ -755,7 +960,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await request_contact_info()
+                    return "contact_info"
                 
                 elif document_type == "radio_base_cert":
                     # Handle Radio Base Certificate manual entry
@@ -769,7 +974,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await show_review_form()
+                    return "review"
         
     except Exception as e:
         cl.logger.error(f"Error processing file: {str(e)}")
@@ -792,25 +997,13 @@ async def process_uploaded_file(file: cl.File, document_type: str):
             
             if action_name == "retry_upload":
                 if document_type == "nys_license":
-                    await request_nys_license()
+                    return "nys_license_upload"
                 elif document_type == "tlc_license":
-                    await request_tlc_license()
+                    return "tlc_license_upload"
                 elif document_type == "vehicle_title":
-                    await request_vehicle_title()
+                    return "vehicle_title_upload"
                 else:  # radio_base_cert
-                    set_current_step("radio_base_cert_upload")
-                    await cl.Message(content=rio.get("radio_base_intro", app_data.language)).send()
-                    
-                    files = await cl.AskFileMessage(
-                        content=rio.get("radio_base_intro", app_data.language),
-                        accept=["image/jpeg", "image/png", "application/pdf"],
-                        max_size_mb=5,
-                        timeout=20000
-                    ).send()
-                    
-                    if files:
-                        file = files[0]
-                        await process_uploaded_file(file, "radio_base_cert")
+                    return "radio_base_cert_upload"
             
             elif action_name == "manual_entry":
                 # Handle manual entry for different document types
@@ -842,7 +1035,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await request_tlc_license()
+                    return "tlc_license_upload"
                 
                 elif document_type == "tlc_license":
                     # Handle TLC License manual entry
@@ -855,7 +1048,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await request_vehicle_title()
+                    return "vehicle_title_upload"
                 
                 elif document_type == "vehicle_title":
                     # Handle Vehicle Title manual entry
@@ -883,7 +1076,7 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await request_contact_info()
+                    return "contact_info"
                 
                 elif document_type == "radio_base_cert":
                     # Handle Radio Base Certificate manual entry
@@ -897,16 +1090,15 @@ async def process_uploaded_file(file: cl.File, document_type: str):
                     
                     # Continue
                     await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                    await show_review_form()
+                    return "review"
             else:
                 await cl.Message(content=rio.get("invalid_option", app_data.language)).send()
-                await show_review_form()
+                return "review"
 
 # Show review form
 async def show_review_form():
     """Show review form with all collected data"""
     app_data = get_application_data()
-    set_current_step("review")
     
     # Create formatted display of all collected information
     await cl.Message(content=f"## {rio.get('review_intro', app_data.language)}").send()
@@ -971,7 +1163,6 @@ async def show_review_form():
             processing_msg = await cl.Message(content=rio.get("processing", app_data.language)).send()
             
             # Simulate processing delay
-            import asyncio
             await asyncio.sleep(2)
             
             # Update message with confirmation - correct pattern for Chainlit API
@@ -984,32 +1175,7 @@ async def show_review_form():
 
 **{rio.get("confirmation_number", app_data.language)}{app_data.application_id}**
             """).send()
-            
-            # Offer to start a new application or exit
-            res = await cl.AskActionMessage(
-                content=rio.get("confirm_question", app_data.language),
-                actions=[
-                    cl.Action(name="new_application", label=rio.get("new_application", app_data.language), payload={}),
-                    cl.Action(name="exit_app", label=rio.get("exit", app_data.language), payload={})
-                ]
-            ).send()
-            
-            if res:
-                action_name = res.get("name")
-                
-                if action_name == "new_application":
-                    # Reset application data
-                    reset_application_data()
-                    # Start new application
-                    await cl.Message(content=rio.get("restart", app_data.language)).send()
-                    await start()
-                    
-                elif action_name == "exit_app":
-                    # Show exit message
-                    await cl.Message(content="""
-Thank you for using our Commercial Auto Insurance Application Assistant.
-If you have any questions, please contact our support team at support@insurance.com.
-                    """).send()
+            return "submitted"
         
         elif action_name == "edit_data":
             # Allow user to select what to edit
@@ -1063,7 +1229,7 @@ Enter the number of your choice:
                 
                 # Show updated review
                 await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                await show_review_form()
+                return "review"
                 
             elif choice == "2":
                 # Edit license information
@@ -1094,7 +1260,7 @@ Enter the number of your choice:
                 
                 # Show updated review
                 await cl.Message(content=rio.get("information_updated", app_data.language)).send()
-                await show_review_form()
+                return "review"
                 
             elif choice == "3":
                 # Edit uploaded documents
@@ -1115,30 +1281,65 @@ Enter the number of your choice:
                 doc_choice = get_response_content(doc_option).strip()
                 
                 if doc_choice == "1":
-                    await request_nys_license()
+                    return "nys_license_upload"
                 elif doc_choice == "2":
-                    await request_tlc_license()
+                    return "tlc_license_upload"
                 elif doc_choice == "3":
-                    await request_vehicle_title()
+                    return "vehicle_title_upload"
                 elif doc_choice == "4":
-                    set_current_step("radio_base_cert_upload")
-                    
-                    files = await cl.AskFileMessage(
-                        content=rio.get("radio_base_intro", app_data.language),
-                        accept=["image/jpeg", "image/png", "application/pdf"],
-                        max_size_mb=5,
-                        timeout=20000
-                    ).send()
-                    
-                    if files:
-                        file = files[0]
-                        await process_uploaded_file(file, "radio_base_cert")
+                    return "radio_base_cert_upload"
                 else:
                     await cl.Message(content=rio.get("invalid_option", app_data.language)).send()
-                    await show_review_form()
+                    return "review"
             else:
                 await cl.Message(content=rio.get("invalid_option", app_data.language)).send()
-                await show_review_form()
+                return "review"
+
+# Offer a new application once one is submitted
+async def offer_new_application():
+    app_data = get_application_data()
+    
+    res = await cl.AskActionMessage(
+        content=rio.get("confirm_question", app_data.language),
+        actions=[
+            cl.Action(name="new_application", label=rio.get("new_application", app_data.language), payload={}),
+            cl.Action(name="exit_app", label=rio.get("exit", app_data.language), payload={})
+        ]
+    ).send()
+    
+    if res:
+        action_name = res.get("name")
+        
+        if action_name == "new_application":
+            # Reset application data
+            reset_application_data()
+            # Start new application
+            await cl.Message(content=rio.get("restart", app_data.language)).send()
+            await cl.Message(content=rio.get("welcome", "en")).send()
+            return "welcome"
+            
+        elif action_name == "exit_app":
+            # Show exit message
+            await cl.Message(content="""
+Thank you for using our Commercial Auto Insurance Application Assistant.
+If you have any questions, please contact our support team at support@insurance.com.
+            """).send()
+            return "done"
+
+# Step table: each handler asks for what its step needs and returns the next step (see run_flow)
+STEPS = {
+    "welcome": start_application,
+    "upload_mode": choose_upload_mode,
+    "bulk_upload": request_all_documents,
+    "nys_license_upload": request_nys_license,
+    "tlc_license_upload": request_tlc_license,
+    "vehicle_title_upload": request_vehicle_title,
+    "contact_info": request_contact_info,
+    "additional_questions": ask_additional_questions,
+    "radio_base_cert_upload": request_radio_base_cert,
+    "review": show_review_form,
+    "submitted": offer_new_application,
+}
 
 # Handle regular text messages
 @cl.on_message
@@ -1155,14 +1356,14 @@ async def on_message(message: cl.Message):
         reset_application_data()
         # Start new application
         await cl.Message(content=rio.get("restart", app_data.language)).send()
-        await start_application()
+        await run_flow("welcome")
         return
     
     # Handle review command
     if "review" in user_input or "show review" in user_input or "check application" in user_input:
         # Show review form
         await cl.Message(content=rio.get("review_intro", app_data.language)).send()
-        await show_review_form()
+        await run_flow("review")
         return
     
     # Default response
@@ -1172,13 +1373,8 @@ async def on_message(message: cl.Message):
 {rio.get("restart", app_data.language)}
     """).send()
     
-    # If no application in progress, start one
-    if not any([
-        get_application_data().personal_info.first_name,
-        get_application_data().license_info.nys_license_number,
-        get_application_data().documents
-    ]):
-        await start_application()
+    # Pick the application up where it stopped (a new one starts at "welcome")
+    await run_flow()
 
 # Requirements.txt
 """
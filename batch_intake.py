@@ -0,0 +1,142 @@
+"""Headless batch intake: extracts every applicant folder under a directory into a JSONL file.
+
+    python batch_intake.py packets/ --output results.jsonl --workers 4 --rpm 300
+
+Each immediate subdirectory of the input directory is one applicant; files anywhere below it are that
+applicant's documents. Extraction, validation and caching are the same as the Streamlit app's. Rerunning
+with the same output file skips applicants that already succeeded, so an interrupted run can be resumed.
+"""
+import argparse
+import json
+import mimetypes
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set
+from openai import OpenAI
+from aamva import fast_path_stats
+from extraction import SYSTEM_MESSAGES, EXTRACTION_MAX_WORKERS, ExtractionRun, extract_documents_parallel
+from extraction_cache import ExtractionCache
+from http_pool import get_openai_client
+from image_utils import PreparedFile
+from rate_limit import OPENAI_RPM, get_rate_limiter
+from metrics import start_metrics_server, write_metrics
+from review_model import flatten_doc_by_expected, group_flat_data, normalize_fields
+from validation import check_fields
+
+# --- Constants ---
+DOCUMENT_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".pdf"}
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 4))
+
+def find_applicants(root: str) -> List[str]:
+    return sorted(os.path.join(root, d) for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)) and not d.startswith("."))
+
+def load_documents(applicant_dir: str) -> List[PreparedFile]:
+    """Every supported file below the applicant folder, named by its path relative to the folder."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(applicant_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in DOCUMENT_EXTENSIONS: continue
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f: data = f.read()
+            mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            files.append(PreparedFile(name=os.path.relpath(path, applicant_dir), type=mime, data=data, original_size=len(data)))
+    return files
+
+def completed_applicants(output_path: str) -> Set[str]:
+    """Applicants with an "ok" record in an existing output file; a truncated last line is ignored."""
+    done = set()
+    if not os.path.exists(output_path): return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try: record = json.loads(line)
+            except json.JSONDecodeError: continue
+            if record.get("status") == "ok": done.add(record["applicant"])
+    return done
+
+def result_fields(run: ExtractionRun) -> Dict[str, Any]:
+    """The "ok" part of an output record: validated documents plus the same field flattening the review form uses."""
+    if run.failures and not run.result.documents: raise RuntimeError("No document could be processed.")
+    docs = [doc.dict() for doc in run.result.documents] # V1
+    flat = {}
+    for doc in docs: flat.update(flatten_doc_by_expected(doc))
+    fields = {cat: normalize_fields(cat, values) for cat, values in group_flat_data(flat).items()}
+    # Same local checks as the review form, so downstream review can start from the flagged fields
+    invalid = {f"{cat} - {name}": check.message for cat, values in fields.items()
+               for name, check in check_fields(values).items() if not check.valid}
+    return dict(status="ok", documents=docs, fields=fields, invalid_fields=invalid, failures=run.failures, truncated_pages=run.truncated_pages)
+
+def write_record(out: Any, record: Dict[str, Any]) -> None:
+    # One flushed line per applicant: a crash loses at most the applicants still in flight
+    out.write(json.dumps(record, ensure_ascii=False) + "\n"); out.flush(); os.fsync(out.fileno())
+
+def process_applicant(client: OpenAI, applicant_dir: str, sys_message: str, owned_by_self: str,
+                      cache: Optional[ExtractionCache], group_workers: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    record = {"applicant": os.path.basename(applicant_dir), "path": applicant_dir}
+    try:
+        files = load_documents(applicant_dir)
+        if not files: raise ValueError("no supported documents found")
+        run = extract_documents_parallel(client, files, sys_message, owned_by_self, cache, max_workers=group_workers)
+        record.update(result_fields(run), files=len(files))
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["elapsed"] = round(time.perf_counter() - started, 3)
+    return record
+
+def run_batch(input_dir: str, output_path: str, workers: int = BATCH_WORKERS, group_workers: int = 2, rpm: float = OPENAI_RPM,
+              language: str = "English", owned_by_self: str = "No", use_cache: bool = True, api_key: Optional[str] = None) -> Dict[str, Any]:
+    applicants = find_applicants(input_dir)
+    done = completed_applicants(output_path)
+    todo = [a for a in applicants if os.path.basename(a) not in done]
+    print(f"{len(applicants)} applicant(s), {len(done)} already done, {len(todo)} to process")
+    # The process-wide limiter and pooled client, so every OpenAI caller in the process shares one budget
+    limiter = get_rate_limiter("openai", rpm=rpm)
+    client = get_openai_client(api_key or os.environ.get("OPENAI_API_KEY"))
+    cache = ExtractionCache() if use_cache else None
+    counts = {"ok": 0, "error": 0, "files": 0, "documents": 0}
+    write_lock = threading.Lock()
+    started = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="applicant") as pool:
+        futures = [pool.submit(process_applicant, client, a, SYSTEM_MESSAGES[language], owned_by_self, cache, group_workers) for a in todo]
+        for i, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            with write_lock: write_record(out, record)
+            counts[record["status"]] += 1
+            counts["files"] += record.get("files", 0); counts["documents"] += len(record.get("documents", []))
+            detail = f"{len(record['documents'])} document(s)" if record["status"] == "ok" else record["error"]
+            print(f"[{i}/{len(todo)}] {record['applicant']}: {record['status']} in {record['elapsed']:.1f}s - {detail}")
+    elapsed = time.perf_counter() - started
+    report = dict(counts, applicants=len(todo), elapsed=round(elapsed, 3),
+                  applicants_per_minute=round(len(todo) / elapsed * 60, 2) if elapsed else 0.0,
+                  files_per_second=round(counts["files"] / elapsed, 3) if elapsed else 0.0,
+                  rate_limit=limiter.stats())
+    if cache: report["cache"] = cache.stats()
+    report["barcode_fast_path"] = fast_path_stats()
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Extract applicant document folders to JSONL without the Streamlit UI.")
+    parser.add_argument("input_dir", help="directory containing one subdirectory per applicant")
+    parser.add_argument("--output", "-o", default="batch_results.jsonl", help="JSONL file to append results to (also used to resume)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="applicants processed concurrently")
+    parser.add_argument("--group-workers", type=int, default=min(2, EXTRACTION_MAX_WORKERS), help="concurrent requests per applicant")
+    parser.add_argument("--rpm", type=float, default=OPENAI_RPM, help="max OpenAI requests per minute across all workers")
+    parser.add_argument("--language", choices=sorted(SYSTEM_MESSAGES), default="English")
+    parser.add_argument("--owned-by-self", choices=["Yes", "No"], default="No")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the extraction cache")
+    parser.add_argument("--metrics-dir", help="write metrics.prom and metrics.json here when the run finishes")
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve /metrics and /metrics.json while running")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.input_dir): parser.error(f"not a directory: {args.input_dir}")
+    start_metrics_server(args.metrics_port)
+    report = run_batch(args.input_dir, args.output, args.workers, args.group_workers, args.rpm, args.language, args.owned_by_self, not args.no_cache)
+    if args.metrics_dir: write_metrics(args.metrics_dir)
+    print(json.dumps(report, indent=2))
+    return 1 if report["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
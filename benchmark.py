@@ -0,0 +1,176 @@
+"""End-to-end benchmarks against local fake OpenAI and MVRNow servers.
+
+    python benchmark.py --concurrency 1,4,16 --iterations 40 --openai-latency lognormal:800:0.5 --output bench.json
+    python benchmark.py --compare bench.json        # rerun and show p95/throughput changes against a saved run
+
+Scenarios:
+- extract_parallel / extract_single: the Process button's extraction
+- mvr_pull: pull_mvr_record
+- review_model: the review-form flattening (formerly flatten_all_data)
+- app_process_document: app.py's process_document_with_gpt4o, skipped when chainlit is not installed
+
+Each scenario runs at every concurrency level. The report gives p50/p95/p99 latency, throughput, error rate
+and the process's peak RSS, and is saved as JSON so runs can be compared.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from PIL import Image
+from extraction import SYSTEM_MESSAGES, ExtractionResult, extract_documents, extract_documents_parallel
+from fake_mvrnow import FakeMvrNowServer
+from fake_openai import FakeOpenAIServer, FaultProfile
+from http_pool import get_openai_client
+from image_utils import PreparedFile
+from mvr import pull_mvr_record
+from rate_limit import get_rate_limiter
+from review_model import build_review_model
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# --- Constants ---
+SCENARIOS = ("extract_parallel", "extract_single", "mvr_pull", "review_model", "app_process_document")
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # bytes on macOS, KiB on Linux
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))]
+
+def synthetic_photo(seed: int, size=(1600, 1200)) -> bytes:
+    """A noisy JPEG roughly the size and entropy of a phone photo of a document."""
+    rng = random.Random(seed)
+    img = Image.effect_noise(size, 40).convert("RGB")
+    img.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (100, 100, 700, 500))
+    buf = io.BytesIO(); img.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+def synthetic_result(documents: int) -> ExtractionResult:
+    types = ["NYS Driver License", "TLC Hack License", "Vehicle Certificate of Title", "Radio Base Certification Letter", "Other Driver's License"]
+    return ExtractionResult.parse_obj({"documents": [
+        {"type": types[i % len(types)], "filename": f"doc_{i}.jpg",
+         "data": {"license_number": f"{i:09d}", "first_name": "TEST", "last_name": f"DRIVER{i}", "state": "NY", "VIN": "1HGCM82633A004352",
+                  "vehicle_make": "HONDA", "vehicle_model": "ACCORD", "vehicle_year": "2003", "radio_base_name": "BASE"}}
+        for i in range(documents)]})
+
+def run_scenario(name: str, fn: Callable[[int], Any], is_error: Callable[[Any], bool], concurrency: int, iterations: int) -> Dict[str, Any]:
+    def timed(i: int):
+        started = time.perf_counter()
+        try: failed = is_error(fn(i))
+        except Exception: failed = True
+        return time.perf_counter() - started, failed
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"bench-{name}") as pool:
+        outcomes = list(pool.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in outcomes)
+    errors = sum(1 for _, failed in outcomes if failed)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {"scenario": name, "concurrency": concurrency, "calls": iterations, "errors": errors, "error_rate": round(errors / iterations, 4),
+            "p50_ms": ms(percentile(latencies, 0.50)), "p95_ms": ms(percentile(latencies, 0.95)), "p99_ms": ms(percentile(latencies, 0.99)),
+            "mean_ms": ms(sum(latencies) / len(latencies)), "max_ms": ms(latencies[-1]), "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(iterations / elapsed, 2), "peak_rss_mb": peak_rss_mb()}
+
+def build_scenarios(args: argparse.Namespace, mvr_endpoint: str) -> Dict[str, Optional[tuple]]:
+    """name -> (fn(i), is_error(result)), or None with the reason printed when unavailable."""
+    client = get_openai_client("benchmark")
+    photos = [synthetic_photo(seed) for seed in range(args.files_per_packet)]
+    packet = lambda i: [PreparedFile(name=f"packet{i}_doc{n}.jpg", type="image/jpeg", data=data, original_size=len(data)) for n, data in enumerate(photos)]
+    extraction_failed = lambda run: bool(run.failures)
+    result = synthetic_result(args.review_documents)
+    scenarios = {
+        "extract_parallel": (lambda i: extract_documents_parallel(client, packet(i), SYSTEM_MESSAGES["English"]), extraction_failed),
+        "extract_single": (lambda i: extract_documents(client, packet(i), SYSTEM_MESSAGES["English"]), extraction_failed),
+        "mvr_pull": (lambda i: pull_mvr_record("benchmark", "NY", f"{i:09d}", "TEST", "DRIVER", endpoint=mvr_endpoint), lambda res: bool(res.get("Error"))),
+        "review_model": (lambda i: build_review_model(result), lambda model: False),
+    }
+    try:
+        import app # needs chainlit; imported late so OPENAI_BASE_URL already points at the fake server
+        scenarios["app_process_document"] = (lambda i: asyncio.run(app.process_document_with_gpt4o(photos[i % len(photos)], "nys_license")),
+                                             lambda res: "error" in res)
+    except ImportError as e:
+        print(f"Note: skipping app_process_document ({e})")
+        scenarios["app_process_document"] = None
+    return scenarios
+
+def git_revision() -> Optional[str]:
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+def compare(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> None:
+    old = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    print(f"\n{'scenario':<22}{'conc':>5}{'p95 ms':>12}{'Δp95':>9}{'thr/s':>10}{'Δthr':>9}")
+    for r in current:
+        before = old.get((r["scenario"], r["concurrency"]))
+        delta = lambda key: f"{(r[key] - before[key]) / before[key] * 100:+.1f}%" if before and before[key] else "n/a"
+        print(f"{r['scenario']:<22}{r['concurrency']:>5}{r['p95_ms']:>12.1f}{delta('p95_ms'):>9}{r['throughput_per_s']:>10.2f}{delta('throughput_per_s'):>9}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark extraction, MVR pulls and review-form building against local fakes.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=32, help="calls per scenario and concurrency level")
+    parser.add_argument("--files-per-packet", type=int, default=3, help="document photos per extraction call")
+    parser.add_argument("--review-documents", type=int, default=50, help="documents in the review_model input")
+    parser.add_argument("--openai-latency", default="lognormal:800:0.5")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-error-status", type=int, default=500)
+    parser.add_argument("--openai-payload-bytes", type=int, default=0)
+    parser.add_argument("--mvr-latency", default="lognormal:1500:0.4")
+    parser.add_argument("--mvr-error-rate", type=float, default=0.0)
+    parser.add_argument("--mvr-error-status", type=int, default=500)
+    parser.add_argument("--mvr-payload-bytes", type=int, default=0)
+    parser.add_argument("--mvr-events", type=int, default=3)
+    parser.add_argument("--rpm", type=float, default=100000, help="OpenAI rate limiter requests/min (default effectively unlimited)")
+    parser.add_argument("--tpm", type=float, default=1e9, help="OpenAI rate limiter tokens/min")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", "-o", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown: parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    openai_profile = FaultProfile(args.openai_latency, args.openai_error_rate, args.openai_error_status, args.openai_payload_bytes, args.seed)
+    mvr_profile = FaultProfile(args.mvr_latency, args.mvr_error_rate, args.mvr_error_status, args.mvr_payload_bytes, args.seed)
+    with FakeOpenAIServer(profile=openai_profile) as fake_openai, FakeMvrNowServer(profile=mvr_profile, events=args.mvr_events) as fake_mvr:
+        os.environ["OPENAI_BASE_URL"] = fake_openai.base_url # read by every OpenAI client created from here on
+        get_rate_limiter("openai", rpm=args.rpm, tpm=args.tpm) # first call configures the shared limiter
+        scenarios = build_scenarios(args, fake_mvr.order_endpoint)
+        results = []
+        for name in selected:
+            if scenarios.get(name) is None: continue
+            fn, is_error = scenarios[name]
+            for level in levels:
+                result = run_scenario(name, fn, is_error, level, args.iterations)
+                results.append(result)
+                print(f"{name:<22} c={level:<3} p50={result['p50_ms']:>9.1f}ms p95={result['p95_ms']:>9.1f}ms p99={result['p99_ms']:>9.1f}ms "
+                      f"{result['throughput_per_s']:>8.2f}/s errors={result['error_rate']:.1%} rss={result['peak_rss_mb']}MB")
+
+    report = {"meta": {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git": git_revision(), "python": platform.python_version(),
+                       "platform": platform.platform(), "args": vars(args), "openai": openai_profile.describe(), "mvrnow": mvr_profile.describe()},
+              "results": results}
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: compare(results, json.load(f)["results"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Offline bulk extraction through the OpenAI Batch API (submit now, collect when the batches finish).
+
+    python bulk_extract.py submit packets/ --workdir bulk_run/
+    python bulk_extract.py collect --workdir bulk_run/ --output results.jsonl --wait
+    python bulk_extract.py run packets/ --workdir bulk_run/ --output results.jsonl   # submit, wait, collect
+
+Applicant folders are read exactly like batch_intake.py, and results are written in the same JSONL format.
+`submit` serializes the same per-group chat completion requests that the interactive path sends, splits them
+into batch input files within the Batch API limits, and records everything `collect` needs in
+<workdir>/manifest.json. Point OPENAI_BASE_URL at fake_openai.py to run the whole flow offline.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+from openai import OpenAI
+from batch_intake import completed_applicants, find_applicants, load_documents, result_fields, write_record
+from extraction import (SYSTEM_MESSAGES, ExtractionRun, completion_request, file_key, finalize_documents, lookup_cached,
+                        parse_completion_content, plan_groups, validate_documents)
+from extraction_cache import ExtractionCache
+from image_utils import prepare_file
+from pdf_utils import expand_pdfs
+
+# --- Constants ---
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", 50000)) # Batch API limits per input file
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", 190 * 1024 * 1024)) # 200 MB limit, with headroom
+BATCH_POLL_INTERVAL = float(os.environ.get("BATCH_POLL_INTERVAL", 30.0))
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+class BatchInputWriter:
+    """Appends request lines to numbered JSONL input files, starting a new file before either limit is exceeded."""
+    def __init__(self, workdir: str, max_requests: int = BATCH_MAX_REQUESTS, max_bytes: int = BATCH_MAX_BYTES):
+        self.workdir, self.max_requests, self.max_bytes = workdir, max_requests, max_bytes
+        self.paths: List[str] = []
+        self._file, self._requests, self._bytes = None, 0, 0
+
+    def write(self, line: Dict[str, Any]) -> None:
+        data = (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+        if self._file is None or self._requests >= self.max_requests or self._bytes + len(data) > self.max_bytes:
+            self._roll()
+        self._file.write(data); self._requests += 1; self._bytes += len(data)
+
+    def _roll(self) -> None:
+        if self._file: self._file.close()
+        path = os.path.join(self.workdir, f"batch_input_{len(self.paths):03d}.jsonl")
+        self._file, self._requests, self._bytes = open(path, "wb"), 0, 0
+        self.paths.append(path)
+
+    def close(self) -> None:
+        if self._file: self._file.close(); self._file = None
+
+def manifest_path(workdir: str) -> str: return os.path.join(workdir, "manifest.json")
+
+def load_manifest(workdir: str) -> Dict[str, Any]:
+    with open(manifest_path(workdir), encoding="utf-8") as f: return json.load(f)
+
+def save_manifest(workdir: str, manifest: Dict[str, Any]) -> None:
+    tmp = manifest_path(workdir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, manifest_path(workdir))
+
+def prepare_requests(input_dir: str, workdir: str, sys_message: str, cache: Optional[ExtractionCache], skip: set) -> Dict[str, Any]:
+    """Writes batch input files for every applicant not in `skip` and returns the manifest (without batch ids)."""
+    os.makedirs(workdir, exist_ok=True)
+    writer = BatchInputWriter(workdir)
+    applicants, requests = {}, {}
+    for applicant_dir in find_applicants(input_dir):
+        name = os.path.basename(applicant_dir)
+        if name in skip: continue
+        uploaded = load_documents(applicant_dir)
+        files, truncated = expand_pdfs(uploaded)
+        cached_docs, pending, duplicates = lookup_cached(files, cache)
+        # Responses are matched by filename, which is unique here: each name is a path relative to the applicant folder
+        keys = {file.name: file_key(file) for file in pending + [dup for dups in duplicates.values() for dup in dups]}
+        custom_ids = []
+        for i, group in enumerate(plan_groups(pending)):
+            custom_id = f"{name}::{i}"
+            writer.write({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT,
+                          "body": completion_request([prepare_file(file) for file in group], sys_message)})
+            requests[custom_id] = {"applicant": name, "files": [file.name for file in group]}
+            custom_ids.append(custom_id)
+        applicants[name] = {"path": applicant_dir, "files": len(uploaded), "order": [file.name for file in files],
+                            "cached": cached_docs, "keys": keys, "requests": custom_ids, "truncated_pages": truncated,
+                            "duplicates": {rep: [dup.name for dup in dups] for rep, dups in duplicates.items()}}
+    writer.close()
+    return {"created_at": time.time(), "applicants": applicants, "requests": requests,
+            "batches": [{"input_path": path, "id": None, "status": "not_submitted"} for path in writer.paths]}
+
+def submit(client: OpenAI, input_dir: str, workdir: str, output_path: str, language: str = "English", owned_by_self: str = "No", use_cache: bool = True) -> Dict[str, Any]:
+    if os.path.exists(manifest_path(workdir)):
+        manifest = load_manifest(workdir)
+        print(f"Resuming submission from {manifest_path(workdir)}")
+    else:
+        manifest = prepare_requests(input_dir, workdir, SYSTEM_MESSAGES[language], ExtractionCache() if use_cache else None, completed_applicants(output_path))
+        manifest.update(language=language, owned_by_self=owned_by_self, use_cache=use_cache)
+        save_manifest(workdir, manifest)
+    for batch in manifest["batches"]:
+        if batch["id"]: continue
+        with open(batch["input_path"], "rb") as f: input_file = client.files.create(file=f, purpose="batch")
+        created = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW,
+                                        metadata={"source": "intake-streamlit", "input": os.path.basename(batch["input_path"])})
+        batch.update(id=created.id, input_file_id=input_file.id, status=created.status, submitted_at=time.time())
+        save_manifest(workdir, manifest) # after every batch, so a crash never submits the same input twice
+        print(f"Submitted {os.path.basename(batch['input_path'])} as {created.id}")
+    print(f"{len(manifest['applicants'])} applicant(s), {len(manifest['requests'])} request(s), {len(manifest['batches'])} batch(es)")
+    return manifest
+
+def poll(client: OpenAI, workdir: str, wait: bool = False, interval: float = BATCH_POLL_INTERVAL) -> Dict[str, Any]:
+    """Refreshes batch statuses in the manifest; with `wait`, keeps polling until every batch is terminal."""
+    manifest = load_manifest(workdir)
+    while True:
+        for batch in manifest["batches"]:
+            if not batch["id"] or batch["status"] in TERMINAL_STATES: continue
+            remote = client.batches.retrieve(batch["id"])
+            batch.update(status=remote.status, output_file_id=remote.output_file_id, error_file_id=remote.error_file_id,
+                         request_counts=remote.request_counts.dict() if remote.request_counts else None) # V1
+            if remote.status in TERMINAL_STATES: batch["finished_at"] = time.time()
+        save_manifest(workdir, manifest)
+        print("; ".join(f"{b['id']}: {b['status']}" for b in manifest["batches"]))
+        if not wait or all(b["status"] in TERMINAL_STATES for b in manifest["batches"] if b["id"]): return manifest
+        time.sleep(interval)
+
+def download_responses(client: OpenAI, manifest: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """custom_id -> {"content": ...} or {"error": ...} across every finished batch's output and error files."""
+    responses = {}
+    for batch in manifest["batches"]:
+        for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+            if not file_id: continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip(): continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    error = item.get("error") or (response.get("body") or {}).get("error") or {}
+                    responses[item["custom_id"]] = {"error": f"{error.get('code', response.get('status_code'))}: {error.get('message', 'request failed')}"}
+                else: responses[item["custom_id"]] = {"content": response["body"]["choices"][0]["message"]["content"]}
+    return responses
+
+def collect(client: OpenAI, workdir: str, output_path: str) -> Dict[str, Any]:
+    """Maps batch responses back to one ExtractionResult per applicant and appends them to `output_path`."""
+    manifest = load_manifest(workdir)
+    responses = download_responses(client, manifest)
+    cache = ExtractionCache() if manifest.get("use_cache", True) else None
+    done = completed_applicants(output_path)
+    counts = {"ok": 0, "error": 0, "skipped": 0, "documents": 0, "missing_responses": 0}
+    with open(output_path, "a", encoding="utf-8") as out:
+        for name, applicant in manifest["applicants"].items():
+            if name in done: counts["skipped"] += 1; continue
+            record = {"applicant": name, "path": applicant["path"]}
+            docs, failures = list(applicant["cached"]), {}
+            try:
+                if not applicant["files"]: raise ValueError("no supported documents found")
+                copies = applicant.get("duplicates", {}) # copies of one image were sent once
+                for custom_id in applicant["requests"]:
+                    request, response = manifest["requests"][custom_id], responses.get(custom_id)
+                    names = request["files"] + [dup for f in request["files"] for dup in copies.get(f, [])]
+                    if response is None:
+                        counts["missing_responses"] += 1
+                        failures.update({f: "no response from batch" for f in names}); continue
+                    if "error" in response:
+                        failures.update({f: response["error"] for f in names}); continue
+                    try: valid, invalid = validate_documents(parse_completion_content(response["content"]), request["files"][0])
+                    except json.JSONDecodeError as e: failures.update({f: f"Invalid JSON: {e}" for f in names}); continue
+                    valid += [doc.copy(update={"filename": dup}) for doc in valid for dup in copies.get(doc.filename, [])]
+                    failures.update(invalid)
+                    for filename in names:
+                        file_docs = [doc.dict(exclude={"filename"}) for doc in valid if doc.filename == filename]
+                        if cache and file_docs: cache.put(applicant["keys"][filename], file_docs)
+                    docs.extend(doc.dict() for doc in valid)
+                order = {filename: i for i, filename in enumerate(applicant["order"])}
+                docs.sort(key=lambda doc: order.get(doc.get("filename"), len(order)))
+                run = ExtractionRun(result=finalize_documents(docs, manifest.get("owned_by_self", "No")), failures=failures,
+                                   truncated_pages=applicant.get("truncated_pages", {}))
+                record.update(result_fields(run), files=applicant["files"])
+                counts["documents"] += len(record["documents"])
+            except Exception as e:
+                record.update(status="error", error=f"{type(e).__name__}: {e}")
+            write_record(out, record)
+            counts[record["status"]] += 1
+    finished = [b for b in manifest["batches"] if b.get("finished_at") and b.get("submitted_at")]
+    batch_seconds = max((b["finished_at"] - b["submitted_at"] for b in finished), default=0.0)
+    return dict(counts, applicants=len(manifest["applicants"]), requests=len(manifest["requests"]), batches=len(manifest["batches"]),
+                batch_seconds=round(batch_seconds, 3),
+                requests_per_minute=round(len(manifest["requests"]) / batch_seconds * 60, 2) if batch_seconds else 0.0)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-extract applicant folders through the OpenAI Batch API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("submit", "collect", "run"):
+        sub = commands.add_parser(command)
+        if command != "collect": sub.add_argument("input_dir", help="directory containing one subdirectory per applicant")
+        sub.add_argument("--workdir", default="bulk_run", help="where batch input files and the manifest are kept")
+        sub.add_argument("--output", "-o", default="batch_results.jsonl", help="JSONL results file (applicants already in it are skipped)")
+        if command != "submit":
+            sub.add_argument("--wait", action="store_true", default=command == "run", help="poll until every batch has finished")
+            sub.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+        if command != "collect":
+            sub.add_argument("--language", choices=sorted(SYSTEM_MESSAGES), default="English")
+            sub.add_argument("--owned-by-self", choices=["Yes", "No"], default="No")
+            sub.add_argument("--no-cache", action="store_true", help="do not read or write the extraction cache")
+    args = parser.parse_args(argv)
+    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    if args.command in ("submit", "run"):
+        if not os.path.isdir(args.input_dir): parser.error(f"not a directory: {args.input_dir}")
+        submit(client, args.input_dir, args.workdir, args.output, args.language, args.owned_by_self, not args.no_cache)
+        if args.command == "submit": return 0
+    manifest = poll(client, args.workdir, args.wait, args.poll_interval)
+    if not all(b["status"] in TERMINAL_STATES for b in manifest["batches"] if b["id"]):
+        print("Batches still running; rerun collect (or pass --wait) later."); return 2
+    report = collect(client, args.workdir, args.output)
+    print(json.dumps(report, indent=2))
+    return 1 if report["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
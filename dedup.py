@@ -0,0 +1,191 @@
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+from pydantic import BaseModel
+from image_utils import model_input_size
+from metrics import metrics
+
+# --- Constants ---
+DEDUP_IMAGES = os.environ.get("DEDUP_IMAGES", "1") != "0"
+DEDUP_INDEX_PATH = os.environ.get("DEDUP_INDEX_PATH", ".cache/near_duplicates.sqlite3")
+DEDUP_INDEX_MAX_BYTES = int(os.environ.get("DEDUP_INDEX_MAX_BYTES", 128 * 1024 * 1024))
+PHASH_SIZE = 8 # 8x8 low-frequency DCT coefficients of a 32x32 image -> 64-bit hash
+PHASH_MAX_DISTANCE = 10 # differing bits for two images to be compared at all
+# Candidates are merged only when they match at the resolution the model reads, block by block: two photos of
+# one license taken seconds apart differ more than two licenses whose numbers differ in one digit, so only
+# re-encoded or resized copies of the same image qualify
+VERIFY_BLOCK = 4
+VERIFY_BLUR = 1.0
+VERIFY_MAX_BLOCK_DIFF = 0.022 # contrast-normalized mean absolute difference in the worst block
+FINGERPRINT_MEMO_SIZE = 256
+
+class Fingerprint(BaseModel):
+    phash: int # unsigned 64-bit
+    view: bytes # grayscale PNG at the model's working resolution, for verification
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products."""
+    k, i = np.arange(n)[:, None], np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+def perceptual_hash(gray: Image.Image) -> int:
+    side = PHASH_SIZE * 4
+    pixels = np.asarray(gray.resize((side, side), Image.BILINEAR), dtype=np.float64)
+    dct = _dct_matrix(side)
+    low = (dct @ pixels @ dct.T)[:PHASH_SIZE, :PHASH_SIZE].ravel()
+    bits = low > np.median(low[1:]) # the DC term only tracks overall brightness
+    return int(np.packbits(bits).view(">u8")[0])
+
+def hash_distances(phash: int, hashes: np.ndarray) -> np.ndarray:
+    """Hamming distance from one hash to each entry of a uint64 array."""
+    xor = np.bitwise_xor(hashes.astype(np.uint64), np.uint64(phash))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+_memo: "OrderedDict[str, Optional[Fingerprint]]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+def fingerprint(data: bytes, key: Optional[str] = None) -> Optional[Fingerprint]:
+    """pHash and model-resolution view of an image; None for anything Pillow cannot open (e.g. PDFs).
+
+    `key` (the file's content key) memoizes the result, since lookup and caching fingerprint the same file.
+    """
+    if key:
+        with _memo_lock:
+            if key in _memo: _memo.move_to_end(key); return _memo[key]
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            size = model_input_size(*img.size)
+            img.draft("L", size) # JPEGs decode at a reduced scale, never below the model's resolution
+            gray = ImageOps.exif_transpose(img).convert("L")
+        if gray.width < gray.height and size[0] > size[1]: size = size[::-1] # EXIF rotation
+        view = io.BytesIO()
+        gray.resize(size, Image.BILINEAR).save(view, format="PNG", optimize=True)
+        fp = Fingerprint(phash=perceptual_hash(gray), view=view.getvalue())
+    except Exception: fp = None
+    if key:
+        with _memo_lock:
+            _memo[key] = fp
+            while len(_memo) > FINGERPRINT_MEMO_SIZE: _memo.popitem(last=False)
+    return fp
+
+def _normalized(view: bytes, size: Tuple[int, int]) -> np.ndarray:
+    with Image.open(io.BytesIO(view)) as img: gray = img.convert("L").resize(size, Image.BILINEAR).filter(ImageFilter.GaussianBlur(VERIFY_BLUR))
+    x = np.asarray(gray, dtype=np.float64)
+    lo, mid, hi = np.percentile(x, (10, 50, 90))
+    return (x - mid) / max(hi - lo, 1.0)
+
+def same_content(a: Fingerprint, b: Fingerprint) -> bool:
+    """Whether two images are the same picture at the model's resolution (re-encoded, resized or re-saved)."""
+    if hash_distances(a.phash, np.array([b.phash], dtype=np.uint64))[0] > PHASH_MAX_DISTANCE: return False
+    with Image.open(io.BytesIO(a.view)) as ia, Image.open(io.BytesIO(b.view)) as ib:
+        if abs(ia.width / ia.height - ib.width / ib.height) > 0.02: return False
+        size = min(ia.size, ib.size)
+    diff = np.abs(_normalized(a.view, size) - _normalized(b.view, size))
+    h, w = (size[1] // VERIFY_BLOCK) * VERIFY_BLOCK, (size[0] // VERIFY_BLOCK) * VERIFY_BLOCK
+    blocks = diff[:h, :w].reshape(h // VERIFY_BLOCK, VERIFY_BLOCK, w // VERIFY_BLOCK, VERIFY_BLOCK).mean(axis=(1, 3))
+    return float(blocks.max()) <= VERIFY_MAX_BLOCK_DIFF
+
+def group_near_duplicates(files: List[Any], key: Callable[[Any], Optional[str]] = lambda file: None) -> Tuple[List[Any], Dict[str, List[Any]]]:
+    """Keeps the first file of each duplicate group; returns (representatives, {representative name: duplicate files}).
+
+    `key` gives a file's content key, which memoizes its fingerprint.
+    """
+    if not DEDUP_IMAGES or len(files) < 2: return files, {}
+    representatives, duplicates = [], {}
+    kept: List[Tuple[Any, Fingerprint]] = []
+    for file in files:
+        fp = fingerprint(file.getvalue(), key(file))
+        if fp is None: representatives.append(file); continue
+        hashes = np.array([k_fp.phash for _, k_fp in kept], dtype=np.uint64)
+        close = np.flatnonzero(hash_distances(fp.phash, hashes) <= PHASH_MAX_DISTANCE) if kept else []
+        rep = next((kept[i][0] for i in close if same_content(fp, kept[i][1])), None)
+        if rep is not None:
+            duplicates.setdefault(rep.name, []).append(file); metrics.inc("intake_dedup_total", outcome="merged"); continue
+        if len(close): print(f"Note: {file.name} looks like {kept[close[0]][0].name} but differs in detail; extracting both")
+        representatives.append(file); kept.append((file, fp))
+    return representatives, duplicates
+
+def _signed(phash: int) -> int: return phash - (1 << 64) if phash >= 1 << 63 else phash # SQLite integers are signed
+
+class NearDuplicateIndex:
+    """Persistent, size-bounded (LRU by bytes) index of fingerprints of extracted images, keyed by content key.
+
+    Hashes are held in a NumPy array so a lookup scans the whole index in one vectorized pass.
+    """
+    def __init__(self, path: str = DEDUP_INDEX_PATH, max_bytes: int = DEDUP_INDEX_MAX_BYTES):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path, self.max_bytes = path, max_bytes
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS fingerprints (key TEXT PRIMARY KEY, phash INTEGER NOT NULL, view BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_last_used ON fingerprints (last_used)")
+        self._keys: Optional[List[str]] = None
+        self._hashes = np.zeros(0, dtype=np.uint64)
+
+    def _load(self) -> None:
+        """(Re)reads all hashes into memory. Caller holds the lock."""
+        rows = self._conn.execute("SELECT key, phash FROM fingerprints").fetchall()
+        self._keys = [key for key, _ in rows]
+        self._hashes = np.array([phash & ((1 << 64) - 1) for _, phash in rows], dtype=np.uint64)
+
+    def find(self, fp: Fingerprint) -> Optional[str]:
+        """Content key of a previously extracted image with the same content, if any."""
+        with self._lock:
+            if self._keys is None: self._load()
+            distances = hash_distances(fp.phash, self._hashes) if self._keys else np.zeros(0, dtype=np.int64)
+            candidates = [self._keys[i] for i in np.argsort(distances)[:3] if distances[i] <= PHASH_MAX_DISTANCE]
+            for key in candidates:
+                row = self._conn.execute("SELECT phash, view FROM fingerprints WHERE key = ?", (key,)).fetchone()
+                if row and same_content(fp, Fingerprint(phash=row[0] & ((1 << 64) - 1), view=row[1])):
+                    self._conn.execute("UPDATE fingerprints SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self.hits += 1
+                    return key
+            self.misses += 1
+        return None
+
+    def add(self, key: str, fp: Fingerprint) -> None:
+        size = len(fp.view) + len(key) + 8
+        if size > self.max_bytes: return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO fingerprints (key, phash, view, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                               (key, _signed(fp.phash), fp.view, size, time.time()))
+            self._evict()
+            self._keys = None # reloaded on the next lookup
+
+    def _evict(self) -> None:
+        """Drops least-recently-used fingerprints until the stored bytes fit in `max_bytes`. Caller holds the lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM fingerprints").fetchone()[0]
+        if total <= self.max_bytes: return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM fingerprints ORDER BY last_used ASC"):
+            if total <= self.max_bytes: break
+            stale.append((key,)); total -= size
+        self._conn.executemany("DELETE FROM fingerprints WHERE key = ?", stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM fingerprints").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+def get_near_duplicate_index() -> Optional[NearDuplicateIndex]:
+    """Process-wide index, or None when DEDUP_IMAGES=0."""
+    global _index
+    if not DEDUP_IMAGES: return None
+    with _index_lock:
+        if _index is None: _index = NearDuplicateIndex()
+        return _index
@@ -0,0 +1,344 @@
+import base64
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Callable, Union, Optional, Literal, Tuple
+from openai import OpenAI
+from typing_extensions import Annotated
+from pydantic import BaseModel, Field, ValidationError, validator
+from aamva import license_from_barcode
+from dedup import fingerprint, get_near_duplicate_index, group_near_duplicates
+from extraction_cache import ExtractionCache, content_key
+from image_utils import PreparedFile, estimate_file_tokens, prepare_file, preprocess_report
+from metrics import doc_type_label, metrics, observe_stage, record_usage, timer
+from pdf_utils import expand_pdfs
+from vin_decode import fill_vehicle_fields
+
+# --- Constants ---
+EXTRACTION_MODEL = "gpt-4o-mini"
+PROMPT_VERSION = "3" # Bump whenever the extraction prompts change so cached extractions are not reused
+EXTRACTION_MAX_WORKERS = int(os.environ.get("EXTRACTION_MAX_WORKERS", 6))
+EXTRACTION_GROUP_TOKENS = int(os.environ.get("EXTRACTION_GROUP_TOKENS", 1600)) # ~2 phone photos per request
+VIN_DOCUMENT_TYPES = ("Vehicle Certificate of Title", "Bill of Sale") # make/year cross-checked against the VIN
+
+EXTRACTION_INSTRUCTION = """Process these documents and identify each one correctly. The documents could include:
+
+1. NYS Driver License - Contains driver's license number, name, address fields, photo ID
+2. TLC Hack License - Special license for taxi/livery drivers, contains license number and name
+3. Vehicle Certificate of Title - Contains VIN, vehicle make, model, year, and owner information
+4. Bill of Sale - Document showing vehicle purchase details, contains similar info to title
+5. Radio Base Certification Letter - A letter with letterhead confirming affiliation with a radio base/dispatch service
+
+DO NOT include any document types that are not actually present in the images. For each document, return type, filename, and data fields as specified."""
+EXTRACTION_REMINDER = "Remember to accurately identify each document type based on its visual content, not its filename. Ensure you identify any Radio Base Certification Letter if present - this is an official letter showing affiliation with a radio dispatch base."
+
+SYSTEM_MESSAGES = { # keyed by UI language, like LANG in main.py
+    "English": """You are a document processing assistant that extracts structured information from multiple documents. For each document, you need to identify the document type based on its VISUAL CONTENT (not the filename), and return a JSON object with exactly three keys: "type", "filename", and "data".
+
+Extract the following based on the document type:
+
+- For "NYS Driver License": extract "license_number", "first_name", "middle_name" (if present), "last_name", "address", "city", "state", and "zip_code". This is a photo ID with New York State license information.
+
+- For "TLC Hack License": extract "license_number", "first_name", and "last_name". This is a Taxi & Limousine Commission license for drivers, usually with TLC branding.
+
+- For "Vehicle Certificate of Title" or "Bill of Sale": extract "VIN" (all 17 characters exactly as printed), "vehicle_make", "vehicle_model", "vehicle_year", and "owner_name". The title has official state header and ownership details.
+
+- For "Radio Base Certification Letter": extract "radio_base_name". This is a business letter with letterhead confirming the driver's affiliation with a radio dispatch base. It may have official company logo, signature, and confirmation language.
+
+- For "Other Driver's License" (if exist): extract "license_number", "first_name", "middle_name" (if present), "last_name", "address", "city", "state", and "zip_code".
+
+PAY SPECIAL ATTENTION to identifying Radio Base Certification Letters correctly - these are formal business letters confirming the driver works with a dispatch service.
+
+Return a single combined JSON object with a "documents" array containing these document objects. Ensure the field names are consistent and, for address, return individual fields rather than a combined string. DO NOT include document types that are not present in the images.""",
+    "Español": """Eres un asistente de procesamiento de documentos que extrae información estructurada de múltiples documentos. Para cada documento, necesitas identificar el tipo de documento basado en su CONTENIDO VISUAL (no el nombre del archivo), y devolver un objeto JSON con exactamente tres claves: "type", "filename", y "data".
+
+Extrae lo siguiente según el tipo de documento:
+
+- Para "Licencia de Conducir del Estado de Nueva York": extrae "license_number", "first_name", "middle_name" (si existe), "last_name", "address", "city", "state", y "zip_code". Esta es una identificación con foto con información de licencia del Estado de Nueva York.
+
+- Para "Licencia de Conductor TLC": extrae "license_number", "first_name", y "last_name". Esta es una licencia de la Comisión de Taxis y Limusinas para conductores, generalmente con la marca TLC.
+
+- Para "Certificado de Título del Vehículo" o "Factura de Venta": extrae "VIN" (los 17 caracteres exactamente como aparecen), "vehicle_make", "vehicle_model", "vehicle_year", y "owner_name". El título tiene un encabezado oficial del estado y detalles de propiedad.
+
+- Para "Carta de Certificación de la Base de Radio": extrae "radio_base_name". Esta es una carta comercial con membrete que confirma la afiliación del conductor con una base de despacho de radio. Puede tener un logotipo oficial de la empresa, firma e idioma de confirmación.
+
+- Para "Licencia de Conducir del Otro Conductor" (si existe): extrae "license_number", "first_name", "middle_name" (si existe), "last_name", "address", "city", "state", y "zip_code".
+
+PRESTA ESPECIAL ATENCIÓN a identificar correctamente las Cartas de Certificación de Base de Radio - estas son cartas comerciales formales que confirman que el conductor trabaja con un servicio de despacho.
+
+Devuelve un único objeto JSON combinado con una matriz "documents" que contenga estos objetos de documento. Asegúrate de que los nombres de los campos sean consistentes y, para la dirección, devuelve campos individuales en lugar de una cadena combinada. NO incluyas tipos de documentos que no estén presentes en las imágenes."""
+}
+
+# --- Pydantic Models ---
+class DocumentData(BaseModel):
+    license_number: Optional[str] = None; first_name: Optional[str] = None; middle_name: Optional[str] = None; last_name: Optional[str] = None
+    address: Optional[str] = None; city: Optional[str] = None; state: Optional[str] = None; zip_code: Optional[str] = None
+    VIN: Optional[str] = None; vehicle_make: Optional[str] = None; vehicle_model: Optional[str] = None; vehicle_year: Optional[str] = None
+    owner_name: Optional[str] = None; radio_base_name: Optional[str] = None
+class DocumentBase(BaseModel): filename: str
+class NYSDriverLicense(DocumentBase): type: Literal["NYS Driver License"]; data: DocumentData
+class TLCHackLicense(DocumentBase): type: Literal["TLC Hack License"]; data: DocumentData
+class VehicleCertificateOfTitle(DocumentBase): type: Literal["Vehicle Certificate of Title"]; data: DocumentData
+class BillOfSale(DocumentBase): type: Literal["Bill of Sale"]; data: DocumentData
+class RadioBaseCert(DocumentBase): type: Literal["Radio Base Certification Letter"]; data: DocumentData
+class OtherDriverLicense(DocumentBase):
+    type: Literal["Other Driver's License"]; data: DocumentData
+    @validator('type', pre=True, always=True, allow_reuse=True)
+    def normalize_type(cls, v):
+        if v in ["Other", "Other Driver's License"]: return "Other Driver's License"
+        raise ValueError(f"Invalid type for OtherDriverLicense: {v}")
+DocumentUnion = Annotated[Union[NYSDriverLicense, TLCHackLicense, VehicleCertificateOfTitle, BillOfSale, RadioBaseCert, OtherDriverLicense], Field(discriminator="type")]
+class ExtractionResult(BaseModel): documents: List[DocumentUnion]
+class ExtractionRun(BaseModel):
+    result: ExtractionResult
+    failures: Dict[str, str] = {} # filename -> error message
+    preprocessing: Dict[str, Dict[str, int]] = {} # filename -> bytes/tokens before and after preprocessing
+    truncated_pages: Dict[str, List[int]] = {} # PDF filename -> pages past PDF_MAX_PAGES that were not read
+
+# --- Helper Functions ---
+def normalize_raw_documents(raw: dict) -> dict:
+    for doc in raw.get("documents", []):
+        if doc.get("type") == "Other": doc["type"] = "Other Driver's License"
+    return raw
+
+expected_fields = {
+    "NYS Driver License": ["license_number", "first_name", "middle_name", "last_name", "address", "city", "state", "zip_code"],
+    "TLC Hack License": ["license_number", "first_name", "last_name"], "Vehicle Certificate of Title": ["VIN", "vehicle_make", "vehicle_model", "vehicle_year", "owner_name"],
+    "Bill of Sale": ["VIN", "vehicle_make", "vehicle_model", "vehicle_year", "owner_name"], "Radio Base Certification Letter": ["radio_base_name"],
+    "Other Driver's License": ["license_number", "first_name", "middle_name", "last_name", "address", "city", "state", "zip_code"]
+}
+
+def build_messages(files: List[Any], sys_message: str) -> List[Dict[str, Any]]:
+    # Create a more detailed instruction for document analysis
+    content = [{"type": "text", "text": EXTRACTION_INSTRUCTION}]
+
+    # Process each file without attempting to detect type from filename
+    for file in files:
+        with timer("file_read"): data = file.getvalue()
+        with timer("base64_encode"): b64 = base64.b64encode(data).decode("utf-8")
+        content.extend([
+            {"type": "text", "text": f"Filename: {file.name}"},
+            {"type": "image_url", "image_url": {"url": f"data:{file.type};base64,{b64}", "detail": "high"}}
+        ])
+
+    # Add a reminder about correct document identification
+    content.append({"type": "text", "text": EXTRACTION_REMINDER})
+    return [{"role": "system", "content": sys_message}, {"role": "user", "content": content}]
+
+class DocumentStreamParser:
+    """Incrementally pulls complete document objects out of a streamed `{"documents": [...]}` response."""
+    def __init__(self):
+        self.buffer, self.pos = "", None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.buffer += chunk
+        if self.pos is None:
+            match = re.search(r'"documents"\s*:\s*\[', self.buffer)
+            if not match: return []
+            self.pos = match.end()
+        docs = []
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n,": self.pos += 1
+            if self.pos >= len(self.buffer) or self.buffer[self.pos] != "{": break
+            try: doc, self.pos = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError: break # object not complete yet
+            docs.append(doc)
+        return docs
+
+def request_documents(sync_openai_client: OpenAI, files: List[Any], sys_message: str, on_document: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """Sends one chat completion for `files` and returns the raw (normalized, unvalidated) document dicts.
+
+    With `on_document`, the completion is streamed and each document is passed to it as soon as its JSON closes.
+    """
+    with timer("request_build"): request = completion_request(files, sys_message)
+    started = time.perf_counter()
+    if on_document is None:
+        response = sync_openai_client.chat.completions.create(**request)
+        content, usage = response.choices[0].message.content, response.usage
+    else:
+        parser, parts, usage = DocumentStreamParser(), [], None
+        for chunk in sync_openai_client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request):
+            usage = getattr(chunk, "usage", None) or usage # sent on the final chunk, which has no choices
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta: continue
+            parts.append(delta)
+            for raw_doc in parser.feed(delta): on_document(normalize_raw_documents({"documents": [raw_doc]})["documents"][0])
+        content = "".join(parts)
+    round_trip = time.perf_counter() - started
+    with timer("json_parse") as labels:
+        raw_docs = parse_completion_content(content)
+        labels["doc_type"] = doc_type_label(raw_docs)
+    observe_stage("model_round_trip", round_trip, doc_type=labels["doc_type"])
+    record_usage(usage, request["model"], labels["doc_type"])
+    return raw_docs
+
+def completion_request(files: List[Any], sys_message: str) -> Dict[str, Any]:
+    """Chat completion parameters for one extraction request; also the body of a Batch API request line."""
+    return dict(model=EXTRACTION_MODEL, messages=build_messages(files, sys_message), response_format={"type": "json_object"}, temperature=0.1)
+
+def parse_completion_content(content: str) -> List[Dict[str, Any]]:
+    return normalize_raw_documents(json.loads(content)).get("documents", [])
+
+def validate_documents(raw_docs: List[Dict[str, Any]], default_filename: str) -> Tuple[List[DocumentBase], Dict[str, str]]:
+    """Validates each raw document on its own so one bad document only fails its file."""
+    documents, failures = [], {}
+    for raw_doc in raw_docs:
+        with timer("validation", doc_type=raw_doc.get("type", "unknown")):
+            try: documents.extend(ExtractionResult.parse_obj({"documents": [raw_doc]}).documents)
+            except ValidationError as e: failures[str(raw_doc.get("filename") or default_filename)] = f"Invalid document: {e}"
+    return documents, failures
+
+def _emit_valid(on_document: Optional[Callable[[DocumentBase], None]], owned_by_self: str = "No") -> Optional[Callable[[Dict[str, Any]], None]]:
+    """Wraps a caller's callback so it only ever sees documents that validate and survive the owner filter."""
+    if on_document is None: return None
+    def emit(raw_doc: Dict[str, Any]):
+        try: docs = ExtractionResult.parse_obj({"documents": [raw_doc]}).documents
+        except ValidationError: return # the final validation reports it
+        for doc in docs:
+            if not (owned_by_self == "Yes" and doc.type == "Other Driver's License"): on_document(doc)
+    return emit
+
+def _lookup_near_duplicate(file: Any, key: str, cache: Optional[ExtractionCache]) -> Optional[List[Dict[str, Any]]]:
+    """Cached documents of a previously extracted copy of the same image (re-encoded or resized)."""
+    index = get_near_duplicate_index() if cache else None
+    fp = fingerprint(file.getvalue(), key) if index else None
+    similar = index.find(fp) if fp else None
+    docs = cache.get(similar) if similar else None
+    if docs is not None: cache.put(key, docs); metrics.inc("intake_dedup_total", outcome="reused")
+    return docs
+
+def file_key(file: Any) -> str:
+    """Extraction-cache key of an upload, from its bytes: names identify nothing, since phones send every photo as "image.jpg"."""
+    return content_key(file.getvalue(), EXTRACTION_MODEL, PROMPT_VERSION)
+
+def lookup_cached(files: List[Any], cache: Optional[ExtractionCache]) -> Tuple[List[Dict[str, Any]], List[Any], Dict[str, List[Any]]]:
+    """Splits files into documents available locally and files still to extract.
+
+    Tiers: the extraction cache by exact bytes, then by near-duplicate image (see dedup.py), then a driver
+    license barcode with every field (see aamva.py) when the upload says whose license it is (`license_type`);
+    cached documents are renamed to the current filename.
+    Of the remaining files, copies of the same image are sent once: the last element maps each
+    representative's name to the duplicate files that should receive its documents (see `with_duplicates`).
+    """
+    cached_docs, pending = [], []
+    for file in files:
+        key = file_key(file)
+        hit = cache.get(key) if cache else None
+        if hit is None: hit = _lookup_near_duplicate(file, key, cache)
+        if hit is not None: cached_docs.extend(dict(doc, filename=file.name) for doc in hit); continue
+        # Without that context the model classifies the license; barcode documents are not cached since their type is the upload's
+        license_type = getattr(file, "license_type", None)
+        barcode_doc = license_from_barcode(file.name, file.getvalue(), license_type) if license_type else None
+        if barcode_doc is not None: cached_docs.append(barcode_doc)
+        else: pending.append(file)
+    pending, duplicates = group_near_duplicates(pending, file_key)
+    return cached_docs, pending, duplicates
+
+def with_duplicates(documents: List[DocumentBase], duplicates: Dict[str, List[Any]]) -> List[DocumentBase]:
+    """Adds a copy of each representative's documents for every duplicate file it stood in for."""
+    return documents + [doc.copy(update={"filename": dup.name}) for doc in documents for dup in duplicates.get(doc.filename, [])]
+
+def store_cached(files: List[Any], documents: List[DocumentBase], cache: Optional[ExtractionCache]) -> None:
+    # Cache per file (the uploads as received, not their preprocessed copies), without the filename, and only
+    # validated documents so a bad response is never replayed
+    if not cache: return
+    index = get_near_duplicate_index()
+    for file in files:
+        docs = [doc.dict(exclude={"filename"}) for doc in documents if doc.filename == file.name]
+        if not docs: continue
+        key = file_key(file)
+        cache.put(key, docs)
+        fp = fingerprint(file.getvalue(), key) if index else None
+        if fp: index.add(key, fp)
+
+def finalize_documents(documents: List[Dict[str, Any]], owned_by_self: str = "No") -> ExtractionResult:
+    raw = {"documents": documents}
+    # If user selected they're the only driver, filter out any "Other Driver's License"
+    if owned_by_self == "Yes" and any(doc.get("type") == "Other Driver's License" for doc in raw["documents"]):
+        raw["documents"] = [doc for doc in raw["documents"] if doc.get("type") != "Other Driver's License"]
+
+    # Check for missing Radio Base Certification - debug info
+    has_radio_base = any(doc.get("type") == "Radio Base Certification Letter" for doc in raw["documents"])
+    if not has_radio_base:
+        print("Note: Radio Base Certification Letter not found in processed documents")
+
+    # The model reads make and year off the document; a VIN the local index decodes fills gaps and corrects them
+    for doc in raw["documents"]:
+        if doc.get("type") in VIN_DOCUMENT_TYPES and isinstance(doc.get("data"), dict): doc["data"] = fill_vehicle_fields(doc["data"])
+
+    return ExtractionResult.parse_obj(normalize_raw_documents(raw))
+
+def extract_documents(sync_openai_client: OpenAI, files: List[Any], sys_message: str, owned_by_self: str = "No", cache: Optional[ExtractionCache] = None,
+                      on_document: Optional[Callable[[DocumentBase], None]] = None) -> ExtractionRun:
+    """Extracts every uncached file in a single chat completion; any invalid document fails the whole call.
+
+    `on_document` (optional) receives each validated document as soon as it is available, cached ones first.
+    """
+    emit = _emit_valid(on_document, owned_by_self)
+    files, truncated = expand_pdfs(files)
+    cached_docs, pending, duplicates = lookup_cached(files, cache)
+    if emit:
+        for doc in cached_docs: emit(doc)
+    prepared = [prepare_file(file) for file in pending]
+    fresh = []
+    if prepared:
+        raw_docs = request_documents(sync_openai_client, prepared, sys_message, emit)
+        with timer("validation", doc_type=doc_type_label(raw_docs)): fresh = with_duplicates(ExtractionResult.parse_obj({"documents": raw_docs}).documents, duplicates)
+        store_cached(pending + [dup for dups in duplicates.values() for dup in dups], fresh, cache)
+    return ExtractionRun(result=finalize_documents(cached_docs + [doc.dict() for doc in fresh], owned_by_self), preprocessing=preprocess_report(prepared),
+                         truncated_pages=truncated)
+
+def plan_groups(files: List[Any], max_group_tokens: int = EXTRACTION_GROUP_TOKENS) -> List[List[Any]]:
+    """Packs files into small request groups by estimated image tokens; a file over the budget or a PDF page goes alone."""
+    groups, current, current_tokens = [], [], 0
+    for file in files:
+        if getattr(file, "page", 0): groups.append([file]); continue
+        tokens = estimate_file_tokens(file.getvalue())
+        if current and current_tokens + tokens > max_group_tokens:
+            groups.append(current); current, current_tokens = [], 0
+        current.append(file); current_tokens += tokens
+    if current: groups.append(current)
+    return groups
+
+def _extract_group(sync_openai_client: OpenAI, group: List[Any], sys_message: str, emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[List[DocumentBase], Dict[str, str], List[PreparedFile]]:
+    """Preprocesses and extracts one group; see `validate_documents`."""
+    prepared = [prepare_file(file) for file in group]
+    documents, failures = validate_documents(request_documents(sync_openai_client, prepared, sys_message, emit), group[0].name)
+    return documents, failures, prepared
+
+def extract_documents_parallel(sync_openai_client: OpenAI, files: List[Any], sys_message: str, owned_by_self: str = "No", cache: Optional[ExtractionCache] = None,
+                               max_workers: int = EXTRACTION_MAX_WORKERS, max_group_tokens: int = EXTRACTION_GROUP_TOKENS,
+                               on_document: Optional[Callable[[DocumentBase], None]] = None) -> ExtractionRun:
+    """Fans uncached files out as concurrent per-file (or small-group) requests and merges them into one result.
+
+    Wall-clock time tracks the slowest group rather than the sum; a failed request or invalid document is
+    reported in `failures` instead of failing the batch. `on_document` is called from worker threads.
+    """
+    emit = _emit_valid(on_document, owned_by_self)
+    files, truncated = expand_pdfs(files)
+    cached_docs, pending, duplicates = lookup_cached(files, cache)
+    if emit:
+        for doc in cached_docs: emit(doc)
+    documents, failures, preprocessing = [], {}, {}
+    groups = plan_groups(pending, max_group_tokens)
+    if groups:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups))), thread_name_prefix="extract") as pool:
+            futures = {pool.submit(_extract_group, sync_openai_client, group, sys_message, emit): group for group in groups}
+            for future in as_completed(futures):
+                group = futures[future]
+                copies = [dup for file in group for dup in duplicates.get(file.name, [])]
+                try: group_docs, group_failures, prepared = future.result()
+                except Exception as e:
+                    failures.update({file.name: f"{type(e).__name__}: {e}" for file in group + copies}); continue
+                group_docs = with_duplicates(group_docs, duplicates)
+                group_failures.update({dup.name: error for name, error in group_failures.items() for dup in duplicates.get(name, [])})
+                store_cached(group + copies, group_docs, cache)
+                documents.extend(group_docs); failures.update(group_failures); preprocessing.update(preprocess_report(prepared))
+    # Keep upload order stable regardless of which request finished first
+    order = {file.name: i for i, file in enumerate(files)}
+    documents.sort(key=lambda doc: order.get(doc.filename, len(order)))
+    return ExtractionRun(result=finalize_documents(cached_docs + [doc.dict() for doc in documents], owned_by_self), failures=failures, preprocessing=preprocessing,
+                         truncated_pages=truncated)
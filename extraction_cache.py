@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# --- Constants ---
+DEFAULT_CACHE_PATH = os.environ.get("EXTRACTION_CACHE_PATH", ".cache/extraction_cache.sqlite3")
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+def content_key(data: bytes, model: str, prompt_version: str) -> str:
+    """Cache key for one uploaded file: SHA-256 of its bytes plus the model/prompt it was extracted with."""
+    return f"{hashlib.sha256(data).hexdigest()}:{model}:{prompt_version}"
+
+class ExtractionCache:
+    """Persistent, size-bounded (LRU by bytes) store of extracted documents keyed by `content_key`.
+
+    Values are the JSON-serialized documents (without filename) the model returned for a single file,
+    so a re-upload of the same bytes under any name can be answered without another model call.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path, self.max_bytes = path, max_bytes
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None: self.misses += 1; return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, documents: List[Dict[str, Any]]) -> None:
+        value = json.dumps(documents)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes: return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)", (key, value, size, time.time()))
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drops least-recently-used entries until the stored bytes fit in `max_bytes`. Caller holds the lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes: return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used ASC"):
+            if total <= self.max_bytes: break
+            stale.append((key,)); total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        with self._lock: self._conn.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,105 @@
+"""Local stand-in for the MVRNow `Mvr/OrderMvrRecord` endpoint, for offline runs and benchmarks.
+
+    python fake_mvrnow.py --port 8766 --latency lognormal:1500:0.4 --error-rate 0.02
+    MVRNOW_BASE_URL=http://127.0.0.1:8766/usd/ streamlit run main.py
+
+Records follow the shape the review form reads (Record.DlRecord, read through the accessors in mvr.py);
+values are derived from the license number so repeated pulls agree.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from fake_openai import FaultProfile
+
+# --- Constants ---
+ORDER_PATH = "/usd/Mvr/OrderMvrRecord"
+DEFAULT_EVENTS = 3
+
+def fake_mvr_record(payload: Dict[str, Any], events: int = DEFAULT_EVENTS, padding: str = "") -> Dict[str, Any]:
+    digest = hashlib.sha256(f"{payload.get('State')}|{payload.get('LicenseNumber')}".encode()).hexdigest()
+    event_items = [{"Common": {"Subtype": "Violation", "Date": {"Year": "2022", "Month": str(1 + i % 12), "Day": "15"}, "Location": "NEW YORK"},
+                    "DescriptionList": {"DescriptionItem": {"AdrSmallDescription": f"SPEEDING {10 + i} MPH OVER", "StateDescription": "IMPROPER SPEED",
+                                                            "StateAssignedPoints": str(3 + i % 4)}},
+                    "Violation": {"ConvictionDate": {"Year": "2022", "Month": str(2 + i % 11), "Day": "1"}, "FineAmount": str(150 + 10 * i)}}
+                   for i in range(events)]
+    return {
+        "ReferenceId": payload.get("ReferenceId"), "Status": "Complete",
+        "Record": {"DlRecord": {
+            "Driver": {"FirstName": payload.get("FirstName", "TEST"), "LastName": payload.get("LastName", digest[:6].upper()), "BirthDate": {"Year": str(1960 + int(digest[6:8], 16) % 40), "Month": "6", "Day": "1"}, "Age": 40,
+                       "Gender": "M" if int(digest[8], 16) % 2 else "F", "EyeColor": "BRO", "Height": "5-10",
+                       "AddressList": {"AddressItem": [{"Street": "1 MAIN ST", "City": "NEW YORK", "State": {"Abbrev": payload.get("State", "NY")}, "Zip": "10001"}]}},
+            "CurrentLicense": {"Number": payload.get("LicenseNumber"), "ClassCode": "D", "ClassDescription": "OPERATOR",
+                               "IssueDate": {"Year": "2020", "Month": "1", "Day": "1"}, "ExpirationDate": {"Year": "2028", "Month": "1", "Day": "1"},
+                               "PersonalStatusList": {"StatusItem": [{"Name": "VALID"}]}},
+            "EventList": {"EventItem": event_items},
+            "MessageList": {"MessageItem": [{"Line": padding}]} if padding else {},
+        }},
+    }
+
+def make_handler(profile: FaultProfile, events: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.split("?")[0] != ORDER_PATH: return self._send(404, {"Message": f"Unknown path {self.path}"})
+            time.sleep(profile.sample_latency())
+            if profile.should_fail(): return self._send(profile.error_status, {"Message": f"Injected {profile.error_status} from fake MVRNow"})
+            payload = json.loads(body or b"{}")
+            if not payload.get("ApiKey"): return self._send(401, {"Message": "ApiKey required"})
+            self._send(200, fake_mvr_record(payload, events, profile.padding()))
+
+        def do_HEAD(self):
+            self.send_response(200); self.send_header("Content-Length", "0"); self.end_headers()
+
+        def log_message(self, format, *args): pass
+    return Handler
+
+class FakeMvrNowServer:
+    """Runs the fake MVRNow API on a daemon thread; use as a context manager or call start()/stop()."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, profile: Optional[FaultProfile] = None, events: int = DEFAULT_EVENTS):
+        self.profile = profile or FaultProfile()
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.profile, events))
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str: return f"http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}/usd/"
+
+    @property
+    def order_endpoint(self) -> str: return f"{self.base_url}Mvr/OrderMvrRecord"
+
+    def start(self) -> "FakeMvrNowServer":
+        threading.Thread(target=self.httpd.serve_forever, name="fake-mvrnow", daemon=True).start()
+        return self
+
+    def stop(self) -> None: self.httpd.shutdown(); self.httpd.server_close()
+    def __enter__(self) -> "FakeMvrNowServer": return self.start()
+    def __exit__(self, *exc) -> None: self.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a fake MVRNow API for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", default="fixed:0", help='e.g. "lognormal:1500:0.4" (see fake_openai.FaultProfile)')
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--payload-bytes", type=int, default=0, help="padding added to every record")
+    parser.add_argument("--events", type=int, default=DEFAULT_EVENTS, help="violation events per record")
+    args = parser.parse_args()
+    server = FakeMvrNowServer(args.host, args.port, FaultProfile(args.latency, args.error_rate, args.error_status, args.payload_bytes), args.events)
+    print(f"Fake MVRNow API listening on {server.base_url}")
+    try: server.httpd.serve_forever()
+    except KeyboardInterrupt: pass
+
+if __name__ == "__main__":
+    main()
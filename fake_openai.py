@@ -0,0 +1,222 @@
+"""Local stand-in for the OpenAI endpoints this app uses, for offline runs of the batch and bulk tools.
+
+    python fake_openai.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python bulk_extract.py run packets/
+
+Implements chat completions (plain and streamed) plus the Files/Batches submit, poll and download
+contract. Responses are synthetic: every file named in a request comes back as a driver's license with
+stable fake data. A FaultProfile adds latency, injected errors and padded payloads for benchmarks.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# --- Constants ---
+FAKE_BATCH_DELAY = 0.5 # seconds a batch stays "validating" before it starts processing
+STREAM_CHUNK_CHARS = 40
+
+class FaultProfile:
+    """Latency distribution, error injection and payload padding for a fake endpoint.
+
+    `latency` is "fixed:MS", "uniform:MS:SPREAD_MS", "exponential:MEAN_MS" or "lognormal:MEDIAN_MS:SIGMA".
+    """
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, error_status: int = 500, payload_bytes: int = 0, seed: Optional[int] = None):
+        kind, *params = latency.split(":")
+        if kind not in ("fixed", "uniform", "exponential", "lognormal"): raise ValueError(f"Unknown latency distribution: {kind}")
+        self.latency, self.kind, self.params = latency, kind, [float(p) for p in params] or [0.0]
+        self.error_rate, self.error_status, self.payload_bytes = error_rate, error_status, payload_bytes
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """Seconds to wait before answering one request."""
+        with self._lock:
+            mean = self.params[0] / 1000.0
+            if self.kind == "uniform": value = self._random.uniform(mean - self.params[1] / 1000.0, mean + self.params[1] / 1000.0)
+            elif self.kind == "exponential": value = self._random.expovariate(1 / mean) if mean > 0 else 0.0
+            elif self.kind == "lognormal": value = self._random.lognormvariate(0, self.params[1] if len(self.params) > 1 else 0.5) * mean
+            else: value = mean
+        return max(0.0, value)
+
+    def should_fail(self) -> bool:
+        with self._lock: return self._random.random() < self.error_rate
+
+    def padding(self) -> str: return "x" * self.payload_bytes
+
+    def describe(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "error_rate": self.error_rate, "error_status": self.error_status, "payload_bytes": self.payload_bytes}
+
+def error_body(status: int) -> Dict[str, Any]:
+    kind = "rate_limit_exceeded" if status == 429 else "server_error"
+    return {"error": {"message": f"Injected {status} from fake server", "type": kind, "code": kind}}
+
+def fake_documents(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One plausible document per "Filename: ..." text part, derived from the filename so reruns agree."""
+    docs = []
+    for message in body.get("messages", []):
+        if not isinstance(message.get("content"), list): continue
+        for part in message["content"]:
+            match = re.match(r"Filename: (.+)", part.get("text", "")) if part.get("type") == "text" else None
+            if not match: continue
+            digest = hashlib.sha256(match.group(1).encode()).hexdigest()
+            docs.append({"type": "NYS Driver License", "filename": match.group(1),
+                         "data": {"license_number": str(int(digest[:12], 16))[:9].zfill(9), "first_name": "TEST", "last_name": digest[:6].upper(),
+                                  "address": "1 MAIN ST", "city": "NEW YORK", "state": "NY", "zip_code": "10001"}})
+    return docs
+
+def chat_completion(body: Dict[str, Any], padding: str = "") -> Dict[str, Any]:
+    content = json.dumps({"documents": fake_documents(body), **({"padding": padding} if padding else {})})
+    return {"id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion", "created": int(time.time()), "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": len(content) // 4, "total_tokens": 1000 + len(content) // 4}}
+
+def stream_events(completion: Dict[str, Any], include_usage: bool = False) -> bytes:
+    """The completion re-encoded as server-sent `chat.completion.chunk` events."""
+    content = completion["choices"][0]["message"]["content"]
+    base = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"]}
+    chunks = [dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])]
+    chunks += [dict(base, choices=[{"index": 0, "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]}, "finish_reason": None}])
+               for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+    chunks.append(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+    if include_usage: chunks.append(dict(base, choices=[], usage=completion["usage"]))
+    return "".join(f"data: {json.dumps(c)}\n\n" for c in chunks).encode() + b"data: [DONE]\n\n"
+
+class FakeOpenAI:
+    """In-memory files and batches; batches complete on a background thread after FAKE_BATCH_DELAY."""
+    def __init__(self, batch_delay: float = FAKE_BATCH_DELAY, profile: Optional[FaultProfile] = None):
+        self.batch_delay, self.profile = batch_delay, profile or FaultProfile()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.contents: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create_file(self, filename: str, purpose: str, content: bytes) -> Dict[str, Any]:
+        file = {"id": f"file-{uuid.uuid4().hex[:24]}", "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self._lock: self.files[file["id"]] = file; self.contents[file["id"]] = content
+        return file
+
+    def create_batch(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if body.get("input_file_id") not in self.contents: return None
+        batch = {"id": f"batch_{uuid.uuid4().hex[:24]}", "object": "batch", "endpoint": body.get("endpoint", "/v1/chat/completions"),
+                 "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"), "status": "validating",
+                 "created_at": int(time.time()), "output_file_id": None, "error_file_id": None, "metadata": body.get("metadata"),
+                 "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        with self._lock: self.batches[batch["id"]] = batch
+        threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+        return batch
+
+    def _run_batch(self, batch: Dict[str, Any]) -> None:
+        time.sleep(self.batch_delay)
+        lines = [json.loads(line) for line in self.contents[batch["input_file_id"]].decode().splitlines() if line.strip()]
+        batch.update(status="in_progress", in_progress_at=int(time.time()), request_counts={"total": len(lines), "completed": 0, "failed": 0})
+        outputs, errors = [], []
+        for line in lines:
+            if line.get("url") != "/v1/chat/completions":
+                errors.append({"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": line.get("custom_id"), "response": None,
+                               "error": {"code": "invalid_url", "message": f"Unsupported url {line.get('url')}"}})
+                batch["request_counts"]["failed"] += 1; continue
+            outputs.append({"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": line.get("custom_id"), "error": None,
+                            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": chat_completion(line.get("body", {}))}})
+            batch["request_counts"]["completed"] += 1
+        if outputs: batch["output_file_id"] = self.create_file("batch_output.jsonl", "batch_output", "".join(json.dumps(o) + "\n" for o in outputs).encode())["id"]
+        if errors: batch["error_file_id"] = self.create_file("batch_errors.jsonl", "batch_output", "".join(json.dumps(e) + "\n" for e in errors).encode())["id"]
+        batch.update(status="completed", completed_at=int(time.time()))
+
+def make_handler(state: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: Any, content_type: str = "application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def _not_found(self): self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+        def _body(self) -> bytes: return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if path.endswith("/chat/completions"): self._chat(json.loads(self._body()))
+            elif path.endswith("/files"):
+                message = BytesParser(policy=email_policy).parsebytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + self._body())
+                fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+                upload = fields["file"]
+                self._send(200, state.create_file(upload.get_filename() or "upload.jsonl", fields["purpose"].get_content().strip(), upload.get_payload(decode=True)))
+            elif path.endswith("/batches"):
+                batch = state.create_batch(json.loads(self._body()))
+                self._send(200, batch) if batch else self._send(400, {"error": {"message": "input_file_id not found", "type": "invalid_request_error"}})
+            else: self._not_found()
+
+        def _chat(self, body: Dict[str, Any]):
+            time.sleep(state.profile.sample_latency())
+            if state.profile.should_fail():
+                status = state.profile.error_status
+                payload = json.dumps(error_body(status)).encode()
+                self.send_response(status)
+                if status == 429: self.send_header("retry-after-ms", "100")
+                self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(payload)))
+                self.end_headers(); self.wfile.write(payload); return
+            completion = chat_completion(body, state.profile.padding())
+            if body.get("stream"): self._send(200, stream_events(completion, (body.get("stream_options") or {}).get("include_usage", False)), "text/event-stream")
+            else: self._send(200, completion)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            match = re.search(r"/batches/([^/]+)$", path) or re.search(r"/files/([^/]+)(/content)?$", path)
+            if not match: return self._not_found()
+            if "/batches/" in path: item = state.batches.get(match.group(1))
+            elif match.group(2): item = state.contents.get(match.group(1)); return self._send(200, item, "application/octet-stream") if item is not None else self._not_found()
+            else: item = state.files.get(match.group(1))
+            self._send(200, item) if item else self._not_found()
+
+        def log_message(self, format, *args): pass
+    return Handler
+
+class FakeOpenAIServer:
+    """Runs the fake API on a daemon thread; use as a context manager or call start()/stop()."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, batch_delay: float = FAKE_BATCH_DELAY, profile: Optional[FaultProfile] = None):
+        self.state = FakeOpenAI(batch_delay, profile)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str: return f"http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def stop(self) -> None: self.httpd.shutdown(); self.httpd.server_close()
+    def __enter__(self) -> "FakeOpenAIServer": return self.start()
+    def __exit__(self, *exc) -> None: self.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI API for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=FAKE_BATCH_DELAY)
+    parser.add_argument("--latency", default="fixed:0", help='chat latency, e.g. "lognormal:800:0.5" (see FaultProfile)')
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--payload-bytes", type=int, default=0, help="padding added to every chat response")
+    args = parser.parse_args()
+    profile = FaultProfile(args.latency, args.error_rate, args.error_status, args.payload_bytes)
+    server = FakeOpenAIServer(args.host, args.port, args.batch_delay, profile)
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try: server.httpd.serve_forever()
+    except KeyboardInterrupt: pass
+
+if __name__ == "__main__":
+    main()
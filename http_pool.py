@@ -0,0 +1,149 @@
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from rate_limit import AdaptiveRateLimiter, AsyncRateLimitedTransport, RateLimitedTransport, get_rate_limiter
+
+# --- Constants ---
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 60.0))
+try:
+    import h2 # noqa: F401 -- HTTP/2 needs the optional `h2` package (httpx[http2])
+    HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "1") != "0"
+except ImportError:
+    HTTP2_ENABLED = False
+
+_clients: Dict[str, httpx.Client] = {}
+_warm_urls: Dict[str, str] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+_openai_clients: Dict[str, OpenAI] = {}
+# Async pools belong to the event loop that first uses them (one per process for the Chainlit app)
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_async_warm_urls: Dict[str, str] = {}
+_async_openai_clients: Dict[str, AsyncOpenAI] = {}
+_lock = threading.Lock()
+
+def _event_hooks(name: str) -> Dict[str, Any]:
+    stats = _stats.setdefault(name, {"requests": 0, "responses": 0, "error_responses": 0})
+    def on_request(request: httpx.Request):
+        with _lock: stats["requests"] += 1
+    def on_response(response: httpx.Response):
+        with _lock:
+            stats["responses"] += 1
+            if response.status_code >= 400: stats["error_responses"] += 1
+    return {"request": [on_request], "response": [on_response]}
+
+def _async_event_hooks(name: str) -> Dict[str, Any]:
+    hooks = _event_hooks(f"{name}:async")
+    async def on_request(request: httpx.Request): hooks["request"][0](request)
+    async def on_response(response: httpx.Response): hooks["response"][0](response)
+    return {"request": [on_request], "response": [on_response]}
+
+def pool_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE, keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+def get_http_client(name: str, base_url: str = "", timeout: float = 60.0, warm_url: Optional[str] = None,
+                    limiter: Optional[AdaptiveRateLimiter] = None) -> httpx.Client:
+    """Returns the process-wide keep-alive client for one upstream, creating it on first use.
+
+    With `limiter`, every API call on the pool waits for the limiter first.
+    """
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            transport = httpx.HTTPTransport(http2=HTTP2_ENABLED, limits=pool_limits())
+            client = httpx.Client(
+                base_url=base_url, follow_redirects=True, timeout=timeout, event_hooks=_event_hooks(name),
+                transport=RateLimitedTransport(transport, limiter) if limiter else transport
+            )
+            _clients[name] = client
+            if warm_url or base_url: _warm_urls[name] = warm_url or base_url
+    return client
+
+def get_async_http_client(name: str, base_url: str = "", timeout: float = 60.0, warm_url: Optional[str] = None,
+                          limiter: Optional[AdaptiveRateLimiter] = None) -> httpx.AsyncClient:
+    """`get_http_client` for asyncio callers: requests wait on the event loop instead of holding a thread."""
+    with _lock:
+        client = _async_clients.get(name)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(http2=HTTP2_ENABLED, limits=pool_limits())
+            client = httpx.AsyncClient(
+                base_url=base_url, follow_redirects=True, timeout=timeout, event_hooks=_async_event_hooks(name),
+                transport=AsyncRateLimitedTransport(transport, limiter) if limiter else transport
+            )
+            _async_clients[name] = client
+            if warm_url or base_url: _async_warm_urls[name] = warm_url or base_url
+    return client
+
+def get_openai_http_client() -> httpx.Client:
+    return get_http_client("openai", base_url=OPENAI_BASE_URL, timeout=60.0, limiter=get_rate_limiter("openai"))
+
+def get_openai_client(api_key: Optional[str]) -> OpenAI:
+    """One OpenAI client per API key, all sharing the pooled OpenAI connection pool."""
+    with _lock: client = _openai_clients.get(api_key or "")
+    if client is None:
+        client = OpenAI(api_key=api_key, http_client=get_openai_http_client())
+        with _lock: client = _openai_clients.setdefault(api_key or "", client)
+    return client
+
+def get_async_openai_client(api_key: Optional[str]) -> AsyncOpenAI:
+    """One AsyncOpenAI client per API key on the async OpenAI pool, which shares the process-wide rate limiter."""
+    with _lock: client = _async_openai_clients.get(api_key or "")
+    if client is None:
+        http_client = get_async_http_client("openai", base_url=OPENAI_BASE_URL, timeout=60.0, limiter=get_rate_limiter("openai"))
+        client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        with _lock: client = _async_openai_clients.setdefault(api_key or "", client)
+    return client
+
+def warm_up(*names: str, timeout: float = 5.0) -> None:
+    """Opens a connection (TCP + TLS) in each named pool, or all pools, so the first real request skips the handshake."""
+    targets = {name: url for name, url in _warm_urls.items() if not names or name in names}
+    def _ping(name: str, url: str):
+        try: _clients[name].head(url, timeout=timeout)
+        except httpx.HTTPError as e: print(f"Note: warm-up of {name} pool failed: {e}")
+    if not targets: return
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        for name, url in targets.items(): pool.submit(_ping, name, url)
+
+def start_warm_up(*names: str) -> None:
+    """Runs `warm_up` on a daemon thread so startup does not wait on the network."""
+    threading.Thread(target=warm_up, args=names, name="http-warm-up", daemon=True).start()
+
+async def warm_up_async(*names: str, timeout: float = 5.0) -> None:
+    """`warm_up` for the async pools; run it on the event loop that serves requests."""
+    targets = {name: url for name, url in _async_warm_urls.items() if not names or name in names}
+    async def _ping(name: str, url: str):
+        try: await _async_clients[name].head(url, timeout=timeout)
+        except httpx.HTTPError as e: print(f"Note: warm-up of {name} async pool failed: {e}")
+    await asyncio.gather(*(_ping(name, url) for name, url in targets.items()))
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Request counters plus open/idle connection counts for each pool."""
+    stats = {}
+    with _lock:
+        pools = dict(_clients, **{f"{name}:async": client for name, client in _async_clients.items()})
+        for name, client in pools.items():
+            # httpx keeps the httpcore pool on its transport; read it defensively since it is not public API
+            transport = getattr(client, "_transport", None)
+            transport = getattr(transport, "inner", transport) # unwrap RateLimitedTransport
+            connections = getattr(getattr(transport, "_pool", None), "connections", [])
+            stats[name] = dict(_stats.get(name, {}), connections=len(connections), idle=sum(1 for c in connections if c.is_idle()),
+                               http2=HTTP2_ENABLED, max_connections=HTTP_MAX_CONNECTIONS, closed=client.is_closed)
+    return stats
+
+def shutdown() -> None:
+    """Closes every pooled client; registered to run at interpreter exit."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear(); _warm_urls.clear(); _openai_clients.clear()
+        # Async pools cannot be closed outside their event loop; their sockets close with the process
+        _async_clients.clear(); _async_warm_urls.clear(); _async_openai_clients.clear()
+    for client in clients: client.close()
+
+atexit.register(shutdown)
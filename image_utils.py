@@ -0,0 +1,105 @@
+import io
+import math
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+
+# --- Constants ---
+# gpt-4o "high" detail: fit in 2048x2048, shortest side scaled to 768, billed per 512px tile
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+TILE_SIZE = 512
+BASE_IMAGE_TOKENS = 85
+TOKENS_PER_TILE = 170
+DEFAULT_IMAGE_TOKENS = BASE_IMAGE_TOKENS + TOKENS_PER_TILE * 6 # 2x3 tiles, the worst case for a phone photo
+PREPROCESS_IMAGES = os.environ.get("PREPROCESS_IMAGES", "1") != "0"
+PREPROCESS_JPEG_QUALITY = int(os.environ.get("PREPROCESS_JPEG_QUALITY", 85))
+TILE_SNAP_TOLERANCE = 0.1 # shrink up to 10% more when that saves a whole row/column of tiles
+
+class PreparedFile(BaseModel):
+    """Upload stand-in holding the bytes actually sent to the model; duck-types Streamlit's UploadedFile."""
+    name: str; type: str; data: bytes
+    original_size: int = 0; tokens_before: int = 0; tokens_after: int = 0
+    page: int = 0 # 1-based page number when rasterized from a PDF
+    license_type: Optional[str] = None # document type of a driver license in this upload, when the upload context settles it
+    def getvalue(self) -> bytes: return self.data
+    @property
+    def bytes_saved(self) -> int: return max(0, self.original_size - len(self.data))
+    @property
+    def tokens_saved(self) -> int: return max(0, self.tokens_before - self.tokens_after)
+
+def image_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Reads (width, height) from a PNG or JPEG header without decoding the image."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8": return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF: i += 1; continue
+        marker = data[i + 1]
+        if marker == 0xFF: i += 1; continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7: i += 2; continue
+        seg_len = struct.unpack(">H", data[i + 2:i + 4])[0]
+        # SOF0-SOF15 carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + seg_len
+    return None
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """Estimates the prompt tokens a vision model bills for one image at the given detail level."""
+    if detail == "low" or width <= 0 or height <= 0: return BASE_IMAGE_TOKENS
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    return BASE_IMAGE_TOKENS + TOKENS_PER_TILE * math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+
+def estimate_file_tokens(data: bytes, detail: str = "high") -> int:
+    """Token estimate for an uploaded file; falls back to a conservative default when the size is unknown."""
+    dims = image_dimensions(data)
+    return estimate_image_tokens(*dims, detail=detail) if dims else DEFAULT_IMAGE_TOKENS
+
+def model_input_size(width: int, height: int) -> Tuple[int, int]:
+    """Largest size the model will actually look at in high detail, snapped down to tile edges when close."""
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    w, h = width * scale, height * scale
+    for i in range(2):
+        side = (w, h)[i]; excess = side % TILE_SIZE
+        if side > TILE_SIZE and 0 < excess <= side * TILE_SNAP_TOLERANCE:
+            snap = (side - excess) / side; w, h = w * snap, h * snap
+    return max(1, int(w)), max(1, int(h))
+
+def preprocess_image(name: str, mime: str, data: bytes) -> PreparedFile:
+    """EXIF-orients, downsamples to the model's working resolution, strips metadata and re-encodes as JPEG.
+
+    Anything Pillow cannot open (e.g. PDFs) passes through unchanged. The original bytes are kept when
+    re-encoding would neither shrink the file nor change its orientation.
+    """
+    dims = image_dimensions(data)
+    tokens_before = estimate_image_tokens(*dims) if dims else DEFAULT_IMAGE_TOKENS
+    unchanged = PreparedFile(name=name, type=mime, data=data, original_size=len(data), tokens_before=tokens_before, tokens_after=tokens_before)
+    if not PREPROCESS_IMAGES: return unchanged
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            orientation = img.getexif().get(0x0112, 1)
+            rotated = ImageOps.exif_transpose(img)
+            if rotated.mode != "RGB":
+                rgba = rotated.convert("RGBA")
+                rotated = Image.new("RGB", rgba.size, (255, 255, 255)); rotated.paste(rgba, mask=rgba.getchannel("A"))
+            size = model_input_size(*rotated.size)
+            if size != rotated.size: rotated = rotated.resize(size, Image.LANCZOS)
+            out = io.BytesIO()
+            rotated.save(out, format="JPEG", quality=PREPROCESS_JPEG_QUALITY, optimize=True)
+    except Exception: return unchanged
+    if len(out.getvalue()) >= len(data) and orientation == 1: return unchanged
+    return PreparedFile(name=name, type="image/jpeg", data=out.getvalue(), original_size=len(data), tokens_before=tokens_before, tokens_after=estimate_image_tokens(*size))
+
+def prepare_file(file: Any) -> PreparedFile:
+    return preprocess_image(file.name, file.type, file.getvalue()).copy(update={"page": getattr(file, "page", 0)})
+
+def preprocess_report(files: List[PreparedFile]) -> Dict[str, Dict[str, int]]:
+    return {f.name: {"bytes_before": f.original_size, "bytes_after": len(f.data), "tokens_before": f.tokens_before, "tokens_after": f.tokens_after} for f in files}
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# --- Constants ---
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 8))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 15 * 60))
+
+class Job:
+    """One unit of background work. Workers append partial results with `report`; readers poll `state`."""
+    def __init__(self, kind: str):
+        self.id, self.kind = uuid.uuid4().hex, kind
+        self.state = "queued" # queued -> running -> done | failed | cancelled
+        self.submitted_at, self.started_at, self.finished_at = time.time(), None, None
+        self.result: Any = None
+        self.error: Optional[str] = None; self.traceback: Optional[str] = None
+        self._progress: List[Any] = []
+        self._lock = threading.Lock()
+
+    def report(self, item: Any) -> None:
+        with self._lock: self._progress.append(item)
+
+    def progress(self, since: int = 0) -> List[Any]:
+        """Partial results reported so far, starting at index `since`."""
+        with self._lock: return self._progress[since:]
+
+    @property
+    def finished(self) -> bool: return self.state in ("done", "failed", "cancelled")
+
+class JobRunner:
+    """Bounded worker pool shared by every session in the process; jobs are looked up by id from session state."""
+    def __init__(self, max_workers: int = JOB_WORKERS, retention: float = JOB_RETENTION_SECONDS):
+        self.max_workers, self.retention = max_workers, retention
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._futures: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> str:
+        """Queues `fn(job, *args, **kwargs)` and returns the job id; the return value becomes `job.result`."""
+        job = Job(kind)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._futures[job.id] = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.state, job.started_at = "running", time.time()
+        try: result, state = fn(job, *args, **kwargs), "done"
+        except Exception as e:
+            result, state = None, "failed"
+            job.error, job.traceback = f"{type(e).__name__}: {e}", traceback.format_exc()
+        # Everything else is in place before the state says finished, so readers and `_prune` never see finished_at unset
+        job.result, job.finished_at = result, time.time()
+        job.state = state
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock: return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job that has not started yet; running jobs are left to finish."""
+        with self._lock:
+            future, job = self._futures.get(job_id), self._jobs.get(job_id)
+            if not future or not future.cancel(): return False
+            job.finished_at, job.state = time.time(), "cancelled"
+        return True
+
+    def _prune(self) -> None:
+        """Forgets finished jobs older than the retention window. Caller holds the lock."""
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished and (j.finished_at or 0) < cutoff]:
+            self._jobs.pop(job_id, None); self._futures.pop(job_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock: states = [j.state for j in self._jobs.values()]
+        return {"workers": self.max_workers, **{s: states.count(s) for s in ("queued", "running", "done", "failed", "cancelled")}}
+
+    def shutdown(self) -> None: self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,165 @@
+"""Process-wide stage timings and token counts, exported as Prometheus text or JSON.
+
+Histograms and counters are keyed by name plus labels (stage, doc_type, ...). Set METRICS_PORT to serve
+/metrics (Prometheus) and /metrics.json from a background thread, or call `write_metrics` to dump both files.
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# --- Constants ---
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0)) # 0 disables the HTTP endpoint
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+STAGE_SECONDS = "intake_stage_seconds"
+REQUEST_TOKENS = "intake_request_tokens"
+HELP = {
+    STAGE_SECONDS: "Wall-clock seconds per intake stage (file_read, base64_encode, request_build, model_round_trip, json_parse, validation, barcode_decode, mvr_pull, form_render)",
+    REQUEST_TOKENS: "Tokens per OpenAI request by kind (prompt/completion) and document type",
+    "intake_tokens_total": "OpenAI tokens used, by kind and model",
+    "intake_barcode_total": "Driver license barcode fast-path attempts, by outcome (hit, partial, no_barcode)",
+    "intake_dedup_total": "Images not sent to the model because they duplicate another (merged: same upload, reused: earlier extraction)",
+    "intake_prefetch_total": "Chat-app documents extracted ahead of their step (started) and picked up when the step came (used)",
+    "intake_vin_decode_total": "Title/bill of sale VINs decoded locally, by outcome (matched, filled, corrected, undecoded)",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last slot is +Inf
+        self.sum, self.count = 0.0, 0
+
+    def observe(self, value: float) -> None:
+        self.counts[next((i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets))] += 1
+        self.sum += value; self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound containing quantile `q` (the resolution Prometheus would give)."""
+        if not self.count: return 0.0
+        rank, seen = math.ceil(q * self.count), 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank: return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+class Metrics:
+    def __init__(self):
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = SECONDS_BUCKETS, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series: series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def reset(self) -> None:
+        with self._lock: self.histograms.clear(); self.counters.clear()
+
+    def prometheus_text(self) -> str:
+        lines = []
+        def fmt(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(labels) + ([extra] if extra else [])
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                if name in HELP: lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{fmt(labels)} {value:g}" for labels, value in sorted(series.items()))
+            for name, series in sorted(self.histograms.items()):
+                if name in HELP: lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{fmt(labels, ('le', f'{bound:g}' if bound != '+Inf' else bound))} {cumulative}")
+                    lines.append(f"{name}_sum{fmt(labels)} {h.sum:g}")
+                    lines.append(f"{name}_count{fmt(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def as_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {name: [dict(labels, value=v) for labels, v in sorted(series.items())] for name, series in self.counters.items()},
+                "histograms": {name: [dict(labels, count=h.count, sum=round(h.sum, 6), mean=round(h.sum / h.count, 6) if h.count else 0.0,
+                                           p50=h.quantile(0.5), p95=h.quantile(0.95), p99=h.quantile(0.99),
+                                           buckets=dict(zip([f"{b:g}" for b in h.buckets] + ["+Inf"], h.counts)))
+                                      for labels, h in sorted(series.items())] for name, series in self.histograms.items()},
+            }
+
+metrics = Metrics()
+
+@contextmanager
+def timer(stage: str, **labels: Any) -> Iterator[Dict[str, Any]]:
+    """Times a block into STAGE_SECONDS; the yielded dict can add labels known only at the end (e.g. doc_type)."""
+    extra: Dict[str, Any] = {}
+    started = time.perf_counter()
+    try: yield extra
+    finally: metrics.observe(STAGE_SECONDS, time.perf_counter() - started, stage=stage, **labels, **extra)
+
+def observe_stage(stage: str, seconds: float, **labels: Any) -> None:
+    metrics.observe(STAGE_SECONDS, seconds, stage=stage, **labels)
+
+def record_usage(usage: Any, model: str, doc_type: str = "unknown") -> None:
+    """Counts `response.usage` prompt and completion tokens; ignores responses without usage."""
+    if usage is None: return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens is None: continue
+        metrics.inc("intake_tokens_total", tokens, kind=kind, model=model)
+        metrics.observe(REQUEST_TOKENS, tokens, TOKEN_BUCKETS, kind=kind, doc_type=doc_type)
+
+def doc_type_label(raw_docs: List[Dict[str, Any]]) -> str:
+    """Label for a request's documents: the single type, "mixed", or "none"."""
+    types = {str(doc.get("type")) for doc in raw_docs}
+    return types.pop() if len(types) == 1 else ("mixed" if types else "none")
+
+def write_metrics(directory: str) -> None:
+    """Writes metrics.prom and metrics.json into `directory` (atomically, so scrapers never see half a file)."""
+    os.makedirs(directory, exist_ok=True)
+    for filename, content in (("metrics.prom", metrics.prometheus_text()), ("metrics.json", json.dumps(metrics.as_json(), indent=2))):
+        tmp = os.path.join(directory, filename + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f: f.write(content)
+        os.replace(tmp, os.path.join(directory, filename))
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics": body, content_type = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif path == "/metrics.json": body, content_type = json.dumps(metrics.as_json()).encode(), "application/json"
+        else: self.send_error(404); return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type); self.send_header("Content-Length", str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def log_message(self, format, *args): pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serves /metrics and /metrics.json on a daemon thread (once per process); no-op when `port` is 0."""
+    global _server
+    if not port: return None
+    with _server_lock:
+        if _server is None:
+            try: _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e: print(f"Note: metrics endpoint not started on port {port}: {e}"); return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
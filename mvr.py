@@ -0,0 +1,110 @@
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import httpx
+from http_pool import get_http_client
+from metrics import timer
+from mvr_cache import MvrCache
+from validation import check_license
+
+# --- Constants ---
+MVRNOW_BASE_URL = os.environ.get("MVRNOW_BASE_URL", "https://mvrnow.com/usd/")
+MVRNOW_ORDER_ENDPOINT = f"{MVRNOW_BASE_URL}Mvr/OrderMvrRecord"
+DPPA_CODE = "06"
+MVR_TIMEOUT = 45.0
+MVR_MAX_CONCURRENCY = int(os.environ.get("MVR_MAX_CONCURRENCY", 4))
+
+# --- Record accessors: how the review form reads an MVRNow `Record.DlRecord` ---
+def list_items(item: Any) -> List[Any]:
+    """MVRNow sends one child as an object and several as a list; this always returns a list."""
+    return [item] if isinstance(item, dict) else (item if isinstance(item, list) else [])
+
+def format_date(d: Optional[Dict[str, Any]]) -> str:
+    if not isinstance(d, dict): return "N/A"
+    try: m, dy, y = str(d.get("Month","")).zfill(2), str(d.get("Day","")).zfill(2), str(d.get("Year",""))
+    except: return "N/A"
+    return f"{m}/{dy}/{y}" if m!="00" and dy!="00" and y else "N/A"
+
+def format_address(addr: Optional[Dict[str, Any]]) -> str:
+    if not isinstance(addr, dict): return "N/A"
+    s_data = addr.get("State"); state = s_data.get("Abbrev","") if isinstance(s_data,dict) else str(s_data or "")
+    parts = [str(addr.get(k,"") or "") for k in ["Street","City"]] + [state] + [str(addr.get("Zip","") or "")]
+    return ", ".join(p for p in parts if p) or "N/A"
+
+def driver_name(driver: Dict[str, Any]) -> str:
+    return " ".join(filter(None, [driver.get(k) for k in ["FirstName", "MiddleName", "LastName"]]))
+
+def driver_address(driver: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    items = list_items(driver.get("AddressList", {}).get("AddressItem"))
+    return items[0] if items else None
+
+def license_statuses(lic: Dict[str, Any]) -> List[str]:
+    return [s["Name"] for s in list_items(lic.get("PersonalStatusList", {}).get("StatusItem")) if isinstance(s, dict) and s.get("Name")]
+
+def license_restrictions(lic: Dict[str, Any]) -> List[Dict[str, Any]]:
+    restriction_list = lic.get("RestrictionList") # may be None or a dict
+    return [r for r in list_items(restriction_list.get("RestrictionItem")) if isinstance(r, dict)] if isinstance(restriction_list, dict) else []
+
+def record_events(dl_record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [e for e in list_items(dl_record.get("EventList", {}).get("EventItem")) if isinstance(e, dict)]
+
+def event_parts(event: Dict[str, Any]) -> Tuple[Dict[str, Any], ...]:
+    """(Common, DescriptionItem, Violation, Accident, Action) of one event; missing parts are empty dicts."""
+    description = event.get("DescriptionList", {}).get("DescriptionItem", {})
+    return event.get("Common", {}), description, event.get("Violation", {}), event.get("Accident", {}), event.get("Action", {})
+
+def get_mvrnow_client() -> httpx.Client:
+    return get_http_client("mvrnow", timeout=MVR_TIMEOUT, warm_url=MVRNOW_BASE_URL)
+
+def pull_mvr_record(api_key: str, state: str, lic_num: str, fname: Optional[str], lname: Optional[str], endpoint: str = MVRNOW_ORDER_ENDPOINT) -> Dict[str, Any]:
+    if not api_key: return {"Error": True, "Message": "MVRNow API Key not configured."}
+    ln_c = str(lic_num).strip(); state_c = str(state).strip().upper()
+    if not state_c or not ln_c: return {"Error": True, "Message": "State/License required."}
+    # Doomed orders still cost money and can take the full timeout, so reject malformed numbers locally
+    check = check_license(state_c, ln_c)
+    if not check.valid:
+        print(f"Note: skipped MVR pull for {ln_c}: {check.message}")
+        return {"Error": True, "Message": f"Invalid license number: {check.message}", "_query_license_number": lic_num}
+    ln_c = check.normalized
+    payload = {"ApiKey": api_key, "State": state_c, "LicenseNumber": ln_c, "DPPACode": DPPA_CODE,
+               "FirstName": str(fname).strip(), "LastName": str(lname).strip(), "ReferenceId": f"nivlapp_{ln_c}"}
+    payload = {k: v for k, v in payload.items() if v}
+    with timer("mvr_pull", state=state_c) as labels:
+        labels["outcome"] = "error"
+        try:
+            resp = get_mvrnow_client().post(endpoint, json=payload)
+            resp.raise_for_status()
+            record = resp.json() | {"_query_license_number": lic_num, "_pulled_at": time.time(), "_cache_hit": False}
+            labels["outcome"] = "ok"
+            return record
+        except httpx.HTTPStatusError as e: err_msg = f"API Error {e.response.status_code}: {e.response.text}"
+        except httpx.RequestError as e: err_msg = f"Network Error: {e}"
+        except Exception as e: err_msg = f"Unexpected Error: {e}"; print(traceback.format_exc())
+    print(f"MVR API Error for {ln_c}: {err_msg}")
+    return {"Error": True, "Message": err_msg, "_query_license_number": lic_num}
+
+def pull_mvr_records(api_key: str, licenses: List[Dict[str, str]], max_workers: int = MVR_MAX_CONCURRENCY,
+                     cache: Optional[MvrCache] = None, force_refresh: bool = False, endpoint: str = MVRNOW_ORDER_ENDPOINT) -> Iterator[Tuple[Dict[str, str], Dict[str, Any]]]:
+    """Pulls MVRs concurrently (at most `max_workers` in flight) and yields (license, result) as each one completes.
+
+    Unexpired cached records are yielded first without calling MVRNow unless `force_refresh` is set;
+    successful pulls are written back to the cache.
+    """
+    to_pull = []
+    for lic in licenses:
+        hit = None if force_refresh or not cache else cache.get(lic['state'], lic['license_number'], DPPA_CODE)
+        if hit is not None: yield lic, hit | {"_query_license_number": lic['license_number']}
+        else: to_pull.append(lic)
+    if not to_pull: return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(to_pull))), thread_name_prefix="mvr") as pool:
+        futures = {pool.submit(pull_mvr_record, api_key, lic['state'], lic['license_number'], lic.get('first_name'), lic.get('last_name'), endpoint): lic for lic in to_pull}
+        for future in as_completed(futures):
+            lic = futures[future]
+            try: res = future.result()
+            except Exception as e:
+                print(traceback.format_exc())
+                res = {"Error": True, "Message": f"Script error: {e}", "_query_license_number": lic['license_number']}
+            if cache: cache.put(lic['state'], lic['license_number'], DPPA_CODE, res, res.get("_pulled_at"))
+            yield lic, res
@@ -0,0 +1,60 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# --- Constants ---
+DEFAULT_MVR_CACHE_PATH = os.environ.get("MVR_CACHE_PATH", ".cache/mvr_cache.sqlite3")
+DEFAULT_MVR_CACHE_TTL = float(os.environ.get("MVR_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+DEFAULT_MVR_CACHE_MAX_ENTRIES = int(os.environ.get("MVR_CACHE_MAX_ENTRIES", 5000))
+
+def mvr_record_key(state: str, license_number: str) -> str:
+    """Normalizes (state, license number) so "ny", " 123-456-789" and "NY", "123456789" name the same driver."""
+    lic = "".join(ch for ch in str(license_number).upper() if ch.isalnum())
+    return f"{str(state).strip().upper()}|{lic}"
+
+def mvr_cache_key(state: str, license_number: str, dppa_code: str) -> str:
+    return f"{mvr_record_key(state, license_number)}|{str(dppa_code).strip()}"
+
+class MvrCache:
+    """Disk-backed MVR results with a TTL and a bounded number of entries (oldest pulls evicted first).
+
+    Only successful pulls are stored. Returned records carry `_pulled_at` (epoch seconds) and `_cache_hit`.
+    """
+    def __init__(self, path: str = DEFAULT_MVR_CACHE_PATH, ttl: float = DEFAULT_MVR_CACHE_TTL, max_entries: int = DEFAULT_MVR_CACHE_MAX_ENTRIES):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path, self.ttl, self.max_entries = path, ttl, max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, value TEXT NOT NULL, pulled_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_pulled_at ON records (pulled_at)")
+
+    def get(self, state: str, license_number: str, dppa_code: str) -> Optional[Dict[str, Any]]:
+        key = mvr_cache_key(state, license_number, dppa_code)
+        with self._lock:
+            row = self._conn.execute("SELECT value, pulled_at FROM records WHERE key = ?", (key,)).fetchone()
+            if row is None: return None
+            if time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM records WHERE key = ?", (key,)); return None
+        return json.loads(row[0]) | {"_pulled_at": row[1], "_cache_hit": True}
+
+    def put(self, state: str, license_number: str, dppa_code: str, record: Dict[str, Any], pulled_at: Optional[float] = None) -> None:
+        if not record or record.get("Error"): return
+        value = json.dumps({k: v for k, v in record.items() if k not in ("_pulled_at", "_cache_hit")})
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO records (key, value, pulled_at) VALUES (?, ?, ?)",
+                               (mvr_cache_key(state, license_number, dppa_code), value, pulled_at or time.time()))
+            self._evict()
+
+    def invalidate(self, state: str, license_number: str, dppa_code: str) -> None:
+        with self._lock: self._conn.execute("DELETE FROM records WHERE key = ?", (mvr_cache_key(state, license_number, dppa_code),))
+
+    def _evict(self) -> None:
+        """Drops expired records, then the oldest pulls beyond `max_entries`. Caller holds the lock."""
+        self._conn.execute("DELETE FROM records WHERE pulled_at < ?", (time.time() - self.ttl,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute("DELETE FROM records WHERE key IN (SELECT key FROM records ORDER BY pulled_at ASC LIMIT ?)", (excess,))
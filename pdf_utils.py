@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import pymupdf
+from PIL import Image
+from dedup import fingerprint, same_content
+from image_utils import PreparedFile
+
+# --- Constants ---
+PDF_RASTER_DPI = int(os.environ.get("PDF_RASTER_DPI", 150))
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", 10))
+PDF_PAGE_CACHE_MAX_BYTES = int(os.environ.get("PDF_PAGE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+BLANK_INK_RATIO = 0.002 # pages with less than 0.2% dark pixels are treated as blank
+
+_page_cache: "OrderedDict[str, Tuple[List[bytes], int]]" = OrderedDict()
+_page_cache_bytes = 0
+_page_cache_lock = threading.Lock()
+
+def is_pdf(data: bytes) -> bool: return data[:5] == b"%PDF-"
+
+def rasterize_pdf(data: bytes, dpi: int = PDF_RASTER_DPI) -> Tuple[List[bytes], int]:
+    """Renders up to PDF_MAX_PAGES pages as PNG, memoized by content hash in a byte-bounded LRU; returns (pages, page count)."""
+    global _page_cache_bytes
+    key = f"{hashlib.sha256(data).hexdigest()}:{dpi}"
+    with _page_cache_lock:
+        if key in _page_cache: _page_cache.move_to_end(key); return _page_cache[key]
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        pages = [page.get_pixmap(dpi=dpi).tobytes("png") for page in doc.pages(0, min(len(doc), PDF_MAX_PAGES))]
+        total = len(doc)
+    size = sum(len(p) for p in pages)
+    with _page_cache_lock:
+        if key not in _page_cache and size <= PDF_PAGE_CACHE_MAX_BYTES:
+            _page_cache[key] = (pages, total); _page_cache_bytes += size
+            while _page_cache_bytes > PDF_PAGE_CACHE_MAX_BYTES:
+                _, (evicted, _) = _page_cache.popitem(last=False); _page_cache_bytes -= sum(len(p) for p in evicted)
+    return pages, total
+
+def truncated_pages(data: bytes, dpi: int = PDF_RASTER_DPI) -> List[int]:
+    """1-based numbers of the pages past PDF_MAX_PAGES, which are never rasterized or extracted."""
+    pages, total = rasterize_pdf(data, dpi)
+    return list(range(len(pages) + 1, total + 1))
+
+def is_blank(img: Image.Image) -> bool:
+    gray = img.convert("L"); gray.thumbnail((512, 512))
+    hist = gray.histogram()
+    return sum(hist[:200]) / max(1, sum(hist)) < BLANK_INK_RATIO
+
+def relevant_pages(data: bytes, dpi: int = PDF_RASTER_DPI) -> List[Tuple[int, bytes]]:
+    """Rasterizes a PDF and drops blank and duplicate pages; returns (1-based page number, PNG bytes).
+
+    A page is a duplicate only when it renders to the same bytes as a kept page or passes the same pixel-level
+    check as duplicate uploads (`dedup.same_content`); pages of text that merely look alike are all kept.
+    """
+    kept, seen, fingerprints = [], set(), []
+    for number, png in enumerate(rasterize_pdf(data, dpi)[0], start=1):
+        with Image.open(io.BytesIO(png)) as img:
+            if is_blank(img): continue
+        digest = hashlib.sha256(png).digest()
+        if digest in seen: continue
+        fp = fingerprint(png)
+        if fp and any(same_content(fp, other) for other in fingerprints): continue
+        kept.append((number, png)); seen.add(digest)
+        if fp: fingerprints.append(fp)
+    return kept
+
+def expand_pdfs(files: List[Any]) -> Tuple[List[Any], Dict[str, List[int]]]:
+    """Replaces each uploaded PDF with one image file per relevant page; other files pass through.
+
+    Also returns {PDF name: page numbers past PDF_MAX_PAGES} so callers can tell the user what was not read.
+    """
+    expanded, truncated = [], {}
+    for file in files:
+        data = file.getvalue()
+        if not is_pdf(data): expanded.append(file); continue
+        pages, rendered = relevant_pages(data), len(rasterize_pdf(data)[0])
+        if len(pages) < rendered: print(f"Note: dropped {rendered - len(pages)} blank or duplicate page(s) from {file.name}")
+        skipped = truncated_pages(data)
+        if skipped:
+            print(f"Note: {file.name} has {rendered + len(skipped)} pages; only the first {PDF_MAX_PAGES} are read")
+            truncated[file.name] = skipped
+        expanded.extend(PreparedFile(name=f"{file.name} (page {n})", type="image/png", data=png, original_size=len(png), page=n,
+                                     license_type=getattr(file, "license_type", None)) for n, png in pages)
+    return expanded, truncated
@@ -0,0 +1,284 @@
+import asyncio
+import base64
+import email.utils
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from image_utils import estimate_file_tokens
+
+# --- Constants ---
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", 300))
+OPENAI_TPM = float(os.environ.get("OPENAI_TPM", 400000))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_MIN_CONCURRENCY = int(os.environ.get("OPENAI_MIN_CONCURRENCY", 1))
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB") # set to a SQLite path to share the budget across processes
+DEFAULT_COMPLETION_TOKENS = 600 # assumed output size when a request does not set max_tokens
+MAX_BACKOFF_SECONDS = 30.0
+LATENCY_SLOWDOWN = 2.5 # latency this many times the running average counts as an overload signal
+IMAGE_HEADER_B64_CHARS = 87384 # decode only ~64 KB of each data URL; enough for PNG/JPEG size headers
+
+class MemoryBuckets:
+    """Token buckets for one process. Reservations may drive a bucket negative so callers queue in arrival order."""
+    def __init__(self):
+        self._state: Dict[str, Tuple[float, float]] = {} # name -> (tokens, updated)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, requests: List[Tuple[str, float, float]]) -> float:
+        """Takes `amount` from each (name, amount, per_minute) bucket; returns the wait until all are covered."""
+        now, delay = time.time(), 0.0
+        with self._lock:
+            for name, amount, per_minute in requests:
+                tokens, updated = self._state.get(name, (per_minute, now))
+                tokens = min(per_minute, tokens + (now - updated) * per_minute / 60.0) - amount
+                self._state[name] = (tokens, now)
+                if tokens < 0: delay = max(delay, -tokens * 60.0 / per_minute)
+            return max(delay, self._paused_until - now)
+
+    def clamp(self, name: str, tokens: float) -> None:
+        with self._lock:
+            current, updated = self._state.get(name, (tokens, time.time()))
+            self._state[name] = (min(current, tokens), updated)
+
+    def pause(self, until: float) -> None:
+        with self._lock: self._paused_until = max(self._paused_until, until)
+
+    def paused_until(self) -> float:
+        with self._lock: return self._paused_until
+
+class SqliteBuckets(MemoryBuckets):
+    """The same buckets kept in a SQLite file so every process on the host draws from one budget."""
+    def __init__(self, path: str):
+        super().__init__()
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # serializes against other processes
+            try: result = fn(); self._conn.execute("COMMIT"); return result
+            except BaseException: self._conn.execute("ROLLBACK"); raise
+
+    def _get(self, name: str, default: float, now: float) -> Tuple[float, float]:
+        row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        return tuple(row) if row else (default, now)
+
+    def _set(self, name: str, tokens: float, updated: float) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, updated))
+
+    def reserve(self, requests: List[Tuple[str, float, float]]) -> float:
+        def take():
+            now, delay = time.time(), 0.0
+            for name, amount, per_minute in requests:
+                tokens, updated = self._get(name, per_minute, now)
+                tokens = min(per_minute, tokens + (now - updated) * per_minute / 60.0) - amount
+                self._set(name, tokens, now)
+                if tokens < 0: delay = max(delay, -tokens * 60.0 / per_minute)
+            return max(delay, self._get("_paused_until", 0.0, now)[0] - now)
+        return self._transaction(take)
+
+    def clamp(self, name: str, tokens: float) -> None:
+        def clamp():
+            current, updated = self._get(name, tokens, time.time())
+            self._set(name, min(current, tokens), updated)
+        self._transaction(clamp)
+
+    def pause(self, until: float) -> None:
+        self._transaction(lambda: self._set("_paused_until", max(until, self._get("_paused_until", 0.0, 0.0)[0]), time.time()))
+
+    def paused_until(self) -> float:
+        with self._lock: return self._get("_paused_until", 0.0, 0.0)[0]
+
+class AdaptiveRateLimiter:
+    """Requests/min and tokens/min budget plus an AIMD concurrency limit for one upstream.
+
+    Callers reserve budget, wait, then hold a concurrency slot until the response headers arrive. A 429 halves
+    the concurrency limit and pauses every caller until `retry-after` (plus jitter); successes grow it back by
+    about one slot per round trip, and responses much slower than usual shrink it slightly.
+    """
+    def __init__(self, rpm: float = OPENAI_RPM, tpm: float = OPENAI_TPM, max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+                 min_concurrency: int = OPENAI_MIN_CONCURRENCY, path: Optional[str] = RATE_LIMIT_DB, name: str = "openai"):
+        self.rpm, self.tpm, self.name = rpm, tpm, name
+        self.min_concurrency, self.max_concurrency = min_concurrency, max_concurrency
+        self.limit = float(max_concurrency)
+        self.buckets = SqliteBuckets(path) if path else MemoryBuckets()
+        self.in_flight = 0
+        self._latency: Optional[float] = None # exponentially weighted average of successful responses
+        self._consecutive_429 = 0
+        self._cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = [] # woken on release and pause changes
+        self.counters = {"requests": 0, "throttled": 0, "errors": 0, "waited_seconds": 0.0, "tokens_reserved": 0}
+
+    def reserve(self, tokens: float) -> float:
+        """Takes one request and `tokens` from the budget; returns how long the caller must wait before sending."""
+        delay = self.buckets.reserve([(f"{self.name}:rpm", 1, self.rpm), (f"{self.name}:tpm", tokens, self.tpm)])
+        with self._cond: self.counters["requests"] += 1; self.counters["tokens_reserved"] += int(tokens)
+        return delay
+
+    def _try_enter(self) -> bool:
+        if self.in_flight >= max(self.min_concurrency, int(self.limit)): return False
+        self.in_flight += 1; return True
+
+    def acquire(self, tokens: float) -> float:
+        """Blocking reserve + wait + concurrency slot; returns seconds spent waiting. Pair with `release`."""
+        started = time.monotonic()
+        delay = self.reserve(tokens)
+        if delay > 0: time.sleep(delay)
+        with self._cond:
+            while not self._try_enter(): self._cond.wait(0.5)
+            waited = time.monotonic() - started; self.counters["waited_seconds"] += waited
+        return waited
+
+    async def acquire_async(self, tokens: float) -> float:
+        """`acquire` for event loops: nothing blocks the loop, and waiters wake on a release or a new pause.
+
+        The reservation runs on a worker thread since a shared (SQLite) budget can wait on other processes.
+        """
+        started = time.monotonic()
+        ready_at = time.time() + await asyncio.to_thread(self.reserve, tokens)
+        while True:
+            # A pause set while this caller waited (a 429 elsewhere) pushes the deadline out
+            paused_until = await asyncio.to_thread(self.buckets.paused_until) if self.shared else self.buckets.paused_until()
+            delay = max(ready_at, paused_until) - time.time()
+            with self._cond:
+                if delay <= 0 and self._try_enter(): break
+                waiter = self._add_async_waiter()
+            await self._wait_async(waiter, delay if delay > 0 else None)
+        waited = time.monotonic() - started
+        with self._cond: self.counters["waited_seconds"] += waited
+        return waited
+
+    @property
+    def shared(self) -> bool: return isinstance(self.buckets, SqliteBuckets)
+
+    def _add_async_waiter(self) -> asyncio.Future:
+        """Registers a future resolved by the next `_wake_async`. Caller holds the condition."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._async_waiters.append((loop, waiter))
+        return waiter
+
+    async def _wait_async(self, waiter: asyncio.Future, timeout: Optional[float]) -> None:
+        try: await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            with self._cond: self._async_waiters = [(loop, w) for loop, w in self._async_waiters if w is not waiter]
+
+    def _wake_async(self) -> None:
+        with self._cond: waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try: loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+            except RuntimeError: pass # loop already closed
+
+    def release(self, status: Optional[int], latency: float, headers: Optional[Any] = None) -> None:
+        """Frees the slot and adapts: `status` is None when the request failed without a response."""
+        headers = headers or {}
+        with self._cond:
+            self.in_flight -= 1
+            if status == 429:
+                self._consecutive_429 += 1; self.counters["throttled"] += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+            elif status is None or status >= 500:
+                self.counters["errors"] += 1
+                self.limit = max(float(self.min_concurrency), self.limit * 0.9)
+            else:
+                self._consecutive_429 = 0
+                slow = self._latency is not None and latency > LATENCY_SLOWDOWN * self._latency
+                self.limit = max(float(self.min_concurrency), self.limit * 0.9) if slow else min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            backoff = min(MAX_BACKOFF_SECONDS, 2 ** (self._consecutive_429 - 1)) if status == 429 else 0.0
+            self._cond.notify_all()
+        if status == 429:
+            # Everyone waits out the server's hint; jitter spreads the restart instead of releasing a herd
+            wait = parse_retry_after(headers)
+            self.buckets.pause(time.time() + (wait if wait is not None else backoff) + random.uniform(0, 0.25 * max(1.0, wait or backoff)))
+        for header, bucket in (("x-ratelimit-remaining-requests", "rpm"), ("x-ratelimit-remaining-tokens", "tpm")):
+            try: self.buckets.clamp(f"{self.name}:{bucket}", float(headers.get(header)))
+            except (TypeError, ValueError): pass
+        self._wake_async() # after any pause, so woken callers see it
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self.counters, waited_seconds=round(self.counters["waited_seconds"], 3), concurrency_limit=round(self.limit, 2),
+                        in_flight=self.in_flight, rpm=self.rpm, tpm=self.tpm, avg_latency=round(self._latency or 0.0, 3),
+                        shared=self.shared)
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Seconds to wait from `retry-after-ms` or `retry-after` (seconds or an HTTP date), if present."""
+    try:
+        if headers.get("retry-after-ms"): return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value: return None
+        try: return max(0.0, float(value))
+        except ValueError: return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError): return None
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """Prompt + expected completion tokens for an OpenAI JSON request: ~4 characters per text token plus image tiles."""
+    try: body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead): return DEFAULT_COMPLETION_TOKENS
+    if not isinstance(body, dict): return DEFAULT_COMPLETION_TOKENS
+    tokens = body.get("max_tokens") or body.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    for message in body.get("messages", []):
+        parts = message.get("content")
+        for part in parts if isinstance(parts, list) else [{"type": "text", "text": parts or ""}]:
+            if part.get("type") == "text": tokens += len(part.get("text", "")) // 4
+            elif part.get("type") == "image_url":
+                url = part.get("image_url", {}).get("url", "")
+                head = url.split(",", 1)[1][:IMAGE_HEADER_B64_CHARS] if url.startswith("data:") and "," in url else ""
+                try: data = base64.b64decode(head[:len(head) // 4 * 4])
+                except ValueError: data = b""
+                tokens += estimate_file_tokens(data, part.get("image_url", {}).get("detail", "high"))
+    return tokens
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Wraps a transport so every POST (SDK retries included) goes through the limiter."""
+    def __init__(self, inner: httpx.BaseTransport, limiter: AdaptiveRateLimiter):
+        self.inner, self.limiter = inner, limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST": return self.inner.handle_request(request) # only API calls count; not warm-up or polling
+        self.limiter.acquire(estimate_request_tokens(request))
+        started, status, headers = time.monotonic(), None, None
+        try:
+            response = self.inner.handle_request(request)
+            status, headers = response.status_code, response.headers
+            return response
+        finally: self.limiter.release(status, time.monotonic() - started, headers)
+
+    def close(self) -> None: self.inner.close()
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, limiter: AdaptiveRateLimiter):
+        self.inner, self.limiter = inner, limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST": return await self.inner.handle_async_request(request)
+        await self.limiter.acquire_async(estimate_request_tokens(request))
+        started, status, headers = time.monotonic(), None, None
+        try:
+            response = await self.inner.handle_async_request(request)
+            status, headers = response.status_code, response.headers
+            return response
+        finally:
+            latency = time.monotonic() - started
+            # A shared budget is a SQLite write; keep it off the event loop
+            if self.limiter.shared: await asyncio.to_thread(self.limiter.release, status, latency, headers)
+            else: self.limiter.release(status, latency, headers)
+
+    async def aclose(self) -> None: await self.inner.aclose()
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(name: str = "openai", **kwargs) -> AdaptiveRateLimiter:
+    """Process-wide limiter per upstream, created on first use (later keyword arguments are ignored)."""
+    with _limiters_lock:
+        if name not in _limiters: _limiters[name] = AdaptiveRateLimiter(name=name, **kwargs)
+        return _limiters[name]
@@ -0,0 +1,74 @@
+from typing import Any, Dict, List, Tuple
+from pydantic import BaseModel
+from extraction import ExtractionResult, expected_fields
+from validation import check_license, check_vin
+
+# --- Constants ---
+LICENSE_CATEGORIES = ("NYS Driver License", "Other Driver's License")
+LICENSE_INIT_FIELDS = ('license_number', 'state', 'first_name', 'last_name')
+
+class ReviewField(BaseModel):
+    label: str; key: str; value: str
+
+class ReviewCategory(BaseModel):
+    name: str
+    is_license: bool = False
+    fields: List[ReviewField] = []
+
+class ReviewModel(BaseModel):
+    """Everything the review form derives from one extraction result, computed once per result version."""
+    categories: List[ReviewCategory] = [] # sorted by name; the contact category is added by the caller
+    licenses: List[Dict[str, str]] = [] # extracted licenses with both number and state, deduplicated
+    raw_json: str = ""
+
+def widget_key(category: str, field: str) -> str:
+    return f"form_{''.join(filter(str.isalnum, category))}_{''.join(filter(str.isalnum, field))}"
+
+def flatten_doc_by_expected(doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc_type = doc.get("type", "Unknown")
+    data = doc.get("data", {})
+    fields = expected_fields.get(doc_type, list(data.keys()))
+    return {f"{doc_type} - {f}": data.get(f, "") for f in fields if data and f in data}
+
+def group_flat_data(flat: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Splits "Category - field" keys into {category: {field: value}}, fields sorted within each category."""
+    grouped = {}
+    for k, v in flat.items():
+        try:
+            cat, field = k.split(" - ", 1)
+            grouped.setdefault(cat, {})[field] = v
+        except ValueError:
+            # Only keys built outside flatten_doc_by_expected can lack the " - " separator
+            grouped.setdefault("Uncategorized", {})[k] = v
+    return {cat: dict(sorted(fields.items())) for cat, fields in grouped.items()}
+
+def normalize_fields(category: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Applies OCR corrections (O/0, I/1, ...) to license numbers and VINs when the corrected value is valid."""
+    fields = dict(fields)
+    checks = {"VIN": check_vin(fields["VIN"]) if fields.get("VIN") else None,
+              "license_number": check_license(fields.get("state"), fields["license_number"]) if category in LICENSE_CATEGORIES and fields.get("license_number") else None}
+    for field, check in checks.items():
+        if check and check.corrected: fields[field] = check.normalized
+    return fields
+
+def build_category(name: str, fields: Dict[str, Any]) -> ReviewCategory:
+    fields = normalize_fields(name, fields)
+    return ReviewCategory(name=name, is_license=name in LICENSE_CATEGORIES,
+                          fields=[ReviewField(label=f, key=widget_key(name, f), value=str(v or "")) for f, v in fields.items()])
+
+def _license_pair(info: Dict[str, Any]) -> Tuple[str, str]:
+    return str(info.get('license_number', '')).strip(), str(info.get('state', '')).strip().upper()
+
+def build_review_model(result: ExtractionResult) -> ReviewModel:
+    flat = {}
+    for doc in result.documents: flat.update(flatten_doc_by_expected(doc.dict())) # V1
+    grouped = group_flat_data(flat)
+    categories = [build_category(cat, grouped[cat]) for cat in sorted(grouped)]
+    licenses, seen = [], set()
+    for cat in categories:
+        if not cat.is_license: continue
+        values = {field.label: field.value for field in cat.fields}
+        info = {f: values[f] for f in LICENSE_INIT_FIELDS if values.get(f)}
+        pair = _license_pair(info)
+        if pair[0] and pair[1] and pair not in seen: licenses.append(info); seen.add(pair)
+    return ReviewModel(categories=categories, licenses=licenses, raw_json=result.json(indent=2)) # V1
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# --- Constants ---
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory") # "memory" (one process) or "sqlite" (every worker on the host)
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", ".cache/sessions.sqlite3")
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", 6 * 3600))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", 10000))
+APPLICATION_ID_BASE = 100000 # SQLite sequence numbers are shown as six-digit confirmation numbers
+
+class MemorySessionStore:
+    """Per-session state (JSON-serializable dicts) for one process: bounded LRU, idle sessions expire."""
+    def __init__(self, idle_timeout: float = SESSION_IDLE_SECONDS, max_entries: int = SESSION_MAX_ENTRIES):
+        self.idle_timeout, self.max_entries = idle_timeout, max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None: return None
+            if time.time() - entry[1] > self.idle_timeout: del self._entries[session_id]; return None
+            self._entries[session_id] = (entry[0], time.time()); self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[session_id] = (state, time.time()); self._entries.move_to_end(session_id)
+            self._evict()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock: self._entries.pop(session_id, None)
+
+    def _evict(self) -> None:
+        """Drops idle sessions, then the least recently used beyond `max_entries`. Caller holds the lock."""
+        cutoff = time.time() - self.idle_timeout
+        while self._entries and (len(self._entries) > self.max_entries or next(iter(self._entries.values()))[1] < cutoff):
+            self._entries.popitem(last=False)
+
+    def next_application_id(self) -> str:
+        """Strictly increasing millisecond counter: unique within the process and across its restarts."""
+        with self._lock:
+            self._last_id = max(self._last_id + 1, int(time.time() * 1000))
+            return str(self._last_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock: return {"backend": "memory", "sessions": len(self._entries), "max_entries": self.max_entries}
+
+class SqliteSessionStore:
+    """The same store in a SQLite file, so any worker process on the host can serve any session."""
+    def __init__(self, path: str = SESSION_DB_PATH, idle_timeout: float = SESSION_IDLE_SECONDS, max_entries: int = SESSION_MAX_ENTRIES):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path, self.idle_timeout, self.max_entries = path, idle_timeout, max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS application_ids (id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL)")
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT state, last_used FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None: return None
+            if time.time() - row[1] > self.idle_timeout:
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)); return None
+            self._conn.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (time.time(), session_id))
+        return json.loads(row[0])
+
+    def put(self, session_id: str, state: Dict[str, Any]) -> None:
+        value = json.dumps(state)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sessions (session_id, state, last_used) VALUES (?, ?, ?)", (session_id, value, time.time()))
+            self._evict()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock: self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _evict(self) -> None:
+        """Drops idle sessions, then the least recently used beyond `max_entries`. Caller holds the lock."""
+        self._conn.execute("DELETE FROM sessions WHERE last_used < ?", (time.time() - self.idle_timeout,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute("DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM sessions ORDER BY last_used ASC LIMIT ?)", (excess,))
+
+    def next_application_id(self) -> str:
+        """Next value of a sequence shared by every process using the file; AUTOINCREMENT never reuses a value."""
+        with self._lock:
+            row_id = self._conn.execute("INSERT INTO application_ids (created) VALUES (?)", (time.time(),)).lastrowid
+        return str(APPLICATION_ID_BASE + row_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock: sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "sessions": sessions, "max_entries": self.max_entries}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store():
+    """Process-wide store selected by SESSION_STORE, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None: _store = SqliteSessionStore() if SESSION_STORE == "sqlite" else MemorySessionStore()
+        return _store
+
+def new_application_id() -> str:
+    return get_session_store().next_application_id()
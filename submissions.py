@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from http_pool import get_http_client
+
+# --- Constants ---
+SUBMISSION_QUEUE_PATH = os.environ.get("SUBMISSION_QUEUE_PATH", ".cache/submissions.sqlite3")
+SUBMISSION_BACKEND_URL = os.environ.get("SUBMISSION_BACKEND_URL") # unset: submissions stay queued until one is configured
+SUBMISSION_BACKEND_TOKEN = os.environ.get("SUBMISSION_BACKEND_TOKEN")
+SUBMISSION_BATCH_SIZE = int(os.environ.get("SUBMISSION_BATCH_SIZE", 20))
+SUBMISSION_FLUSH_INTERVAL = float(os.environ.get("SUBMISSION_FLUSH_INTERVAL", 2.0))
+SUBMISSION_MAX_PENDING = int(os.environ.get("SUBMISSION_MAX_PENDING", 10000)) # backpressure: refuse new submissions beyond this
+SUBMISSION_MAX_ATTEMPTS = int(os.environ.get("SUBMISSION_MAX_ATTEMPTS", 12))
+SUBMISSION_MAX_BACKOFF = 15 * 60.0
+SUBMISSION_RETENTION_SECONDS = 30 * 24 * 3600 # delivered rows are kept this long for auditing
+
+class QueueFull(RuntimeError):
+    """Raised by `enqueue` when too many submissions are waiting for delivery."""
+
+class PermanentDeliveryError(RuntimeError):
+    """The backend rejected a batch in a way retrying cannot fix."""
+
+def idempotency_key(payload: Dict[str, Any]) -> str:
+    """Stable key for a submission so double clicks and redelivery after a crash are recognisable downstream."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class SubmissionQueue:
+    """Durable submission queue in SQLite (WAL, synchronous=FULL): a row is on disk before `enqueue` returns."""
+    def __init__(self, path: str = SUBMISSION_QUEUE_PATH, max_pending: int = SUBMISSION_MAX_PENDING, max_attempts: int = SUBMISSION_MAX_ATTEMPTS):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path, self.max_pending, self.max_attempts = path, max_pending, max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,
+            created_at REAL NOT NULL, delivered_at REAL, last_error TEXT)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS submissions_due ON submissions (status, next_attempt_at)")
+
+    def enqueue(self, payload: Dict[str, Any], key: Optional[str] = None) -> str:
+        """Persists a submission and returns its idempotency key; resubmitting the same key is a no-op."""
+        key = key or idempotency_key(payload)
+        now = time.time()
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM submissions WHERE idempotency_key = ?", (key,)).fetchone(): return key
+            pending = self._conn.execute("SELECT COUNT(*) FROM submissions WHERE status = 'pending'").fetchone()[0]
+            if pending >= self.max_pending: raise QueueFull(f"{pending} submissions are waiting for delivery")
+            self._conn.execute("INSERT OR IGNORE INTO submissions (idempotency_key, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(payload, default=str), now, now))
+        return key
+
+    def due(self, limit: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Oldest pending submissions whose retry time has come: (row id, idempotency key, payload)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, idempotency_key, payload FROM submissions WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                                      (time.time(), limit)).fetchall()
+        return [(row_id, key, json.loads(payload)) for row_id, key, payload in rows]
+
+    def mark_delivered(self, ids: List[int]) -> None:
+        with self._lock:
+            self._conn.executemany("UPDATE submissions SET status = 'delivered', delivered_at = ?, last_error = NULL WHERE id = ?", [(time.time(), i) for i in ids])
+
+    def mark_failed(self, ids: List[int], error: str, permanent: bool = False) -> None:
+        """Schedules a retry with exponential backoff and jitter, or gives up after `max_attempts` (status 'dead')."""
+        now = time.time()
+        with self._lock:
+            for row_id in ids:
+                attempts = self._conn.execute("SELECT attempts FROM submissions WHERE id = ?", (row_id,)).fetchone()[0] + 1
+                status = "dead" if permanent or attempts >= self.max_attempts else "pending"
+                delay = min(SUBMISSION_MAX_BACKOFF, 2 ** attempts) * random.uniform(0.5, 1.0)
+                self._conn.execute("UPDATE submissions SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                                   (status, attempts, now + delay, error[:2000], row_id))
+
+    def retry_dead(self) -> int:
+        """Puts dead submissions back in the queue (e.g. after fixing the backend); returns how many."""
+        with self._lock:
+            return self._conn.execute("UPDATE submissions SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'", (time.time(),)).rowcount
+
+    def prune(self, retention: float = SUBMISSION_RETENTION_SECONDS) -> None:
+        with self._lock: self._conn.execute("DELETE FROM submissions WHERE status = 'delivered' AND delivered_at < ?", (time.time() - retention,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM submissions GROUP BY status").fetchall())
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM submissions WHERE status = 'pending'").fetchone()[0]
+        return {"pending": counts.get("pending", 0), "delivered": counts.get("delivered", 0), "dead": counts.get("dead", 0),
+                "oldest_pending_age": round(time.time() - oldest, 1) if oldest else 0.0, "max_pending": self.max_pending}
+
+class HttpBackend:
+    """POSTs {"submissions": [...]} to the backend; 2xx or 409 (already received) counts as delivered."""
+    def __init__(self, url: str, token: Optional[str] = SUBMISSION_BACKEND_TOKEN, timeout: float = 30.0):
+        self.url, self.token = url, token
+        self.client = get_http_client("submissions", timeout=timeout)
+
+    def send(self, batch: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        body = {"submissions": [{"idempotency_key": key, **payload} for _, key, payload in batch]}
+        headers = {"Idempotency-Key": hashlib.sha256("|".join(key for _, key, _ in batch).encode()).hexdigest()}
+        if self.token: headers["Authorization"] = f"Bearer {self.token}"
+        resp = self.client.post(self.url, json=body, headers=headers)
+        if resp.status_code == 409 or resp.is_success: return
+        if 400 <= resp.status_code < 500 and resp.status_code not in (408, 425, 429):
+            raise PermanentDeliveryError(f"Backend rejected batch: {resp.status_code} {resp.text[:500]}")
+        resp.raise_for_status()
+
+class SubmissionFlusher:
+    """Daemon thread that drains the queue in batches; `wake` skips the wait after a new submission."""
+    def __init__(self, queue: SubmissionQueue, backend: Optional[HttpBackend], batch_size: int = SUBMISSION_BATCH_SIZE, interval: float = SUBMISSION_FLUSH_INTERVAL):
+        self.queue, self.backend, self.batch_size, self.interval = queue, backend, batch_size, interval
+        self._wake, self._stop = threading.Event(), threading.Event()
+        self._thread = threading.Thread(target=self._run, name="submission-flusher", daemon=True)
+        self.last_error: Optional[str] = None
+
+    def start(self) -> "SubmissionFlusher":
+        if self.backend is None: print("Note: SUBMISSION_BACKEND_URL is not set; submissions are queued but not delivered")
+        self._thread.start()
+        return self
+
+    def wake(self) -> None: self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set(); self._wake.set(); self._thread.join(timeout)
+
+    def flush_once(self) -> int:
+        """Delivers one batch; returns how many submissions were delivered."""
+        batch = self.queue.due(self.batch_size)
+        if not batch or self.backend is None: return 0
+        self.last_error = None
+        return self._deliver(batch)
+
+    def _deliver(self, batch: List[Tuple[int, str, Dict[str, Any]]]) -> int:
+        """Sends `batch`; a permanent rejection is bisected so only the submissions the backend refuses on their own go dead."""
+        ids = [row_id for row_id, _, _ in batch]
+        try: self.backend.send(batch)
+        except PermanentDeliveryError as e:
+            if len(batch) > 1: return self._deliver(batch[:len(batch) // 2]) + self._deliver(batch[len(batch) // 2:])
+            self.last_error = str(e); self.queue.mark_failed(ids, str(e), permanent=True); return 0
+        except (httpx.HTTPError, OSError) as e:
+            self.last_error = f"{type(e).__name__}: {e}"; self.queue.mark_failed(ids, self.last_error); return 0
+        self.queue.mark_delivered(ids)
+        return len(ids)
+
+    def _run(self) -> None:
+        last_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                # Keep draining while full batches go through; otherwise wait for the next tick or a wake-up
+                while self.flush_once() == self.batch_size and not self._stop.is_set(): pass
+                if time.time() - last_prune > 3600: self.queue.prune(); last_prune = time.time()
+            except Exception as e: # never let the flusher die; the rows stay pending
+                self.last_error = f"{type(e).__name__}: {e}"; print(f"Note: submission flush failed: {self.last_error}")
+            self._wake.wait(self.interval); self._wake.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.queue.stats(), backend=self.backend.url if self.backend else None, last_error=self.last_error, running=self._thread.is_alive())
+
+def start_submission_pipeline(path: str = SUBMISSION_QUEUE_PATH, backend_url: Optional[str] = SUBMISSION_BACKEND_URL) -> SubmissionFlusher:
+    """Opens the queue and starts its flusher; pending rows from a previous process are delivered first."""
+    return SubmissionFlusher(SubmissionQueue(path), HttpBackend(backend_url) if backend_url else None).start()
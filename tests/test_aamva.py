@@ -0,0 +1,49 @@
+import aamva
+import extraction
+from aamva import license_from_barcode, parse_aamva, to_document_data
+from image_utils import PreparedFile
+
+# AAMVA version 8 layout: the first element of the DL subfile follows the header on the same line
+NY_BARCODE = ("@\n\x1e\rANSI 636001080002DL00410278ZN03190008DLDAQ123456789\n"
+              "DCSDOE\nDACJANE\nDADNONE\nDAG123 MAIN ST\nDAHAPT 4\nDAIALBANY\nDAJNY\nDAK122070000  \nDBB01021990\r")
+
+def test_parse_reads_header_line_element_and_issuer():
+    fields = parse_aamva(NY_BARCODE)
+    assert fields["IIN"] == "636001" and fields["DAQ"] == "123456789"
+    assert fields["DCS"] == "DOE" and fields["DAK"] == "122070000"
+
+def test_first_occurrence_of_an_element_wins():
+    assert parse_aamva("DAQ111\nDAQ222")["DAQ"] == "111"
+
+def test_to_document_data_maps_fields_and_drops_placeholders():
+    data = to_document_data(parse_aamva(NY_BARCODE))
+    assert data == {"last_name": "DOE", "first_name": "JANE", "license_number": "123456789", "address": "123 MAIN ST, APT 4",
+                    "city": "ALBANY", "state": "NY", "zip_code": "12207"}
+
+def test_older_name_layouts():
+    assert to_document_data({"DAA": "DOE,JANE,Q"})["middle_name"] == "Q"
+    assert to_document_data({"DCS": "DOE", "DCT": "JANE,Q"})["first_name"] == "JANE"
+
+def test_license_from_barcode_needs_every_required_field(monkeypatch):
+    monkeypatch.setattr(aamva, "zxingcpp", object())
+    monkeypatch.setattr(aamva, "decode_pdf417", lambda data: data.decode())
+    doc = license_from_barcode("front.jpg", NY_BARCODE.encode(), "NYS Driver License")
+    assert doc["type"] == "NYS Driver License" and doc["filename"] == "front.jpg" and doc["data"]["zip_code"] == "12207"
+    assert license_from_barcode("front.jpg", NY_BARCODE.replace("DAIALBANY\n", "").encode(), "NYS Driver License") is None
+
+def test_the_upload_not_the_issuer_decides_whose_license_it_is(monkeypatch):
+    monkeypatch.setattr(aamva, "zxingcpp", object())
+    monkeypatch.setattr(aamva, "decode_pdf417", lambda data: data.decode())
+    nj_barcode = NY_BARCODE.replace("636001", "636036").replace("DAJNY", "DAJNJ").encode()
+    assert license_from_barcode("primary.jpg", nj_barcode, "NYS Driver License")["type"] == "NYS Driver License"
+    assert license_from_barcode("other.jpg", NY_BARCODE.encode(), "Other Driver's License")["type"] == "Other Driver's License"
+
+def test_licenses_without_upload_context_go_to_the_model(monkeypatch):
+    monkeypatch.setattr(aamva, "zxingcpp", object())
+    monkeypatch.setattr(aamva, "decode_pdf417", lambda data: data.decode())
+    monkeypatch.setattr(extraction, "group_near_duplicates", lambda files, key: (files, {}))
+    unknown = PreparedFile(name="license.jpg", type="image/jpeg", data=NY_BARCODE.encode())
+    other = PreparedFile(name="other.jpg", type="image/jpeg", data=NY_BARCODE.encode() + b" ", license_type="Other Driver's License")
+    docs, pending, _ = extraction.lookup_cached([unknown, other], None)
+    assert [file.name for file in pending] == ["license.jpg"]
+    assert [(doc["filename"], doc["type"]) for doc in docs] == [("other.jpg", "Other Driver's License")]
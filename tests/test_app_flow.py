@@ -0,0 +1,48 @@
+import asyncio
+import os
+import tempfile
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test") # app.py builds its client at import
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp()) # chainlit writes its .chainlit/ and .files/ directories into the working directory on import
+try:
+    pytest.importorskip("chainlit")
+    import app
+finally: os.chdir(_cwd)
+
+class FakeMessage:
+    def __init__(self, *args, **kwargs): self.kwargs = kwargs
+    async def send(self): return self
+    async def update(self): return self
+
+class FakeAskUser(FakeMessage):
+    async def send(self): return {"output": "555-0100"}
+
+@pytest.fixture
+def flow(monkeypatch):
+    state = {"data": app.ApplicationFormData(), "step": "welcome", "bulk_filled": []}
+    asked = []
+    class FakeAskFile(FakeMessage):
+        async def send(self): asked.append(self.kwargs["content"]); return None
+    monkeypatch.setattr(app, "_session_state", lambda: state)
+    monkeypatch.setattr(app, "extractions_ahead", lambda: {})
+    monkeypatch.setattr(app.cl, "Message", FakeMessage)
+    monkeypatch.setattr(app.cl, "AskUserMessage", FakeAskUser)
+    monkeypatch.setattr(app.cl, "AskFileMessage", FakeAskFile)
+    return state, asked
+
+def test_bulk_filled_documents_are_skipped_on_the_way_forward(flow):
+    state, asked = flow
+    state["bulk_filled"] = ["nys_license", "vehicle_title"]
+    assert asyncio.run(app.request_document("nys_license", "nys_license_intro")) == "tlc_license_upload"
+    assert asyncio.run(app.request_document("vehicle_title", "vehicle_title_intro")) == "contact_info"
+    assert not asked
+
+def test_edit_after_a_full_bulk_upload_asks_for_the_document_again(flow):
+    state, asked = flow
+    state["bulk_filled"] = list(app.UPLOAD_ORDER) # every document came from the bulk upload: straight to contact info
+    assert asyncio.run(app.request_contact_info()) == "additional_questions"
+    assert state["bulk_filled"] == []
+    asyncio.run(app.request_document("nys_license", "nys_license_intro")) # "Edit uploaded documents" from review
+    assert len(asked) == 1
@@ -0,0 +1,38 @@
+import io
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+from dedup import NearDuplicateIndex, fingerprint, hash_distances, same_content
+
+def card(number: str = "123456789", fmt: str = "PNG", size=(2400, 1520)) -> bytes:
+    """A license-like photo: text drawn small, then enlarged and softened the way a camera would."""
+    img = Image.new("RGB", (300, 190), (235, 230, 220))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((12, 20, 100, 135), fill=(90, 120, 160))
+    for i, line in enumerate(["NEW YORK STATE", "DRIVER LICENSE", f"ID {number}", "DOE, JANE", "123 MAIN ST"]):
+        draw.text((112, 25 + 20 * i), line, fill="black")
+    out = io.BytesIO()
+    photo = img.resize((2400, 1520), Image.BICUBIC).filter(ImageFilter.GaussianBlur(3))
+    photo.resize(size, Image.LANCZOS).save(out, format=fmt, quality=90)
+    return out.getvalue()
+
+def test_hash_distances_counts_differing_bits():
+    hashes = np.array([0, 0b1011, (1 << 64) - 1], dtype=np.uint64)
+    assert hash_distances(0, hashes).tolist() == [0, 3, 64]
+
+def test_reencoded_and_resized_copies_match():
+    original = fingerprint(card())
+    assert same_content(original, fingerprint(card(fmt="JPEG")))
+    assert same_content(original, fingerprint(card(size=(1400, 887), fmt="JPEG")))
+
+def test_one_changed_digit_is_not_a_duplicate():
+    assert not same_content(fingerprint(card("123456789")), fingerprint(card("123456780")))
+
+def test_non_images_have_no_fingerprint():
+    assert fingerprint(b"%PDF-1.4 not an image") is None
+
+def test_index_finds_a_previously_extracted_copy(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "dups.sqlite3"))
+    index.add("key-1", fingerprint(card()))
+    assert index.find(fingerprint(card(fmt="JPEG"))) == "key-1"
+    assert index.find(fingerprint(card("987654321"))) is None
+    assert index.stats()["hits"] == 1 and index.stats()["misses"] == 1
@@ -0,0 +1,20 @@
+import extraction
+from extraction import ExtractionResult, file_key, lookup_cached, store_cached
+from extraction_cache import ExtractionCache
+from image_utils import PreparedFile
+
+def tlc_license(number: str):
+    return ExtractionResult.parse_obj({"documents": [{"type": "TLC Hack License", "filename": "image.jpg",
+                                                      "data": {"license_number": number, "first_name": "JANE", "last_name": "DOE"}}]}).documents
+
+def test_uploads_sharing_a_name_are_cached_under_their_own_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction, "get_near_duplicate_index", lambda: None)
+    cache = ExtractionCache(str(tmp_path / "extractions.sqlite3"))
+    first, second = (PreparedFile(name="image.jpg", type="image/jpeg", data=data) for data in (b"\xff\xd8first", b"\xff\xd8second"))
+    assert file_key(first) != file_key(second)
+    store_cached([first], tlc_license("5111111"), cache) # each phone upload answered by its own request
+    store_cached([second], tlc_license("5222222"), cache)
+    assert cache.get(file_key(first))[0]["data"]["license_number"] == "5111111"
+    assert cache.get(file_key(second))[0]["data"]["license_number"] == "5222222"
+    docs, pending, _ = lookup_cached([second], cache)
+    assert pending == [] and docs[0]["data"]["license_number"] == "5222222"
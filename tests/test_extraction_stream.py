@@ -0,0 +1,20 @@
+import json
+from extraction import DocumentStreamParser
+
+DOCS = [{"type": "NYS Driver License", "filename": "a.jpg", "data": {"license_number": "123456789", "address": "1 {Main} St"}},
+        {"type": "Insurance Card", "filename": "b.jpg", "data": {"policy_number": "P-1"}}]
+
+def test_documents_are_emitted_as_soon_as_their_json_closes():
+    text = json.dumps({"documents": DOCS})
+    parser, emitted = DocumentStreamParser(), []
+    first_complete = text.index("}}") + 2
+    for i in range(0, len(text), 7):
+        emitted += parser.feed(text[i:i + 7])
+        if i + 7 < first_complete: assert not emitted
+    assert emitted == DOCS
+
+def test_text_before_the_documents_array_is_skipped():
+    parser = DocumentStreamParser()
+    assert parser.feed('{"note": "{not a doc}", ') == []
+    assert parser.feed('"documents": [') == []
+    assert parser.feed(json.dumps(DOCS[1]) + "]}") == [DOCS[1]]
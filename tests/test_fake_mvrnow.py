@@ -0,0 +1,24 @@
+from fake_mvrnow import fake_mvr_record
+from mvr import (driver_address, driver_name, event_parts, format_address, format_date, license_restrictions, license_statuses,
+                 record_events)
+
+def test_fake_record_renders_through_the_review_form_accessors():
+    record = fake_mvr_record({"State": "NY", "LicenseNumber": "123456789", "FirstName": "JANE", "LastName": "DOE"}, events=2)
+    dl_record = record["Record"]["DlRecord"]
+    driver, lic = dl_record["Driver"], dl_record["CurrentLicense"]
+    assert driver_name(driver) == "JANE DOE"
+    assert format_date(driver["BirthDate"]) != "N/A"
+    assert format_address(driver_address(driver)) == "1 MAIN ST, NEW YORK, NY, 10001"
+    assert lic["Number"] == "123456789" and format_date(lic["ExpirationDate"]) == "01/01/2028"
+    assert license_statuses(lic) == ["VALID"] and license_restrictions(lic) == []
+    events = record_events(dl_record)
+    assert len(events) == 2
+    common, description, violation, accident, action = event_parts(events[0])
+    assert common["Subtype"] == "Violation" and format_date(common["Date"]) == "01/15/2022" and common["Location"] == "NEW YORK"
+    assert description["AdrSmallDescription"] == "SPEEDING 10 MPH OVER" and description["StateAssignedPoints"] == "3"
+    assert format_date(violation["ConvictionDate"]) == "02/01/2022" and violation["FineAmount"] == "150"
+    assert accident == {} and action == {}
+
+def test_fake_record_is_stable_per_license():
+    payload = {"State": "NY", "LicenseNumber": "123456789"}
+    assert fake_mvr_record(payload) == fake_mvr_record(payload)
@@ -0,0 +1,50 @@
+import threading
+import time
+import pytest
+from jobs import Job, JobRunner
+
+def wait(runner: JobRunner, job_id: str) -> Job:
+    job = runner.get(job_id)
+    deadline = time.time() + 5
+    while not job.finished and time.time() < deadline: time.sleep(0.005)
+    return job
+
+def test_results_errors_and_progress():
+    runner = JobRunner(max_workers=2)
+    def work(job, n):
+        for i in range(n): job.report(i)
+        return n * 2
+    def fail(job): raise ValueError("bad upload")
+    done, failed = wait(runner, runner.submit("t", work, 3)), wait(runner, runner.submit("t", fail))
+    assert (done.state, done.result, done.progress(1)) == ("done", 6, [1, 2])
+    assert failed.state == "failed" and failed.error == "ValueError: bad upload" and "bad upload" in failed.traceback
+
+def test_a_finished_job_always_has_its_finish_time():
+    order = []
+    class Recording(Job):
+        def __setattr__(self, name, value):
+            if name in ("state", "finished_at"): order.append((name, value))
+            super().__setattr__(name, value)
+    job = Recording("t")
+    JobRunner._run(None, job, lambda job: "ok", (), {})
+    assert order[-1] == ("state", "done") and order[-2][0] == "finished_at" and order[-2][1] is not None
+
+def test_prune_runs_concurrently_with_finishing_jobs():
+    runner = JobRunner(max_workers=8, retention=0.0)
+    errors = []
+    def submit_many():
+        try:
+            for _ in range(200): runner.submit("t", lambda job: None)
+        except Exception as e: errors.append(e)
+    threads = [threading.Thread(target=submit_many) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+
+@pytest.mark.parametrize("state", ["done", "failed", "cancelled"])
+def test_prune_forgets_old_finished_jobs(state):
+    runner = JobRunner(retention=60)
+    job = Job("t"); job.state, job.finished_at = state, time.time() - 120
+    runner._jobs[job.id] = job
+    runner.submit("t", lambda job: None)
+    assert runner.get(job.id) is None
@@ -0,0 +1,38 @@
+import time
+from mvr_cache import MvrCache, mvr_cache_key, mvr_record_key
+
+RECORD = {"Driver": {"FirstName": "JANE", "LastName": "DOE"}}
+
+def test_keys_normalize_state_and_license():
+    assert mvr_record_key(" ny", "123-456 789") == mvr_record_key("NY", "123456789") == "NY|123456789"
+    assert mvr_cache_key("ny", "123-456-789", "06") == "NY|123456789|06"
+
+def test_hit_carries_pull_time_and_ignores_formatting(tmp_path):
+    cache = MvrCache(str(tmp_path / "mvr.sqlite3"))
+    cache.put("NY", "123456789", "06", RECORD | {"_cache_hit": False})
+    hit = cache.get("ny", "123-456-789", "06")
+    assert hit["Driver"] == RECORD["Driver"] and hit["_cache_hit"] is True and hit["_pulled_at"] > 0
+    assert cache.get("NY", "123456789", "01") is None
+
+def test_errors_are_not_cached(tmp_path):
+    cache = MvrCache(str(tmp_path / "mvr.sqlite3"))
+    cache.put("NY", "123456789", "06", {"Error": True, "Message": "timeout"})
+    assert cache.get("NY", "123456789", "06") is None
+
+def test_expired_records_are_dropped(tmp_path):
+    cache = MvrCache(str(tmp_path / "mvr.sqlite3"), ttl=60)
+    cache.put("NY", "123456789", "06", RECORD, pulled_at=time.time() - 120)
+    assert cache.get("NY", "123456789", "06") is None
+
+def test_oldest_pulls_are_evicted_beyond_max_entries(tmp_path):
+    cache = MvrCache(str(tmp_path / "mvr.sqlite3"), max_entries=2)
+    now = time.time()
+    for i, lic in enumerate(["111", "222", "333"]): cache.put("NY", lic, "06", RECORD, pulled_at=now + i)
+    assert cache.get("NY", "111", "06") is None
+    assert cache.get("NY", "222", "06") and cache.get("NY", "333", "06")
+
+def test_invalidate(tmp_path):
+    cache = MvrCache(str(tmp_path / "mvr.sqlite3"))
+    cache.put("NY", "123456789", "06", RECORD)
+    cache.invalidate("NY", "123-456-789", "06")
+    assert cache.get("NY", "123456789", "06") is None
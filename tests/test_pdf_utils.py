@@ -0,0 +1,45 @@
+import pymupdf
+import pdf_utils
+from image_utils import PreparedFile
+from pdf_utils import expand_pdfs, relevant_pages, truncated_pages
+
+TITLE_PAGE = ["CERTIFICATE OF TITLE", "VIN 1HGCM82633A004352", "OWNER JANE DOE", "MAKE HONDA  YEAR 2003"]
+
+def make_pdf(*pages) -> bytes:
+    """One page per entry: a list of text lines, or None for a blank page."""
+    doc = pymupdf.open()
+    for lines in pages:
+        page = doc.new_page()
+        for i, line in enumerate(lines or []): page.insert_text((72, 100 + 28 * i), line, fontsize=16)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def page_numbers(data: bytes):
+    return [number for number, _ in relevant_pages(data)]
+
+def test_blank_pages_are_dropped():
+    assert page_numbers(make_pdf(TITLE_PAGE, None, TITLE_PAGE[:2] + ["OWNER JOHN ROE"])) == [1, 3]
+
+def test_identical_pages_are_dropped():
+    assert page_numbers(make_pdf(TITLE_PAGE, TITLE_PAGE, ["BILL OF SALE", "PRICE $4,500"])) == [1, 3]
+
+def test_similar_text_pages_are_all_kept():
+    pages = [["BILL OF SALE", f"PAGE {n} OF 3", "SELLER JOHN ROE", f"TERMS CLAUSE {n}"] for n in (1, 2, 3)]
+    assert page_numbers(make_pdf(*pages)) == [1, 2, 3]
+    assert page_numbers(make_pdf(TITLE_PAGE, TITLE_PAGE[:3] + ["MAKE HONDA  YEAR 2004"])) == [1, 2]
+
+def test_pages_past_the_limit_are_reported(monkeypatch):
+    monkeypatch.setattr(pdf_utils, "PDF_MAX_PAGES", 2)
+    data = make_pdf(*[[f"INVOICE PAGE {n}", f"LINE ITEM {n * 7}"] for n in range(1, 6)])
+    assert page_numbers(data) == [1, 2]
+    assert truncated_pages(data) == [3, 4, 5]
+    files, truncated = expand_pdfs([PreparedFile(name="invoice.pdf", type="application/pdf", data=data, original_size=len(data))])
+    assert [file.name for file in files] == ["invoice.pdf (page 1)", "invoice.pdf (page 2)"]
+    assert truncated == {"invoice.pdf": [3, 4, 5]}
+
+def test_short_pdfs_and_images_report_nothing():
+    data = make_pdf(TITLE_PAGE)
+    image = PreparedFile(name="front.jpg", type="image/jpeg", data=b"\xff\xd8", original_size=2)
+    files, truncated = expand_pdfs([PreparedFile(name="title.pdf", type="application/pdf", data=data, original_size=len(data)), image])
+    assert len(files) == 2 and files[1] is image and truncated == {}
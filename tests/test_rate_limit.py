@@ -0,0 +1,67 @@
+import asyncio
+import time
+import httpx
+from rate_limit import AdaptiveRateLimiter, MemoryBuckets, estimate_request_tokens, parse_retry_after
+
+def limiter(**kwargs) -> AdaptiveRateLimiter:
+    return AdaptiveRateLimiter(**dict(dict(rpm=6000, tpm=10_000_000, max_concurrency=8, min_concurrency=1, path=None), **kwargs))
+
+def test_429_halves_the_limit_and_success_grows_it_back():
+    lim = limiter()
+    lim.acquire(10); lim.release(429, 0.1, {"retry-after": "0"})
+    assert lim.limit == 4.0 and lim.counters["throttled"] == 1
+    lim.acquire(10); lim.release(200, 0.1)
+    assert 4.0 < lim.limit < 5.0
+    lim.acquire(10); lim.release(500, 0.1)
+    assert lim.limit < 4.5 and lim.counters["errors"] == 1
+
+def test_limit_never_drops_below_the_minimum():
+    lim = limiter(max_concurrency=2, min_concurrency=1)
+    for _ in range(5): lim.acquire(1); lim.release(429, 0.1, {"retry-after": "0"})
+    assert lim.limit == 1.0
+
+def test_budget_overdraw_returns_a_wait():
+    buckets = MemoryBuckets()
+    assert buckets.reserve([("rpm", 60, 60)]) == 0.0
+    assert abs(buckets.reserve([("rpm", 1, 60)]) - 1.0) < 0.05 # one request per second once the minute's budget is spent
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({}) is None
+
+def test_estimate_request_tokens_counts_text_and_max_tokens():
+    request = httpx.Request("POST", "https://example.test/v1/chat/completions", json={"max_tokens": 100, "messages": [{"role": "user", "content": "x" * 400}]})
+    assert estimate_request_tokens(request) == 200
+
+def test_async_waiter_wakes_on_release():
+    lim = limiter(max_concurrency=1)
+    async def main():
+        await lim.acquire_async(1)
+        waiting = asyncio.create_task(lim.acquire_async(1))
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+        released = time.monotonic()
+        lim.release(200, 0.1)
+        await asyncio.wait_for(waiting, 1.0)
+        return time.monotonic() - released
+    assert asyncio.run(main()) < 0.05
+
+def test_async_waiter_honours_a_pause_set_while_it_waits():
+    lim = limiter(max_concurrency=1)
+    async def main():
+        await lim.acquire_async(1)
+        waiting = asyncio.create_task(lim.acquire_async(1))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        lim.release(429, 0.1, {"retry-after": "0.5"}) # frees the slot but pauses everyone
+        await asyncio.wait_for(waiting, 3.0)
+        return time.monotonic() - started
+    assert asyncio.run(main()) >= 0.45
+
+def test_async_acquire_with_a_shared_budget(tmp_path):
+    lim = limiter(path=str(tmp_path / "limits.sqlite3"))
+    async def main():
+        await asyncio.gather(*(lim.acquire_async(10) for _ in range(4)))
+    asyncio.run(main())
+    assert lim.in_flight == 4 and lim.stats()["shared"]
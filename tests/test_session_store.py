@@ -0,0 +1,43 @@
+import time
+import pytest
+from session_store import APPLICATION_ID_BASE, MemorySessionStore, SqliteSessionStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory": return MemorySessionStore(**kwargs)
+        return SqliteSessionStore(str(tmp_path / "sessions.sqlite3"), **kwargs)
+    return make
+
+def test_put_get_delete(make_store):
+    store = make_store()
+    store.put("a", {"step": 2, "bulk_filled": ["license"]})
+    assert store.get("a") == {"step": 2, "bulk_filled": ["license"]}
+    store.delete("a")
+    assert store.get("a") is None and store.get("missing") is None
+
+def test_least_recently_used_session_is_evicted(make_store):
+    store = make_store(max_entries=2)
+    store.put("a", {}); time.sleep(0.01); store.put("b", {}); time.sleep(0.01)
+    store.get("a"); time.sleep(0.01) # touching "a" makes "b" the oldest
+    store.put("c", {})
+    assert store.get("b") is None and store.get("a") == {} and store.get("c") == {}
+
+def test_idle_sessions_expire(make_store):
+    store = make_store(idle_timeout=0.05)
+    store.put("a", {"step": 1})
+    time.sleep(0.1)
+    assert store.get("a") is None
+
+def test_application_ids_are_unique_and_increasing(make_store):
+    store = make_store()
+    ids = [int(store.next_application_id()) for _ in range(50)]
+    assert ids == sorted(set(ids))
+
+def test_sqlite_ids_are_shared_by_every_store_on_the_file(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    first, second = SqliteSessionStore(path), SqliteSessionStore(path)
+    assert int(first.next_application_id()) == APPLICATION_ID_BASE + 1
+    assert int(second.next_application_id()) == APPLICATION_ID_BASE + 2
+    first.put("a", {"step": 3})
+    assert second.get("a") == {"step": 3}
@@ -0,0 +1,74 @@
+import time
+import httpx
+import pytest
+from submissions import HttpBackend, PermanentDeliveryError, QueueFull, SubmissionFlusher, SubmissionQueue
+
+class FakeBackend:
+    """Accepts every batch, except that submissions whose "bad" flag is set make the whole batch fail permanently."""
+    url = "https://backend.test/submissions"
+    def __init__(self, error: Exception = None):
+        self.error, self.batches = error, []
+    def send(self, batch):
+        self.batches.append([key for _, key, _ in batch])
+        if self.error: raise self.error
+        if any(payload.get("bad") for _, _, payload in batch): raise PermanentDeliveryError("Backend rejected batch: 422")
+
+def statuses(queue: SubmissionQueue):
+    return dict(queue._conn.execute("SELECT idempotency_key, status FROM submissions").fetchall())
+
+def test_enqueue_is_durable_and_idempotent(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    key = SubmissionQueue(path).enqueue({"formData": {"name": "JANE DOE"}})
+    reopened = SubmissionQueue(path) # as after a crash or restart
+    assert reopened.enqueue({"formData": {"name": "JANE DOE"}}) == key
+    assert [(k, p) for _, k, p in reopened.due(10)] == [(key, {"formData": {"name": "JANE DOE"}})]
+
+def test_queue_refuses_work_beyond_max_pending(tmp_path):
+    queue = SubmissionQueue(str(tmp_path / "queue.sqlite3"), max_pending=1)
+    queue.enqueue({"n": 1})
+    with pytest.raises(QueueFull): queue.enqueue({"n": 2})
+
+def test_transient_failures_back_off_then_go_dead(tmp_path):
+    queue = SubmissionQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    key = queue.enqueue({"n": 1})
+    flusher = SubmissionFlusher(queue, FakeBackend(httpx.ConnectError("refused")))
+    assert flusher.flush_once() == 0 and "ConnectError" in flusher.last_error
+    attempts, next_at = queue._conn.execute("SELECT attempts, next_attempt_at FROM submissions").fetchone()
+    assert attempts == 1 and time.time() + 0.9 < next_at < time.time() + 2.1 and queue.due(10) == []
+    queue._conn.execute("UPDATE submissions SET next_attempt_at = 0")
+    flusher.flush_once()
+    assert statuses(queue) == {key: "dead"}
+    assert queue.retry_dead() == 1 and statuses(queue) == {key: "pending"}
+
+def test_one_rejected_submission_does_not_kill_its_batch(tmp_path):
+    queue = SubmissionQueue(str(tmp_path / "queue.sqlite3"))
+    keys = [queue.enqueue({"n": n, "bad": n == 2}) for n in range(5)]
+    flusher = SubmissionFlusher(queue, FakeBackend(), batch_size=5)
+    assert flusher.flush_once() == 4
+    assert statuses(queue) == {key: "dead" if n == 2 else "delivered" for n, key in enumerate(keys)}
+    assert "422" in flusher.last_error and queue.stats()["dead"] == 1
+
+def test_redelivery_after_a_crash_is_recognised_by_the_backend(tmp_path):
+    seen, received = set(), []
+    def handler(request: httpx.Request) -> httpx.Response:
+        key = request.headers["Idempotency-Key"]
+        received.append(key)
+        if key in seen: return httpx.Response(409)
+        seen.add(key); return httpx.Response(201)
+    backend = HttpBackend("https://backend.test/submissions")
+    backend.client = httpx.Client(transport=httpx.MockTransport(handler))
+    queue = SubmissionQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue({"n": 1})
+    backend.send(queue.due(10)) # delivered, but the process dies before marking it
+    assert SubmissionFlusher(queue, backend).flush_once() == 1
+    assert len(received) == 2 and received[0] == received[1] and queue.stats()["delivered"] == 1
+
+def test_backend_classifies_rejections():
+    def handler(request): return httpx.Response(int(request.url.params["status"]))
+    backend = HttpBackend("https://backend.test/submissions")
+    backend.client = httpx.Client(transport=httpx.MockTransport(handler))
+    def send(status):
+        backend.url = f"https://backend.test/submissions?status={status}"; backend.send([(1, "k", {})])
+    send(200); send(409)
+    for status, error in ((422, PermanentDeliveryError), (429, httpx.HTTPStatusError), (503, httpx.HTTPStatusError)):
+        with pytest.raises(error): send(status)
@@ -0,0 +1,48 @@
+import pytest
+import validation
+from validation import check_license, check_vin, vin_check_digit
+
+@pytest.mark.parametrize("number, expected", [
+    ("123456789", "123456789"), # exact
+    ("12345B78", "12345878"), # B -> 8 in the 8-digit format, not a letter-first rewrite
+    ("1234S678", "12345678"),
+    ("1B345678", "18345678"),
+    ("12345678O", "123456780"),
+    ("A1234567", "A1234567"),
+    ("A12345G7", "A1234567"),
+])
+def test_ny_license_takes_the_fit_with_fewest_swaps(number, expected):
+    check = check_license("NY", number)
+    assert check.valid and check.normalized == expected
+
+def test_digit_is_never_turned_into_a_letter():
+    check = check_license("CA", "11234567") # CA is one letter then seven digits
+    assert not check.valid and check.normalized == "11234567"
+
+def test_exact_match_is_not_corrected():
+    check = check_license("NY", " 123-456-789 ")
+    assert check.valid and not check.corrected and check.normalized == "123456789"
+
+def test_tie_between_formats_is_flagged(monkeypatch):
+    monkeypatch.setitem(validation.LICENSE_FORMATS, "ZZ", [(("N", 1), ("A", 1)), (("A", 1), ("N", 1))])
+    check = check_license("ZZ", "OO")
+    assert not check.valid and check.normalized == "OO" and "0O or O0" in check.message
+
+@pytest.mark.parametrize("state, number, valid", [("NY", "", False), ("NY", "12", False), ("TX", "12345678", True), ("TX", "1#2", False)])
+def test_license_rejections(state, number, valid):
+    assert check_license(state, number).valid is valid
+
+def test_vin_check_digit():
+    assert vin_check_digit("1M8GDM9AXKP042788") == "X"
+    assert check_vin("1M8GDM9AXKP042788").valid
+
+@pytest.mark.parametrize("vin, valid, normalized", [
+    ("1M8GDM9AXKP042788", True, "1M8GDM9AXKP042788"),
+    ("1M8GDM9AXKPO42788", True, "1M8GDM9AXKP042788"), # O is never used in a VIN
+    ("1M8GDM9A1KP042788", False, "1M8GDM9A1KP042788"), # wrong check digit
+    ("1M8GDM9AXKP04278", False, "1M8GDM9AXKP04278"),
+    ("", False, ""),
+])
+def test_check_vin(vin, valid, normalized):
+    check = check_vin(vin)
+    assert check.valid is valid and check.normalized == normalized
@@ -0,0 +1,11 @@
+from vin_decode import decode_vin, fill_vehicle_fields
+
+def test_extracted_make_and_year_survive_a_vin_that_does_not_decode():
+    data = {"VIN": "1HGCM82633A004353", "vehicle_make": "HONDA", "vehicle_year": "2003"} # one misread digit breaks the check digit
+    assert decode_vin(data["VIN"]) is None
+    assert fill_vehicle_fields(data) == data
+
+def test_a_verified_vin_fills_and_corrects_make_and_year():
+    decoded = decode_vin("1HGCM82633A004352")
+    filled = fill_vehicle_fields({"VIN": "1HGCM82633A004352", "vehicle_make": "HOND", "vehicle_year": ""})
+    assert filled["vehicle_make"] == decoded.make and filled["vehicle_year"] == str(decoded.year) == "2003"
@@ -0,0 +1,88 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+# --- Constants ---
+# Driver license formats per state as (letters|digits, count) runs, e.g. (("A", 1), ("N", 7)) = one letter then seven digits
+LICENSE_FORMATS: Dict[str, List[Tuple[Tuple[str, int], ...]]] = {
+    "NY": [(("N", 9),), (("A", 1), ("N", 7)), (("A", 1), ("N", 18)), (("N", 8),), (("N", 16),), (("A", 8),)],
+    "NJ": [(("A", 1), ("N", 14))],
+    "CT": [(("N", 9),)],
+    "PA": [(("N", 8),)],
+    "MA": [(("A", 1), ("N", 8)), (("N", 9),)],
+    "FL": [(("A", 1), ("N", 12))],
+    "CA": [(("A", 1), ("N", 7))],
+}
+GENERIC_LICENSE = re.compile(r"^[A-Z0-9]{4,25}$") # states without specific rules
+DIGIT_LOOKALIKES = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "G": "6", "B": "8"}
+VIN_TRANSLITERATION = {**{str(d): d for d in range(10)},
+                       **dict(zip("ABCDEFGH", range(1, 9))), **dict(zip("JKLMN", range(1, 6))), "P": 7, "R": 9,
+                       **dict(zip("STUVWXYZ", range(2, 10)))}
+VIN_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+VIN_OCR_FIXES = {"I": "1", "O": "0", "Q": "0"} # letters never used in a VIN
+VIN_CHECK_DIGIT_REGIONS = "12345" # North American WMIs, where the check digit is mandatory
+
+class FieldCheck(BaseModel):
+    value: str # as entered or extracted
+    normalized: str # cleaned and OCR-corrected; use this for lookups
+    valid: bool
+    message: Optional[str] = None
+    @property
+    def corrected(self) -> bool: return self.valid and self.normalized != clean(self.value)
+
+def clean(value: Optional[str]) -> str:
+    return re.sub(r"[\s\-./]", "", str(value or "")).upper()
+
+def _fit(value: str, runs: Tuple[Tuple[str, int], ...]) -> Optional[Tuple[str, int]]:
+    """(`value` rewritten to match the letter/digit runs, number of characters swapped); None if it cannot fit.
+
+    Only letters that look like digits are swapped: a digit is never turned into a letter, since a digit the
+    model read is far more likely right than a letter-first format is.
+    """
+    expected = "".join(kind * count for kind, count in runs)
+    if len(value) != len(expected): return None
+    fitted, swaps = [], 0
+    for ch, kind in zip(value, expected):
+        if kind == "N" and not ch.isdigit(): ch, swaps = DIGIT_LOOKALIKES.get(ch, ""), swaps + 1
+        elif kind == "A" and not ch.isalpha(): return None
+        if not ch: return None
+        fitted.append(ch)
+    return "".join(fitted), swaps
+
+def check_license(state: Optional[str], number: Optional[str]) -> FieldCheck:
+    state, value = clean(state), clean(number)
+    if not value: return FieldCheck(value=str(number or ""), normalized="", valid=False, message="License number is missing")
+    formats = LICENSE_FORMATS.get(state)
+    if formats is None:
+        valid = bool(GENERIC_LICENSE.match(value))
+        return FieldCheck(value=str(number), normalized=value, valid=valid, message=None if valid else "License number must be 4-25 letters or digits")
+    # The fit needing the fewest swaps wins (an exact match needs none); a tie between different readings is
+    # flagged for the user rather than guessed
+    fits = {fit for fit in (_fit(value, runs) for runs in formats) if fit}
+    if not fits: return FieldCheck(value=str(number), normalized=value, valid=False, message=f"Not a valid {state} license number format")
+    fewest = min(swaps for _, swaps in fits)
+    best = sorted(fitted for fitted, swaps in fits if swaps == fewest)
+    if len(best) > 1: return FieldCheck(value=str(number), normalized=value, valid=False, message=f"Ambiguous {state} license number: could be {' or '.join(best)}")
+    return FieldCheck(value=str(number), normalized=best[0], valid=True)
+
+def vin_check_digit(vin: str) -> str:
+    total = sum(VIN_TRANSLITERATION[ch] * weight for ch, weight in zip(vin, VIN_WEIGHTS))
+    return "X" if total % 11 == 10 else str(total % 11)
+
+def check_vin(vin: Optional[str]) -> FieldCheck:
+    value = clean(vin)
+    normalized = "".join(VIN_OCR_FIXES.get(ch, ch) for ch in value)
+    if not normalized: return FieldCheck(value=str(vin or ""), normalized="", valid=False, message="VIN is missing")
+    if len(normalized) != 17: return FieldCheck(value=str(vin), normalized=normalized, valid=False, message=f"VIN must be 17 characters (got {len(normalized)})")
+    if any(ch not in VIN_TRANSLITERATION for ch in normalized):
+        return FieldCheck(value=str(vin), normalized=normalized, valid=False, message="VIN contains invalid characters")
+    if normalized[0] in VIN_CHECK_DIGIT_REGIONS and vin_check_digit(normalized) != normalized[8]:
+        return FieldCheck(value=str(vin), normalized=normalized, valid=False, message="VIN check digit does not match")
+    return FieldCheck(value=str(vin), normalized=normalized, valid=True)
+
+def check_fields(fields: Dict[str, str], state: Optional[str] = None) -> Dict[str, FieldCheck]:
+    """Checks the validated fields of one document's {field: value}; fields without rules are left out."""
+    checks = {}
+    if "license_number" in fields: checks["license_number"] = check_license(fields.get("state", state), fields["license_number"])
+    if "VIN" in fields: checks["VIN"] = check_vin(fields["VIN"])
+    return checks
@@ -0,0 +1,86 @@
+import datetime
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from metrics import metrics
+from validation import VIN_CHECK_DIGIT_REGIONS, check_vin
+
+# --- Constants ---
+VIN_INDEX_PATH = os.environ.get("VIN_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vin_index.json"))
+VDS_LENGTH = 5 # VIN positions 4-8
+
+class VinDecoding(BaseModel):
+    vin: str # normalized
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    check_digit_verified: bool = False # only North American VINs carry a mandatory check digit
+
+class VinIndex:
+    """The bundled index: WMI -> make, model-year characters, and per-WMI VDS patterns ("." matches any character)."""
+    def __init__(self, raw: Dict[str, Any]):
+        self.wmi: Dict[str, str] = raw["wmi"]
+        self.model_years: Dict[str, int] = raw["model_years"]
+        # Patterns are grouped by which positions they fix, so a lookup is one dict probe per distinct mask
+        self.vds: Dict[str, List[Tuple[Tuple[int, ...], Dict[str, Tuple[str, str]]]]] = {}
+        for wmi, patterns in raw["vds"].items():
+            by_mask: Dict[Tuple[int, ...], Dict[str, Tuple[str, str]]] = {}
+            for pattern, (make, model) in patterns.items():
+                positions = tuple(i for i, ch in enumerate(pattern[:VDS_LENGTH]) if ch != ".")
+                by_mask.setdefault(positions, {})["".join(pattern[i] for i in positions)] = (make, model)
+            # Masks fixing more positions are more specific and are tried first
+            self.vds[wmi] = sorted(by_mask.items(), key=lambda item: -len(item[0]))
+
+    def lookup_vds(self, vin: str) -> Optional[Tuple[str, str]]:
+        vds = vin[3:3 + VDS_LENGTH]
+        for positions, table in self.vds.get(vin[:3], []):
+            hit = table.get("".join(vds[i] for i in positions))
+            if hit: return hit
+        return None
+
+@lru_cache(maxsize=4)
+def load_index(path: str = VIN_INDEX_PATH) -> VinIndex:
+    with open(path, encoding="utf-8") as f: return VinIndex(json.load(f))
+
+def model_year(vin: str, index: Optional[VinIndex] = None) -> Optional[int]:
+    """Model year from position 10; the 30-year cycle is resolved by position 7 for North American VINs."""
+    base = (index or load_index()).model_years.get(vin[9])
+    if base is None: return None
+    latest = datetime.date.today().year + 1
+    if vin[0] in VIN_CHECK_DIGIT_REGIONS: return base + 30 if vin[6].isalpha() and base + 30 <= latest else base
+    return max(year for year in (base, base + 30) if year <= latest)
+
+def decode_vin(vin: Optional[str], index: Optional[VinIndex] = None) -> Optional[VinDecoding]:
+    """Decodes a VIN that passes `check_vin`; None when it does not."""
+    check = check_vin(vin)
+    if not check.valid: return None
+    index = index or load_index()
+    normalized = check.normalized
+    make, model = index.lookup_vds(normalized) or (index.wmi.get(normalized[:3]), None)
+    return VinDecoding(vin=normalized, make=make, model=model, year=model_year(normalized, index),
+                       check_digit_verified=normalized[0] in VIN_CHECK_DIGIT_REGIONS)
+
+def fill_vehicle_fields(data: Dict[str, Any], vin_key: str = "VIN", make_key: str = "vehicle_make", model_key: str = "vehicle_model", year_key: str = "vehicle_year") -> Dict[str, Any]:
+    """Fills make/model/year from the VIN and cross-checks extracted values; returns an updated copy of `data`.
+
+    Make and year are overwritten on disagreement only when the check digit verified the VIN; the model is only
+    ever filled in, since titles print trims and abbreviations the index does not know.
+    """
+    decoded = decode_vin(data.get(vin_key))
+    if decoded is None:
+        if data.get(vin_key): metrics.inc("intake_vin_decode_total", outcome="undecoded")
+        return data
+    data = dict(data)
+    outcome = "matched"
+    for key, value in ((make_key, decoded.make), (year_key, str(decoded.year) if decoded.year else None), (model_key, decoded.model)):
+        current = str(data.get(key) or "").strip()
+        if not value or current.upper() == value.upper(): continue
+        if not current:
+            data[key] = value; outcome = "filled" if outcome == "matched" else outcome
+        elif key != model_key and decoded.check_digit_verified:
+            print(f"Note: {key} '{current}' disagrees with VIN {decoded.vin}; using '{value}'")
+            data[key] = value; outcome = "corrected"
+    metrics.inc("intake_vin_decode_total", outcome=outcome)
+    return data